@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+
+##############################################################################
+#                                                                            #
+#  DEVELOPED BY:  Chris Clement (K7CTC)                                      #
+#       VERSION:  v1.0                                                       #
+#   DESCRIPTION:  This utility was written for use with the Ronoth LoStik    #
+#                 LoRa transceiver.  It steps one LoStik across a list of    #
+#                 channels to find out which are busy.                       #
+#                                                                            #
+#                 At each channel the LoStik listens for the dwell time      #
+#                 using bounded receive windows ("radio rx <symbols>")       #
+#                 rather than rx.py's open ended "radio rx 0".  Every packet #
+#                 heard is counted with its RSSI and its time on air.  The   #
+#                 retune and the receive window are sent together so a hop   #
+#                 costs one serial round trip.  After the last sweep (or     #
+#                 ctrl+c) an occupancy heatmap (channels down, sweeps        #
+#                 across), a per channel summary and the quietest channels   #
+#                 are printed.                                               #
+#                                                                            #
+#   INFORMATION:  Only LoRa traffic on the same spreading factor, bandwidth  #
+#                 and sync word is decoded, so scan with the settings your   #
+#                 own traffic uses.  Occupancy is the airtime of the packets #
+#                 heard as a share of the time spent listening, so it        #
+#                 underestimates channels where other modulations are in     #
+#                 use.                                                       #
+#                                                                            #
+##############################################################################
+
+#import required modules (pyserial is imported once the arguments have been parsed so --help stays instant)
+import time
+import sys
+import argparse
+import math
+import pathlib
+import statistics
+import lora_phy
+import lostik_channels
+import lostik_console
+import lostik_serial
+
+#start with a clear terminal window
+lostik_console.clear_screen()
+
+#establish and parse command line arguments
+parser = argparse.ArgumentParser(description='Ronoth LoStik Utility: Channel Scanner', epilog='Created by K7CTC.  This utility will scan channels for LoRa activity.')
+parser.add_argument('-p', '--port', help='LoStik serial port descriptor (default: /dev/ttyUSB0)', default='/dev/ttyUSB0')
+parser.add_argument('--channels', help='Channels to scan: a number of channels from the default plan or comma separated frequencies in Hz (default: --start to --stop in --step)')
+parser.add_argument('--start', help='First frequency to scan in Hz (default: 902300000)', type=int, default=902300000)
+parser.add_argument('--stop', help='Last frequency to scan in Hz (default: 927500000)', type=int, default=927500000)
+parser.add_argument('--step', help='Frequency step in Hz (default: 200000)', type=int, default=200000)
+parser.add_argument('--dwell', help='Milliseconds spent listening on each channel per sweep (default: 500)', type=float, default=500)
+parser.add_argument('--sweeps', help='Number of sweeps (default: 0, sweep until ctrl+c)', type=int, default=0)
+parser.add_argument('--sf', help='Spreading factor to listen for (values: sf7 to sf12, default: sf12)', default='sf12')
+parser.add_argument('--bw', help='Radio bandwidth in kHz (values: 125, 250, 500, default: 125)', default='125')
+parser.add_argument('--sync', help='Sync word (one hexadecimal byte, default: 34)', default='34')
+parser.add_argument('--recommend', help='Number of quiet channels to recommend (default: 8)', type=int, default=8)
+parser.add_argument('--csv', help='Also write every stop of every sweep to this CSV file')
+args = parser.parse_args()
+
+try:
+    if args.channels:
+        channels = lostik_channels.parse_channels(args.channels)
+    else:
+        channels = lostik_channels.channel_plan((args.stop - args.start) // args.step + 1, args.start, args.step)
+except ValueError:
+    print('ERROR: Invalid channel list (the RN2903 covers ' + str(lostik_channels.min_frequency) + ' to ' + str(lostik_channels.max_frequency) + 'Hz).')
+    sys.exit(1)
+
+#the receive window is given to the radio in symbols (at most 65535)
+symbol_time = lora_phy.symbol_time(args.sf, args.bw)
+window_symbols = max(1, min(65535, int(math.ceil(args.dwell / symbol_time))))
+
+##### BEGIN LOSTIK STARTUP #####
+
+#check to see if the port descriptor path exists (determines if device is connected on linux systems)
+lostik_path = pathlib.Path(args.port)
+try:
+    print('Looking for LoStik...\r', end='')
+    lostik_abs_path = lostik_path.resolve(strict=True)
+except FileNotFoundError:
+    print('Looking for LoStik... FAIL!')
+    print('ERROR: LoStik serial port descriptor not found!')
+    print('HELP: Check serial port descriptor and/or device connection.')
+    print('Unable to proceed, now exiting!')
+    sys.exit(1)
+else:
+    print('Looking for LoStik... DONE!')
+
+#connect to lostik
+import serial
+try:
+    print('Connecting to LoStik...\r', end='')
+    lostik = serial.Serial(args.port, baudrate=57600, timeout=1)
+except:
+    print('Connecting to LoStik... FAIL!')
+    print('HELP: Check port permissions. Current user must be in "dialout" group.')
+    print('Unable to proceed, now exiting!')
+    sys.exit(1)
+else:
+    if lostik.is_open == True:
+        print('Connecting to LoStik... DONE!')
+    elif lostik.is_open == False:
+        print('Connecting to LoStik... FAIL!')
+        print('HELP: Check port permissions. Current user must be in "dialout" group.')
+        print('Unable to proceed, now exiting!')
+        sys.exit(1)
+
+#from here on a dedicated reader thread drains the serial port
+lostik = lostik_serial.LoStikCommander(lostik)
+
+#write settings to LoStik (the watchdog timer is disabled, the receive windows end themselves)
+print('Initializing LoStik...\r', end='')
+init_replies = lostik.batch([
+    b'mac pause',
+    b'radio set mod lora',
+    b'radio set freq ' + str(channels[0]).encode('ASCII'),
+    b'radio set sf ' + args.sf.encode('ASCII'),
+    b'radio set bw ' + args.bw.encode('ASCII'),
+    b'radio set crc on',
+    b'radio set iqi off',
+    b'radio set wdt 0',
+    b'radio set sync ' + args.sync.encode('ASCII'),
+])
+if init_replies != ['4294967245'] + ['ok'] * (len(init_replies) - 1):
+    print('Initializing LoStik... FAIL!')
+    print('ERROR: Error communicating with LoStik (check --sf, --bw and --sync values).')
+    print('Unable to proceed, now exiting!')
+    sys.exit(1)
+print('Initializing LoStik... DONE!\n')
+
+##### END LOSTIK STARTUP #####
+
+##### BEGIN SCAN #####
+
+#the command lines of every hop, built once (retune, then open a receive window for the whole dwell time)
+hop_commands = {channel: b'radio set freq ' + str(channel).encode('ASCII') + b'\r\n' for channel in channels}
+rx_command = b'radio rx ' + str(window_symbols).encode('ASCII') + b'\r\n'
+
+#longest a receive window can last once a packet has started (the longest frame at these settings), plus the port timeout
+packet_allowance = lora_phy.time_on_air(255, args.sf, args.bw, '4/8') / 1000 + 1
+
+#function to listen on one channel for the dwell time (returns a dict of what was heard)
+def listen(channel):
+    stop = {'packets': 0, 'rssi': [], 'airtime': 0.0, 'listened': 0.0}
+    #the retune and the receive window go out together, the radio works through them in order
+    freq_reply = lostik.command_line(hop_commands[channel])
+    rx_reply = lostik.command_line(rx_command)
+    start_time = time.monotonic()
+    deadline = start_time + args.dwell / 1000
+    if lostik.wait_reply(freq_reply) != 'ok':
+        #the receive window may have opened on the previous channel, close it and discard whatever it heard
+        #(after a missing reply the window's own reply is given up on too, so it is closed either way)
+        lostik.wait_reply(rx_reply)
+        lostik.query(b'radio rxstop')
+        while lostik.next_event(timeout=0) != '':
+            pass
+        return None
+    while True:
+        reply = lostik.wait_reply(rx_reply)
+        if reply == 'busy':
+            lostik.query(b'radio rxstop')
+        elif reply == 'ok':
+            event = lostik.next_event(timeout=max(deadline - time.monotonic(), 0) + packet_allowance)
+            if event == '':
+                lostik.query(b'radio rxstop')
+            event_array = event.split()
+            if len(event_array) == 2 and event_array[0] == 'radio_rx':
+                stop['packets'] += 1
+                stop['airtime'] += lora_phy.time_on_air(len(event_array[1]) // 2, args.sf, args.bw)
+                try:
+                    stop['rssi'].append(int(lostik.query(b'radio get rssi')))
+                except ValueError:
+                    pass
+        #a packet ended the window early, listen out the rest of the dwell time
+        remaining = int((deadline - time.monotonic()) * 1000 / symbol_time)
+        if remaining < 1:
+            break
+        rx_reply = lostik.command(b'radio rx ' + str(min(remaining, 65535)).encode('ASCII'))
+    stop['listened'] = (time.monotonic() - start_time) * 1000
+    #a packet that started before the window opened only kept the channel busy while it was being listened to
+    stop['airtime'] = min(stop['airtime'], stop['listened'])
+    return stop
+
+#occupancy shading, quietest first, and the occupancy (as a fraction) each shade starts at
+shades = '.:-=+*#@'
+shade_floors = [0, 0.0001, 0.01, 0.05, 0.1, 0.25, 0.5, 0.75]
+
+def shade(stop):
+    if stop is None:
+        return '?'
+    occupancy = stop['airtime'] / stop['listened'] if stop['listened'] else 0
+    if stop['packets'] == 0:
+        return shades[0]
+    return shades[max(index for index, floor in enumerate(shade_floors) if occupancy >= floor)]
+
+csv_file = None
+if args.csv:
+    try:
+        csv_file = open(args.csv, 'w')
+        csv_file.write('sweep,time,frequency,listened_ms,packets,mean_rssi,airtime_ms\n')
+    except OSError:
+        print('ERROR: Unable to write ' + args.csv)
+        sys.exit(1)
+
+print('Scanning ' + str(len(channels)) + ' channels from ' + lostik_channels.mhz(channels[0]) + ' to ' + lostik_channels.mhz(channels[-1]) + ' at ' + args.sf + '/' + args.bw + 'kHz, '
+      + format(args.dwell, 'g') + 'ms per channel (' + str(window_symbols) + ' symbol windows)... (press ctrl+c to stop)')
+#every sweep is a list of stops, one per channel (None where the LoStik could not be retuned)
+sweeps = []
+try:
+    while args.sweeps == 0 or len(sweeps) < args.sweeps:
+        sweep_start = time.monotonic()
+        sweep = []
+        for channel in channels:
+            stop = listen(channel)
+            sweep.append(stop)
+            if csv_file is not None and stop is not None:
+                mean_rssi = format(statistics.mean(stop['rssi']), '.1f') if stop['rssi'] else ''
+                csv_file.write(','.join([str(len(sweeps) + 1), str(int(time.time())), str(channel), format(stop['listened'], '.0f'), str(stop['packets']), mean_rssi, format(stop['airtime'], '.1f')]) + '\n')
+        sweeps.append(sweep)
+        heard = sum(stop['packets'] for stop in sweep if stop is not None)
+        print('Sweep ' + str(len(sweeps)) + ': ' + str(heard) + ' packets in ' + format(time.monotonic() - sweep_start, '.1f') + 's  ' + ''.join(shade(stop) for stop in sweep))
+except KeyboardInterrupt:
+    print('\nScan interrupted.')
+if csv_file is not None:
+    csv_file.close()
+
+##### END SCAN #####
+
+#the heatmap shows the latest sweeps that fit the terminal
+heatmap_width = 60
+print('')
+print('Channel Occupancy (channels down, sweeps across, latest ' + str(min(len(sweeps), heatmap_width)) + ')')
+print('--------------------------------------------------------------------------')
+totals = []
+for index, channel in enumerate(channels):
+    stops = [sweep[index] for sweep in sweeps if index < len(sweep) and sweep[index] is not None]
+    listened = sum(stop['listened'] for stop in stops)
+    rssi = [value for stop in stops for value in stop['rssi']]
+    totals.append({'channel': channel, 'packets': sum(stop['packets'] for stop in stops), 'rssi': rssi,
+                   'occupancy': sum(stop['airtime'] for stop in stops) / listened if listened else 0.0})
+    print(format(channel / 1e6, '9.1f') + '  ' + ''.join(shade(sweep[index]) if index < len(sweep) else ' ' for sweep in sweeps[-heatmap_width:]))
+print('(shades: ' + '  '.join(character + ' ' + (format(floor * 100, 'g') + '%+' if floor else 'none') for character, floor in zip(shades, shade_floors)) + ' of the time on air)')
+print('')
+print('      MHz   Packets   Mean RSSI   Max RSSI   Occupancy')
+for total in totals:
+    if not total['packets']:
+        continue
+    #(every rssi request may have gone unanswered)
+    if total['rssi']:
+        rssi_columns = format(statistics.mean(total['rssi']), '12.1f') + str(max(total['rssi'])).rjust(11)
+    else:
+        rssi_columns = 'n/a'.rjust(12) + 'n/a'.rjust(11)
+    print(format(total['channel'] / 1e6, '9.1f') + str(total['packets']).rjust(10) + rssi_columns + format(total['occupancy'] * 100, '11.2f') + '%')
+busy = sum(1 for total in totals if total['packets'])
+print(str(busy) + ' of ' + str(len(channels)) + ' channels carried traffic')
+#quietest first: least airtime heard, then fewest packets, then the weakest signals
+quiet = sorted(totals, key=lambda total: (total['occupancy'], total['packets'], max(total['rssi'], default=-200), total['channel']))[:args.recommend]
+print('Quietest channels: ' + ','.join(str(total['channel']) for total in quiet))
+
+#disconnect from lostik
+print('Disconnecting from LoStik...\r', end='')
+lostik.close()
+if lostik.is_open == True:
+    print('Disconnecting from LoStik... FAIL!')
+elif lostik.is_open == False:
+    print('Disconnecting from LoStik... DONE!')
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+
+##############################################################################
+#                                                                            #
+#  DEVELOPED BY:  Chris Clement (K7CTC)                                      #
+#       VERSION:  v1.0                                                       #
+#   DESCRIPTION:  This utility benchmarks the forward error correction used  #
+#                 for fragmented messages (see lostik_fec.py).  It reports   #
+#                 the CPU cost of encoding and decoding per KB of message    #
+#                 data, then simulates sending messages over a link that     #
+#                 loses frames at random and compares how many messages      #
+#                 are delivered with and without parity fragments.  No       #
+#                 LoStik is required.                                        #
+#                                                                            #
+##############################################################################
+
+#import required modules
+import argparse
+import os
+import random
+import time
+import lora_phy
+import lostik_message
+import lostik_transport
+
+#establish and parse command line arguments
+parser = argparse.ArgumentParser(description='Ronoth LoStik Utility: FEC Benchmark', epilog='Created by K7CTC.  This utility will report the cost and benefit of forward error correction.')
+parser.add_argument('--size', help='Message size in bytes (default: 2000)', type=int, default=2000)
+parser.add_argument('--fec', help='Fractions of lost fragments to correct, comma separated (default: 0.1,0.25,0.5)', default='0.1,0.25,0.5')
+parser.add_argument('--loss', help='Frame loss rates to simulate, comma separated (default: 0.01,0.05,0.1,0.2,0.3)', default='0.01,0.05,0.1,0.2,0.3')
+parser.add_argument('--trials', help='Messages sent per simulated loss rate (default: 2000)', type=int, default=2000)
+parser.add_argument('--sf', help='Spreading factor used for the airtime figures (default: sf12)', default='sf12')
+args = parser.parse_args()
+
+fec_fractions = [float(value) for value in args.fec.split(',')]
+loss_rates = [float(value) for value in args.loss.split(',')]
+message = os.urandom(args.size)
+random.seed(1)
+
+#function to time a callable (returns the best of several runs in seconds)
+def best_time(function, runs=5):
+    best = None
+    for run in range(runs):
+        start_time = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start_time
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+#function to receive a list of frames through a reassembler, dropping some (returns the message, or None)
+def deliver(frames, lost):
+    reassembler = lostik_transport.Reassembler()
+    for index, frame in enumerate(frames):
+        if index in lost:
+            continue
+        completed = reassembler.add(lostik_message.decode(frame))
+        if completed is not None:
+            return completed['data']
+    return None
+
+print('FEC CPU Cost (' + str(args.size) + ' byte message)')
+print('--------------------------------------------------------------------------')
+print('(decoding is timed with as many data fragments lost as there is parity)')
+print('   FEC  Data  Parity   Encode us/KB   Decode us/KB')
+for fec in fec_fractions:
+    frames = lostik_transport.fragment(message, message_id=1, fec=fec)
+    header = lostik_message.decode(frames[0])
+    data_count, parity = header['data_count'], header['parity_count']
+    encode_time = best_time(lambda: lostik_transport.fragment(message, message_id=1, fec=fec))
+    #losing the first data fragments forces the decoder to rebuild as many fragments as there is parity
+    lost = set(range(min(parity, data_count)))
+    decode_time = best_time(lambda: deliver(frames, lost))
+    assert deliver(frames, lost) == message
+    kilobytes = args.size / 1024
+    print(format(fec, '6.2f') + str(data_count).rjust(6) + str(parity).rjust(8) + format(encode_time * 1e6 / kilobytes, '15.0f') + format(decode_time * 1e6 / kilobytes, '15.0f'))
+
+print('')
+print('Delivery Under Random Frame Loss (' + str(args.trials) + ' messages per loss rate)')
+print('--------------------------------------------------------------------------')
+schemes = [('no fec', 0)] + [('fec ' + format(fec, '.2f'), fec) for fec in fec_fractions]
+print('  Loss' + ''.join(name.rjust(12) for name, fec in schemes))
+scheme_frames = [lostik_transport.fragment(message, message_id=1, fec=fec) for name, fec in schemes]
+for loss in loss_rates:
+    row = format(loss * 100, '5.0f') + '%'
+    for frames in scheme_frames:
+        delivered = 0
+        for trial in range(args.trials):
+            lost = set(index for index in range(len(frames)) if random.random() < loss)
+            if not lost or deliver(frames, lost) == message:
+                delivered += 1
+        row += format(delivered / args.trials * 100, '11.1f') + '%'
+    print(row)
+
+print('')
+print('Airtime Per Message (' + args.sf + ', BW 125kHz, CR 4/5)')
+print('--------------------------------------------------------------------------')
+for (name, fec), frames in zip(schemes, scheme_frames):
+    airtime = sum(lora_phy.time_on_air(len(frame), args.sf) for frame in frames) / 1000
+    print(name.ljust(10) + str(len(frames)).rjust(4) + ' frames' + format(airtime, '10.1f') + 's')
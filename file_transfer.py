@@ -0,0 +1,467 @@
+#!/usr/bin/env python3
+
+##############################################################################
+#                                                                            #
+#  DEVELOPED BY:  Chris Clement (K7CTC)                                      #
+#       VERSION:  v1.0                                                       #
+#   DESCRIPTION:  This utility was written for use with the Ronoth LoStik    #
+#                 LoRa transceiver.  It moves a file between two LoStiks.    #
+#                                                                            #
+#                 When executed with the "send-file" command, the file is    #
+#                 offered to the receiver and sent in numbered chunks.       #
+#                 Chunks are sent in bursts (a window), the last chunk of    #
+#                 each burst asks the receiver for an acknowledgement and    #
+#                 the receiver answers with a bitmap of the chunks it has.   #
+#                 Only the missing chunks are sent again (selective repeat). #
+#                                                                            #
+#                 When executed with the "recv-file" command, the LoStik     #
+#                 listens for file offers and writes each file to the        #
+#                 output directory once its CRC32 has been verified.         #
+#                                                                            #
+#   INFORMATION:  Partially received files are kept (as .part and .state     #
+#                 files) so an interrupted transfer resumes where it left    #
+#                 off when the same file is sent again.  Both LoStiks must   #
+#                 use the same spreading factor, bandwidth and coding rate,  #
+#                 or with --mod fsk the same bitrate and deviation.  FSK     #
+#                 moves data far faster between nearby nodes but frames are  #
+#                 limited to 64 bytes (see fsk_benchmark.py).                #
+#                 With --max-dwell or --duty-cycle every frame's airtime is  #
+#                 checked before it is sent (see lostik_governor.py) and     #
+#                 frames over the duty cycle budget wait until it allows     #
+#                 them.                                                      #
+#                                                                            #
+##############################################################################
+
+#import required modules (pyserial is imported once the arguments have been parsed so --help stays instant)
+import time
+import sys
+import argparse
+import json
+import pathlib
+import zlib
+import lora_phy
+import lostik_console
+import lostik_governor
+import lostik_message
+import lostik_serial
+
+#start with a clear terminal window
+lostik_console.clear_screen()
+
+#establish and parse command line arguments
+parser = argparse.ArgumentParser(description='Ronoth LoStik Utility: File Transfer', epilog='Created by K7CTC.  This utility will send or receive a file over LoRa.')
+parser.add_argument('-p', '--port', help='LoStik serial port descriptor (default: /dev/ttyUSB0)', default='/dev/ttyUSB0')
+parser.add_argument('--sf', help='Spreading factor (values: sf7 to sf12, default: sf12)', default='sf12')
+parser.add_argument('--bw', help='Radio bandwidth in kHz (values: 125, 250, 500, default: 125)', default='125')
+parser.add_argument('--cr', help='Coding rate (values: 4/5, 4/6, 4/7, 4/8, default: 4/5)', default='4/5')
+parser.add_argument('--mod', help='Modulation mode (values: lora, fsk, default: lora)', choices=['lora', 'fsk'], default='lora')
+parser.add_argument('--bitrate', help='FSK bitrate in bits per second (range: 1 to 300000, default: 50000)', type=int, default=50000)
+parser.add_argument('--fdev', help='FSK frequency deviation in Hz (default: half the bitrate, as far as the 250kHz filter allows)', type=int)
+parser.add_argument('--rxbw', help='FSK receive filter bandwidth in kHz (default: the narrowest that passes --bitrate and --fdev)')
+parser.add_argument('--max-dwell', help='Longest frame in milliseconds of airtime (e.g. 400 for FCC part 15.247 hopping, default: no limit)', type=float)
+parser.add_argument('--duty-cycle', help='Fraction of --duty-window spent transmitting, frames over budget wait (range: 0 to 1, default: no limit)', type=float)
+parser.add_argument('--duty-window', help='Seconds over which --duty-cycle is measured (default: 3600)', type=float, default=3600)
+subparsers = parser.add_subparsers(dest='command', required=True)
+send_parser = subparsers.add_parser('send-file', help='Send a file')
+send_parser.add_argument('file', help='File to send')
+send_parser.add_argument('--chunk-size', help='Data bytes per chunk (range: 16 to 249, or 58 with --mod fsk, default: the largest)', type=int, default=249)
+send_parser.add_argument('--window', help='Chunks sent per burst before asking for an acknowledgement (range: 1 to 64, default: 16)', type=int, default=16)
+send_parser.add_argument('--ack-timeout', help='Seconds to wait for an acknowledgement (default: 10)', type=float, default=10)
+send_parser.add_argument('--retries', help='Consecutive unanswered acknowledgement requests before giving up (default: 5)', type=int, default=5)
+recv_parser = subparsers.add_parser('recv-file', help='Receive files until ctrl+c')
+recv_parser.add_argument('-o', '--output', help='Directory received files are written to (default: current directory)', default='.')
+args = parser.parse_args()
+
+#the ack bitmap covers this many chunks after base (so the window can never be larger)
+ack_span = 64
+
+#airtime of everything sent and heard (in milliseconds)
+airtime = {'tx': 0.0, 'rx': 0.0}
+
+#FSK settings (only used with --mod fsk, the deviation and filters follow the bitrate unless given)
+fsk_fdev = args.fdev if args.fdev is not None else lora_phy.fsk_fdev(args.bitrate)
+fsk_rxbw = args.rxbw or lora_phy.fsk_rxbw(args.bitrate, fsk_fdev)
+fsk_afcbw = lora_phy.fsk_rxbw(args.bitrate, fsk_fdev, margin_khz=20)
+
+#largest frame the radio will send in the chosen mode
+max_payload = lora_phy.fsk_max_payload if args.mod == 'fsk' else lora_phy.lora_max_payload
+
+#function to obtain the time on air of a frame in milliseconds (the LoStik default preamble of 8 is left alone)
+def frame_airtime(length):
+    if args.mod == 'fsk':
+        return lora_phy.fsk_time_on_air(length, args.bitrate, preamble=8)
+    return lora_phy.time_on_air(length, args.sf, args.bw, args.cr)
+
+#function to describe the modulation settings
+def modulation_name():
+    if args.mod == 'fsk':
+        return 'FSK ' + str(args.bitrate) + 'bps'
+    return args.sf + '/' + args.bw + 'kHz'
+
+#every transmission is checked against the dwell time and duty cycle limits
+governor = lostik_governor.AirtimeGovernor(max_dwell=args.max_dwell, duty_cycle=args.duty_cycle, duty_window=args.duty_window)
+
+##### BEGIN LOSTIK STARTUP #####
+
+#check to see if the port descriptor path exists (determines if device is connected on linux systems)
+lostik_path = pathlib.Path(args.port)
+try:
+    print('Looking for LoStik...\r', end='')
+    lostik_abs_path = lostik_path.resolve(strict=True)
+except FileNotFoundError:
+    print('Looking for LoStik... FAIL!')
+    print('ERROR: LoStik serial port descriptor not found!')
+    print('HELP: Check serial port descriptor and/or device connection.')
+    print('Unable to proceed, now exiting!')
+    sys.exit(1)
+else:
+    print('Looking for LoStik... DONE!')
+
+#connect to lostik
+import serial
+try:
+    print('Connecting to LoStik...\r', end='')
+    lostik = serial.Serial(args.port, baudrate=57600, timeout=1)
+except:
+    print('Connecting to LoStik... FAIL!')
+    print('HELP: Check port permissions. Current user must be in "dialout" group.')
+    print('Unable to proceed, now exiting!')
+    sys.exit(1)
+else:
+    if lostik.is_open == True:
+        print('Connecting to LoStik... DONE!')
+    elif lostik.is_open == False:
+        print('Connecting to LoStik... FAIL!')
+        print('HELP: Check port permissions. Current user must be in "dialout" group.')
+        print('Unable to proceed, now exiting!')
+        sys.exit(1)
+
+#from here on a dedicated reader thread drains the serial port
+lostik = lostik_serial.LoStikCommander(lostik)
+
+#write settings to LoStik (the watchdog timer is disabled, this utility times its own receive windows)
+print('Initializing LoStik...\r', end='')
+init_commands = [
+    b'mac pause',
+    b'radio set mod ' + args.mod.encode('ASCII'),
+    b'radio set freq 923300000',
+    b'radio set pwr 2',
+    b'radio set sf ' + args.sf.encode('ASCII'),
+    b'radio set crc on',
+    b'radio set iqi off',
+    b'radio set cr ' + args.cr.encode('ASCII'),
+    b'radio set wdt 0',
+    b'radio set sync 34',
+    b'radio set bw ' + args.bw.encode('ASCII'),
+]
+#the FSK settings are left alone unless FSK is in use
+if args.mod == 'fsk':
+    init_commands += [
+        b'radio set bitrate ' + str(args.bitrate).encode('ASCII'),
+        b'radio set fdev ' + str(fsk_fdev).encode('ASCII'),
+        b'radio set rxbw ' + fsk_rxbw.encode('ASCII'),
+        b'radio set afcbw ' + fsk_afcbw.encode('ASCII'),
+        b'radio set bt 0.5',
+    ]
+init_replies = lostik.batch(init_commands)
+if init_replies != ['4294967245'] + ['ok'] * (len(init_replies) - 1):
+    print('Initializing LoStik... FAIL!')
+    print('ERROR: Error communicating with LoStik (check ' + ('--sf, --bw, --cr, --bitrate, --fdev and --rxbw' if args.mod == 'fsk' else '--sf, --bw and --cr') + ' values).')
+    print('Unable to proceed, now exiting!')
+    sys.exit(1)
+print('Initializing LoStik... DONE!\n')
+
+##### END LOSTIK STARTUP #####
+
+##### BEGIN RADIO FUNCTIONS #####
+
+#function to transmit one frame (returns True once the LoStik reports radio_tx_ok)
+#a frame over the duty cycle budget waits until it is allowed, one the governor will never allow is not sent
+def transmit(payload):
+    payload_airtime = frame_airtime(len(payload))
+    check = governor.check(payload_airtime)
+    if check == lostik_governor.tx_reject:
+        return False
+    if check == lostik_governor.tx_defer:
+        wait = governor.time_until(payload_airtime)
+        print('Duty cycle budget used up, waiting ' + format(wait, '.1f') + 's...\r', end='')
+        time.sleep(wait)
+    if lostik.wait_reply(lostik.command_line(lostik_serial.tx_command(payload))) != 'ok':
+        return False
+    governor.record(payload_airtime)
+    airtime['tx'] += payload_airtime
+    #allow for the whole frame to go out, plus a second for the serial port
+    return lostik.next_event(timeout=payload_airtime / 1000 + 1) == 'radio_tx_ok'
+
+#function to receive one frame (returns the decoded message, or None if nothing was heard within timeout seconds)
+def receive(timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if lostik.query(b'radio rx 0') != 'ok':
+            lostik.query(b'radio rxstop')
+            continue
+        event = lostik.next_event(timeout=max(deadline - time.monotonic(), 0.01))
+        if event == '':
+            lostik.query(b'radio rxstop')
+            return None
+        event_array = event.split()
+        if event_array[0] != 'radio_rx' or len(event_array) != 2:
+            continue
+        payload = bytes.fromhex(event_array[1])
+        airtime['rx'] += frame_airtime(len(payload))
+        message = lostik_message.decode(payload)
+        if message is not None:
+            return message
+    return None
+
+##### END RADIO FUNCTIONS #####
+
+##### BEGIN SEND FILE #####
+
+#function to wait for an acknowledgement of the given transfer
+def wait_ack(transfer_id):
+    deadline = time.monotonic() + args.ack_timeout
+    while time.monotonic() < deadline:
+        message = receive(deadline - time.monotonic())
+        if message is not None and message['type'] == 'file_ack' and message['id'] == transfer_id:
+            return message
+    return None
+
+def send_file():
+    file_path = pathlib.Path(args.file)
+    try:
+        data = file_path.read_bytes()
+    except OSError:
+        print('ERROR: Unable to read ' + args.file)
+        sys.exit(1)
+    chunk_size = max(16, min(args.chunk_size, max_payload - lostik_message.file_chunk_header.size))
+    window = max(1, min(args.window, ack_span))
+    chunk_count = max(1, -(-len(data) // chunk_size))
+    if chunk_count > 0xFFFF:
+        print('ERROR: File is too large to send with this chunk size.')
+        sys.exit(1)
+    crc32 = zlib.crc32(data)
+    #the transfer id depends only on the file, so sending the same file again resumes the transfer
+    transfer_id = (crc32 ^ len(data)) & 0xFFFF
+    offer = lostik_message.encode_file_offer(transfer_id, len(data), crc32, chunk_size, file_path.name)
+    if len(offer) > max_payload:
+        print('ERROR: The file name is too long to offer in one ' + str(max_payload) + ' byte frame.')
+        print('HELP: Rename the file to something shorter.')
+        sys.exit(1)
+    largest_frame = max(len(offer), lostik_message.file_chunk_header.size + min(chunk_size, len(data)))
+    if not governor.permitted(frame_airtime(largest_frame)):
+        print('ERROR: A ' + str(largest_frame) + ' byte frame takes longer than the airtime limits allow at ' + modulation_name() + '.')
+        print('HELP: Use a smaller --chunk-size, a shorter file name or a faster --sf/--bw.')
+        sys.exit(1)
+    acked = bytearray(chunk_count)
+    sent = bytearray(chunk_count)
+    chunks_sent = 0
+    retransmitted = 0
+    unanswered = 0
+    tx_failures = 0
+    start_time = time.monotonic()
+    print('Sending ' + file_path.name + ' (' + str(len(data)) + ' bytes in ' + str(chunk_count) + ' chunks, CRC32 ' + format(crc32, '08x') + ')')
+    #the offer doubles as the acknowledgement request whenever an ack goes missing
+    poll = offer
+    ack = None
+    while True:
+        if poll is not None:
+            #a poll the radio failed to send counts as unanswered
+            ack = wait_ack(transfer_id) if transmit(poll) else None
+        if ack is None:
+            unanswered += 1
+            if unanswered > args.retries:
+                print('\nERROR: No answer from the receiver, giving up (send the file again to resume).')
+                sys.exit(1)
+            poll = offer
+            continue
+        unanswered = 0
+        if ack['status'] == lostik_message.file_complete:
+            break
+        if ack['status'] == lostik_message.file_failed:
+            print('\nReceiver reports a CRC32 mismatch, starting over.')
+            acked = bytearray(chunk_count)
+        base = ack['base']
+        for index in range(min(base, chunk_count)):
+            acked[index] = 1
+        for bit in range(len(ack['bitmap']) * 8):
+            if base + bit < chunk_count and ack['bitmap'][bit // 8] & (0x80 >> (bit % 8)):
+                acked[base + bit] = 1
+        print('Progress: ' + str(sum(acked)) + '/' + str(chunk_count) + ' chunks acknowledged (' + str(chunks_sent) + ' sent)\r', end='')
+        burst = [index for index in range(base, min(chunk_count, base + window)) if not acked[index]]
+        if not burst:
+            #everything has arrived, ask again so the receiver can confirm the CRC32
+            poll = offer
+            continue
+        for position, index in enumerate(burst):
+            flags = lostik_message.chunk_poll if position == len(burst) - 1 else 0
+            if not transmit(lostik_message.encode_file_chunk(transfer_id, index, data[index * chunk_size:(index + 1) * chunk_size], flags)):
+                break
+            tx_failures = 0
+            chunks_sent += 1
+            retransmitted += sent[index]
+            sent[index] = 1
+        else:
+            ack = wait_ack(transfer_id)
+            poll = None
+            continue
+        #the radio failed to send a chunk, poll for an ack and send whatever is still missing
+        tx_failures += 1
+        print('\nWARNING: Unable to transmit chunk ' + str(index) + '.')
+        if tx_failures > args.retries:
+            print('ERROR: The LoStik keeps failing to transmit, giving up (send the file again to resume).')
+            sys.exit(1)
+        poll = offer
+    elapsed = time.monotonic() - start_time
+    total_airtime = (airtime['tx'] + airtime['rx']) / 1000
+    print('\nTransfer complete!  Receiver verified CRC32 ' + format(crc32, '08x'))
+    print('         Elapsed: ' + format(elapsed, '.1f') + 's')
+    print('     Chunks sent: ' + str(chunks_sent) + ' (' + str(retransmitted) + ' retransmitted, ' + str(chunk_count - sum(sent)) + ' already held by the receiver)')
+    print('     TX airtime: ' + format(airtime['tx'] / 1000, '.1f') + 's  RX (ack) airtime: ' + format(airtime['rx'] / 1000, '.1f') + 's')
+    #goodput only counts the file data sent during this run (a resumed transfer skips the chunks the receiver already held)
+    delivered = [index for index in range(chunk_count) if sent[index]]
+    delivered_bytes = sum(len(data[index * chunk_size:(index + 1) * chunk_size]) for index in delivered)
+    print('        Goodput: ' + format(delivered_bytes * 8 / elapsed, '.1f') + ' bps over elapsed time, ' + format(delivered_bytes * 8 / total_airtime, '.1f') + ' bps over airtime')
+    #the best case is every chunk sent exactly once with no acknowledgements at all
+    ideal_airtime = sum(frame_airtime(lostik_message.file_chunk_header.size + len(data[index * chunk_size:(index + 1) * chunk_size])) for index in delivered) / 1000
+    print('     Efficiency: ' + format(ideal_airtime / total_airtime * 100, '.0f') + '% of airtime carried first copies of file data')
+    if governor.budget is not None or governor.max_dwell is not None:
+        print('       Governor: ' + governor.summary())
+
+##### END SEND FILE #####
+
+##### BEGIN RECEIVE FILE #####
+
+#a transfer being received (the .state file remembers which chunks are already in the .part file)
+class Transfer:
+    #raises ValueError for an offer that can't be received (no chunk size), OSError when the file can't be written
+    def __init__(self, offer, output_dir):
+        if offer['chunk_size'] < 1:
+            raise ValueError('invalid chunk size in offer: ' + str(offer['chunk_size']))
+        self.offer = offer
+        self.chunk_count = max(1, -(-offer['size'] // offer['chunk_size']))
+        #only the file name is used, never a path supplied by the sender (names that are no file name at all get a name of our own)
+        name = pathlib.Path(offer['name']).name
+        if name in ('', '.', '..'):
+            name = 'transfer-' + str(offer['id'])
+        self.path = output_dir / name
+        self.part_path = self.path.with_name(self.path.name + '.part')
+        self.state_path = self.path.with_name(self.path.name + '.state')
+        self.received = bytearray(self.chunk_count)
+        self.status = lostik_message.file_receiving
+        state = None
+        if self.part_path.exists() and self.state_path.exists():
+            try:
+                state = json.loads(self.state_path.read_text())
+            except (OSError, ValueError):
+                state = None
+        if state is not None and [state.get('size'), state.get('crc32'), state.get('chunk_size')] == [offer['size'], offer['crc32'], offer['chunk_size']]:
+            self.received = bytearray(bytes.fromhex(state['received']))
+            print('Resuming ' + self.path.name + ' (' + str(sum(self.received)) + '/' + str(self.chunk_count) + ' chunks already received)')
+        else:
+            with open(self.part_path, 'wb') as part_file:
+                part_file.truncate(offer['size'])
+            print('Receiving ' + self.path.name + ' (' + str(offer['size']) + ' bytes in ' + str(self.chunk_count) + ' chunks)')
+        self.part_file = open(self.part_path, 'r+b')
+
+    def write_chunk(self, index, data):
+        if index >= self.chunk_count or self.received[index] or self.status == lostik_message.file_complete:
+            return
+        self.part_file.seek(index * self.offer['chunk_size'])
+        self.part_file.write(data)
+        self.received[index] = 1
+
+    #function to save progress and, once every chunk is in, verify the CRC32
+    def checkpoint(self):
+        if self.status == lostik_message.file_complete:
+            return
+        self.part_file.flush()
+        if all(self.received):
+            self.part_file.close()
+            if zlib.crc32(self.part_path.read_bytes()) == self.offer['crc32']:
+                self.part_path.replace(self.path)
+                self.state_path.unlink(missing_ok=True)
+                self.status = lostik_message.file_complete
+                print('\nReceived ' + self.path.name + ' (CRC32 ' + format(self.offer['crc32'], '08x') + ' verified)')
+                return
+            print('\nCRC32 mismatch on ' + self.path.name + ', starting over.')
+            self.status = lostik_message.file_failed
+            self.received = bytearray(self.chunk_count)
+            self.part_file = open(self.part_path, 'r+b')
+        else:
+            self.status = lostik_message.file_receiving
+        self.state_path.write_text(json.dumps({'size': self.offer['size'], 'crc32': self.offer['crc32'], 'chunk_size': self.offer['chunk_size'], 'received': self.received.hex()}))
+
+    def ack(self):
+        base = self.received.find(0) if 0 in self.received else self.chunk_count
+        bitmap = bytearray(ack_span // 8)
+        for bit in range(ack_span):
+            if base + bit < self.chunk_count and self.received[base + bit]:
+                bitmap[bit // 8] |= 0x80 >> (bit % 8)
+        return lostik_message.encode_file_ack(self.offer['id'], self.status, min(base, 0xFFFF), bytes(bitmap))
+
+    def close(self):
+        if not self.part_file.closed:
+            self.part_file.close()
+
+#function to answer the sender with the state of a transfer (a second attempt is made if the radio fails to send it)
+def send_ack(transfer):
+    for attempt in range(2):
+        if transmit(transfer.ack()):
+            return
+    print('\nWARNING: Unable to transmit an acknowledgement, the sender will ask again.')
+
+def recv_file():
+    output_dir = pathlib.Path(args.output)
+    transfers = {}
+    print('Listening for files... (press ctrl+c to stop)')
+    try:
+        while True:
+            message = receive(1)
+            if message is None:
+                continue
+            if message['type'] == 'file_offer':
+                transfer = transfers.get(message['id'])
+                if transfer is None or transfer.offer != message:
+                    if transfer is not None:
+                        transfer.close()
+                    try:
+                        transfer = Transfer(message, output_dir)
+                    except ValueError:
+                        print('ERROR: Ignoring malformed file offer #' + str(message['id']))
+                        continue
+                    except OSError:
+                        print('ERROR: Unable to write to ' + str(output_dir))
+                        continue
+                    transfers[message['id']] = transfer
+                transfer.checkpoint()
+                send_ack(transfer)
+            elif message['type'] == 'file_chunk' and message['id'] in transfers:
+                transfer = transfers[message['id']]
+                transfer.write_chunk(message['index'], message['data'])
+                print('Progress: ' + str(sum(transfer.received)) + '/' + str(transfer.chunk_count) + ' chunks\r', end='')
+                if message['flags'] & lostik_message.chunk_poll:
+                    transfer.checkpoint()
+                    send_ack(transfer)
+    except KeyboardInterrupt:
+        pass
+    for transfer in transfers.values():
+        transfer.close()
+
+##### END RECEIVE FILE #####
+
+try:
+    if args.command == 'send-file':
+        send_file()
+    else:
+        recv_file()
+except KeyboardInterrupt:
+    print('\nTransfer interrupted (send the file again to resume).')
+
+#disconnect from lostik
+print('Disconnecting from LoStik...\r', end='')
+lostik.close()
+if lostik.is_open == True:
+    print('Disconnecting from LoStik... FAIL!')
+elif lostik.is_open == False:
+    print('Disconnecting from LoStik... DONE!')
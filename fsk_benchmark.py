@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+
+##############################################################################
+#                                                                            #
+#  DEVELOPED BY:  Chris Clement (K7CTC)                                      #
+#       VERSION:  v1.0                                                       #
+#   DESCRIPTION:  This utility compares LoRa and FSK for bulk transfers      #
+#                 between nearby nodes.  For each modulation setting it      #
+#                 models sending a file the way file_transfer.py does        #
+#                 (largest chunks the mode allows, a window of chunks, then  #
+#                 an acknowledgement) and reports the goodput over airtime   #
+#                 alone and once the serial port is accounted for.  It also  #
+#                 checks whether the receiving LoStik can hand each chunk    #
+#                 over the serial port and re-arm before the next one        #
+#                 starts.  No LoStik is required.                            #
+#                                                                            #
+#   INFORMATION:  Every frame crosses the serial port twice as hex at 57600  #
+#                 baud, which caps any mode at roughly 23kbps no matter how  #
+#                 fast the radio is.  FSK has a far smaller link budget than #
+#                 LoRa, so it is only an option for short links.  To measure #
+#                 a real link run "file_transfer.py --mod fsk" on both ends. #
+#                                                                            #
+##############################################################################
+
+#import required modules
+import argparse
+import lora_phy
+import lostik_message
+import lostik_serial
+
+#establish and parse command line arguments
+parser = argparse.ArgumentParser(description='Ronoth LoStik Utility: FSK Benchmark', epilog='Created by K7CTC.  This utility will compare LoRa and FSK bulk transfer throughput.')
+parser.add_argument('--file-size', help='Bytes to transfer (default: 65536)', type=int, default=65536)
+parser.add_argument('--window', help='Chunks sent per acknowledgement (range: 1 to 64, default: 16)', type=int, default=16)
+parser.add_argument('--lora', help='LoRa settings to compare, comma separated sf/bw pairs (default: sf12/125,sf10/125,sf7/125,sf7/500)', default='sf12/125,sf10/125,sf7/125,sf7/500')
+parser.add_argument('--bitrates', help='FSK bitrates to compare, comma separated (default: 19200,50000,100000,150000,300000)', default='19200,50000,100000,150000,300000')
+parser.add_argument('--turnaround', help='Milliseconds the LoStik takes to act on each command, added per frame (default: 0, serial port and airtime only)', type=float, default=0)
+args = parser.parse_args()
+
+#the serial port runs at 57600 baud with 10 bits per byte on the wire (start bit, 8 data bits, stop bit)
+serial_bytes_per_ms = 57600 / 10 / 1000
+
+#function to obtain the time in milliseconds a number of bytes takes to cross the serial port
+def serial_time(byte_count):
+    return byte_count / serial_bytes_per_ms
+
+#function to obtain the serial time of the "radio_rx  <hex>" line a received frame produces
+def rx_line_time(frame_length):
+    return serial_time(len('radio_rx  \r\n') + 2 * frame_length)
+
+#function to obtain the serial time of sending a frame ("radio tx" command, then "ok" and "radio_tx_ok")
+def tx_serial_time(frame_length):
+    return serial_time(len(lostik_serial.tx_command(bytes(frame_length))) + len('ok\r\n') + len('radio_tx_ok\r\n'))
+
+#the serial time of re-arming the receiver ("radio rx 0" and its "ok")
+rearm_time = serial_time(len('radio rx 0\r\n') + len('ok\r\n'))
+
+#function to model one mode (airtime is a function of frame length, returns a dict of results)
+def model(name, max_payload, airtime):
+    header = lostik_message.file_chunk_header.size
+    chunk_size = max_payload - header
+    chunk_frame = header + chunk_size
+    ack_frame = lostik_message.file_ack_header.size + 8
+    window = max(1, min(args.window, 64))
+    chunks = -(-args.file_size // chunk_size)
+    windows = -(-chunks // window)
+    #goodput is in bits per second (times are in milliseconds)
+    #every chunk: command out, on air, replies back
+    chunk_time = tx_serial_time(chunk_frame) + airtime(chunk_frame) + args.turnaround
+    #every window ends with the receiver reporting the last chunk, answering with an ack and the sender hearing it
+    ack_time = rx_line_time(chunk_frame) + tx_serial_time(ack_frame) + airtime(ack_frame) + rx_line_time(ack_frame) + rearm_time + 3 * args.turnaround
+    total_time = chunks * chunk_time + windows * ack_time
+    total_airtime = chunks * airtime(chunk_frame) + windows * airtime(ack_frame)
+    #between two chunks the sender spends its replies and the next command on the serial port, the receiver its rx line and re-arm
+    sender_gap = tx_serial_time(chunk_frame) + args.turnaround
+    receiver_busy = rx_line_time(chunk_frame) + rearm_time + args.turnaround
+    return {'name': name, 'chunk_size': chunk_size, 'chunk_airtime': airtime(chunk_frame), 'chunk_time': chunk_time, 'total_time': total_time,
+            'airtime_goodput': args.file_size * 8000 / total_airtime, 'goodput': args.file_size * 8000 / total_time, 'keeps_up': receiver_busy <= sender_gap}
+
+results = []
+for setting in args.lora.split(','):
+    sf, bw = setting.split('/')
+    results.append(model('LoRa ' + sf + '/' + bw + 'kHz', lora_phy.lora_max_payload, lambda length, sf=sf, bw=bw: lora_phy.time_on_air(length, sf, bw, '4/5')))
+for bitrate in args.bitrates.split(','):
+    bitrate = int(bitrate)
+    results.append(model('FSK ' + str(bitrate) + 'bps', lora_phy.fsk_max_payload, lambda length, bitrate=bitrate: lora_phy.fsk_time_on_air(length, bitrate, preamble=8)))
+
+print('Bulk Transfer: ' + str(args.file_size) + ' bytes, ' + str(args.window) + ' chunks per acknowledgement')
+print('--------------------------------------------------------------------------')
+print('Mode               Chunk   Airtime    Chunk   Transfer   Goodput (kbps)')
+print('                   bytes  ms/chunk  ms/chunk    seconds   airtime  total')
+for result in results:
+    row = result['name'].ljust(17) + str(result['chunk_size']).rjust(7)
+    row += format(result['chunk_airtime'], '10.1f') + format(result['chunk_time'], '10.1f') + format(result['total_time'] / 1000, '11.1f')
+    row += format(result['airtime_goodput'] / 1000, '10.2f') + format(result['goodput'] / 1000, '7.2f')
+    if not result['keeps_up']:
+        row += '  *'
+    print(row)
+print('(ms/chunk includes the serial port, modelled from the command and reply lengths at 57600 baud)')
+if not all(result['keeps_up'] for result in results):
+    print('* the receiver may still be busy on its serial port when the next chunk starts')
+fastest = max(results, key=lambda result: result['goodput'])
+print('')
+print('Fastest: ' + fastest['name'] + ' at ' + format(fastest['goodput'] / 1000, '.2f') + 'kbps (' + format(fastest['goodput'] / results[0]['goodput'], '.0f') + 'x ' + results[0]['name'] + ')')
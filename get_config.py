@@ -24,10 +24,10 @@ import serial
 import time
 import sys
 import pathlib
-import os
+import lostik_console
 
 #start with a clear terminal window
-os.system('clear')
+lostik_console.clear_screen()
 
 #establish and parse command line arguments
 parser = argparse.ArgumentParser(description='Ronoth LoStik Utility: Get Configuration', epilog='Created by K7CTC.  This utility will output relevant LoRa settings from the LoStik device.')
@@ -175,6 +175,24 @@ print('                 Sync Word (default=34): ' + lostik.readline().decode('AS
 #get radio bandwidth (default: 125)
 lostik.write(b'radio get bw\r\n')
 print('          Radio Bandwidth (default=125): ' + lostik.readline().decode('ASCII'), end='')
+#get preamble length (default: 8)
+lostik.write(b'radio get prlen\r\n')
+print('            Preamble Length (default=8): ' + lostik.readline().decode('ASCII'), end='')
+#get FSK bitrate (default: 50000)
+lostik.write(b'radio get bitrate\r\n')
+print('            FSK Bitrate (default=50000): ' + lostik.readline().decode('ASCII'), end='')
+#get FSK frequency deviation (default: 25000)
+lostik.write(b'radio get fdev\r\n')
+print('          FSK Deviation (default=25000): ' + lostik.readline().decode('ASCII'), end='')
+#get FSK receive filter bandwidth (default: 25)
+lostik.write(b'radio get rxbw\r\n')
+print('          FSK RX Bandwidth (default=25): ' + lostik.readline().decode('ASCII'), end='')
+#get FSK AFC filter bandwidth (default: 41.7)
+lostik.write(b'radio get afcbw\r\n')
+print('       FSK AFC Bandwidth (default=41.7): ' + lostik.readline().decode('ASCII'), end='')
+#get FSK Gaussian shaping (default: 0.5)
+lostik.write(b'radio get bt\r\n')
+print('     FSK Gaussian Shaping (default=0.5): ' + lostik.readline().decode('ASCII'), end='')
 #get SNR from last received packet (default: -128)
 lostik.write(b'radio get snr\r\n')
 print('Last Received Packet SNR (default=-128): ' + lostik.readline().decode('ASCII'), end='')
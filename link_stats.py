@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+
+##############################################################################
+#                                                                            #
+#  DEVELOPED BY:  Chris Clement (K7CTC)                                      #
+#       VERSION:  v1.0                                                       #
+#   DESCRIPTION:  This utility analyzes reception capture files written by   #
+#                 rx.py (see the --capture argument).  It reports rolling    #
+#                 RSSI/SNR statistics, packet error rate per time window     #
+#                 (derived from gaps in the packet sequence numbers), SNR    #
+#                 margin above the demodulation floor of the spreading       #
+#                 factor in use and time-of-day trends.                      #
+#                                                                            #
+#   INFORMATION:  All computations are vectorized with NumPy so that a       #
+#                 capture of a million packets is analyzed in seconds.       #
+#                 NumPy is required for this utility only.                   #
+#                                                                            #
+##############################################################################
+
+#import required modules
+import argparse
+import sys
+import time
+import lora_phy
+import lostik_capture
+
+try:
+    import numpy as np
+except ImportError:
+    print('ERROR: This utility requires NumPy.')
+    print('HELP: Install it with "pip3 install numpy".')
+    sys.exit(1)
+
+#establish and parse command line arguments
+parser = argparse.ArgumentParser(description='Ronoth LoStik Utility: Link Statistics', epilog='Created by K7CTC.  This utility will analyze a reception capture file.')
+parser.add_argument('capture', help='Reception capture file written by rx.py --capture')
+parser.add_argument('--window', help='Rolling statistics window in packets. (default: 50)', type=int, default=50)
+parser.add_argument('--per-window', help='Packet error rate window in seconds. (default: 3600)', type=int, default=3600)
+parser.add_argument('--seq-modulo', help='Sequence number wrap-around value, 0 if sequence numbers never wrap. (default: 0)', type=int, default=0)
+parser.add_argument('--max-gap', help='Sequence gaps larger than this are treated as a sender restart rather than loss. (default: 1000)', type=int, default=1000)
+args = parser.parse_args()
+
+##### BEGIN ANALYSIS FUNCTIONS #####
+
+#function to compute rolling mean and standard deviation over a fixed number of packets
+#missing values (nan, such as the snr of FSK packets) are left out of each window, a window without any value is nan
+def rolling_mean_std(values, window):
+    window = max(1, min(window, values.size))
+    finite = np.isfinite(values)
+    values = np.where(finite, values, 0.0)
+    ccount = np.concatenate(([0], np.cumsum(finite)))
+    csum = np.concatenate(([0.0], np.cumsum(values)))
+    csum_sq = np.concatenate(([0.0], np.cumsum(values * values)))
+    count = ccount[window:] - ccount[:-window]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = (csum[window:] - csum[:-window]) / count
+        variance = (csum_sq[window:] - csum_sq[:-window]) / count - mean * mean
+    return mean, np.sqrt(np.clip(variance, 0.0, None))
+
+#function to compute the number of packets lost ahead of each received packet from sequence gaps
+def sequence_losses(seq, seq_modulo, max_gap):
+    losses = np.zeros(seq.size, dtype=np.int64)
+    has_seq = np.flatnonzero(seq >= 0)
+    if has_seq.size < 2:
+        return losses
+    step = np.diff(seq[has_seq])
+    if seq_modulo > 0:
+        step = np.mod(step, seq_modulo)
+    #a step of 1 is the next packet, 0 or negative is a duplicate or restart, larger steps are loss
+    lost = step - 1
+    lost[(step <= 0) | (step > max_gap)] = 0
+    losses[has_seq[1:]] = lost
+    return losses
+
+#function to compute packet error rate per time window (returns window start times, received, lost and per)
+def windowed_per(rx_time, losses, window_ms):
+    window_index = (rx_time - rx_time[0]) // window_ms
+    received = np.bincount(window_index)
+    lost = np.bincount(window_index, weights=losses).astype(np.int64)
+    sent = received + lost
+    per = np.divide(lost, sent, out=np.zeros(sent.size), where=sent > 0)
+    window_start = rx_time[0] + np.arange(received.size) * window_ms
+    keep = sent > 0
+    return window_start[keep], received[keep], lost[keep], per[keep]
+
+#function to compute per-hour (local time) packet count and mean RSSI/SNR
+#(missing values are left out of the means, an hour without any value has a nan mean)
+def time_of_day(rx_time, rssi, snr):
+    utc_offset = time.localtime().tm_gmtoff
+    hour = ((rx_time // 1000 + utc_offset) // 3600) % 24
+    count = np.bincount(hour, minlength=24)
+    means = []
+    for values in (rssi, snr):
+        finite = np.isfinite(values)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means.append(np.bincount(hour[finite], weights=values[finite], minlength=24) / np.bincount(hour[finite], minlength=24))
+    return count, means[0], means[1]
+
+##### END ANALYSIS FUNCTIONS #####
+
+#load capture
+analysis_start_time = time.perf_counter()
+try:
+    capture = lostik_capture.load_capture(args.capture)
+except OSError:
+    print('ERROR: Unable to read capture file!')
+    sys.exit(1)
+except ValueError:
+    print('ERROR: Capture file is not in the expected format!')
+    sys.exit(1)
+rx_time = capture['rx_time']
+rssi = capture['rssi']
+snr = capture['snr']
+sf = capture['sf']
+seq = capture['seq']
+if rx_time.size == 0:
+    print('ERROR: Capture file contains no packets!')
+    sys.exit(1)
+
+#demodulation floor lookup table indexed by spreading factor
+floor_table = np.full(13, np.nan)
+for sf_value, floor in lora_phy.snr_floor.items():
+    floor_table[sf_value] = floor
+margin = snr - floor_table[np.clip(sf, 0, 12)]
+
+rssi_mean, rssi_std = rolling_mean_std(rssi, args.window)
+snr_mean, snr_std = rolling_mean_std(snr, args.window)
+margin_mean, margin_std = rolling_mean_std(margin, args.window)
+losses = sequence_losses(seq, args.seq_modulo, args.max_gap)
+window_start, window_received, window_lost, window_per = windowed_per(rx_time, losses, args.per_window * 1000)
+hour_count, hour_rssi, hour_snr = time_of_day(rx_time, rssi, snr)
+analysis_time = time.perf_counter() - analysis_start_time
+
+#report
+def format_time(ms):
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(int(ms) // 1000))
+
+print('Capture Summary')
+print('---------------')
+print(' Packets Received: ' + str(rx_time.size))
+print('     Packets Lost: ' + str(int(losses.sum())) + ' (from sequence gaps)')
+print('      Overall PER: ' + format(losses.sum() / (rx_time.size + losses.sum()) * 100, '.2f') + '%')
+print('     First Packet: ' + format_time(rx_time[0]))
+print('      Last Packet: ' + format_time(rx_time[-1]))
+print('    Analysis Time: ' + format(analysis_time * 1000, '.1f') + 'ms\n')
+
+print('Link Quality              mean     std     min     max')
+print('-----------------------------------------------------')
+for label, values in (('RSSI (dBm)', rssi), ('SNR (dB)', snr), ('SNR Margin (dB)', margin)):
+    print(label.rjust(16) + ' ' + ''.join(format(v, '8.1f') for v in (np.nanmean(values), np.nanstd(values), np.nanmin(values), np.nanmax(values))))
+print()
+
+print('Rolling Statistics (' + str(min(args.window, rx_time.size)) + ' packet window)')
+print('-----------------------------------------------------')
+print('  Latest RSSI: ' + format(rssi_mean[-1], '.1f') + ' +/- ' + format(rssi_std[-1], '.1f') + 'dBm')
+print('   Latest SNR: ' + format(snr_mean[-1], '.1f') + ' +/- ' + format(snr_std[-1], '.1f') + 'dB')
+print('Latest Margin: ' + format(margin_mean[-1], '.1f') + ' +/- ' + format(margin_std[-1], '.1f') + 'dB')
+if np.isnan(margin_mean).all():
+    print(' Worst Margin: unknown (no valid spreading factor in capture)\n')
+else:
+    worst = int(np.nanargmin(margin_mean))
+    print(' Worst Margin: ' + format(margin_mean[worst], '.1f') + 'dB (window ending ' + format_time(rx_time[worst + min(args.window, rx_time.size) - 1]) + ')\n')
+
+print('Packet Error Rate (' + str(args.per_window) + ' second windows)')
+print('-----------------------------------------------------')
+print('       Window Start   Received  Lost     PER')
+for start, received, lost, per in zip(window_start, window_received, window_lost, window_per):
+    print(format_time(start).rjust(19) + str(received).rjust(11) + str(lost).rjust(6) + format(per * 100, '7.2f') + '%')
+print()
+
+print('Time of Day Trends (local time)')
+print('-----------------------------------------------------')
+print('Hour  Packets  Mean RSSI  Mean SNR')
+for hour in np.flatnonzero(hour_count):
+    print(str(hour).rjust(4) + str(hour_count[hour]).rjust(9) + format(hour_rssi[hour], '11.1f') + format(hour_snr[hour], '10.1f'))
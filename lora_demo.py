@@ -10,12 +10,12 @@
 #                 utility connects to the LoStik via its serial interface    #
 #                 and instructs it to perform a series of test transmissions #
 #                 whilst cycling through various modulation parameters       #
-#                 (spreading factor, coding rate and bandwidth).  All test   #
-#                 transmissions carry an identical simple text payload       #
-#                 that allows the user to observe how the different          #
-#                 modulation parameters impact the actual transmission       #
-#                 (transmission length/time-on-air, consumed spectral        #
-#                 bandwidth, etc.).                                          #
+#                 (spreading factor, coding rate, bandwidth and preamble     #
+#                 length).  All test transmissions carry an identical simple #
+#                 text payload that allows the user to observe how the       #
+#                 different modulation parameters impact the actual          #
+#                 transmission (transmission length/time-on-air, consumed    #
+#                 spectral bandwidth, etc.).                                 #
 #                                                                            #
 ##############################################################################
 
@@ -25,16 +25,30 @@ import serial
 import time
 import sys
 import pathlib
-import os
+import lora_phy
+import lostik_console
+import lostik_message
+import lostik_serial
 
 #start with a clear terminal window
-os.system('clear')
+lostik_console.clear_screen()
 
 #establish and parse command line arguments
 parser = argparse.ArgumentParser(description='Ronoth LoStik Utility: TX Demonstration',epilog='Created by K7CTC.  This utility will transmit a static message with various modulation settings.')
 parser.add_argument('-p', '--port', help='LoStik serial port descriptor (default: /dev/ttyUSB0)', default='/dev/ttyUSB0')
+parser.add_argument('--compress', help='Send the short message compressed (see lostik_message.py)', action='store_true')
+parser.add_argument('--dictionary', help='Compression dictionary written by train_dictionary.py (default: built-in dictionary)')
 args = parser.parse_args()
 
+#load compression dictionary (if requested)
+if args.dictionary:
+    try:
+        lostik_message.load_dictionary(args.dictionary)
+    except OSError:
+        print('ERROR: Unable to read compression dictionary!')
+        print('Unable to proceed, now exiting!')
+        sys.exit(1)
+
 ##### BEGIN LOSTIK STARTUP #####
 
 #check to see if the port descriptor path exists (determines if device is connected on linux systems)
@@ -146,7 +160,8 @@ print('Purpose')
 print('-------')
 print('This utility connects to the LoStik via its serial interfact and instructs')
 print('it to perform a series of test transmissions whilst cycling through')
-print('various modulation parameters (spreading factor, coding rate and bandwidth).')
+print('various modulation parameters (spreading factor, coding rate, bandwidth and')
+print('preamble length).')
 print('All test transmissions carry an identical simple text payload that allows')
 print('the user to observe how the different modulation parameters impact the actual')
 print('transmission (transmission length/time-on-air, consumed spectral bandwidth,)')
@@ -209,13 +224,19 @@ input('Press Enter to continue...')
 #let's establish the test messages that will be sent OTA
 #63 byte message
 message_short = "['1','K7CTC','K2SEC','We arrived at camp... Weather is great!']"
-message_short_hex = b"['1','K7CTC','K2SEC','We arrived at camp... Weather is great!']".hex()
+message_short_bytes = message_short.encode('ASCII')
+#compressed message (if requested)
+if args.compress:
+    message_short_bytes = lostik_message.compress(message_short_bytes)
+    print('Short message compressed from ' + str(len(message_short)) + ' to ' + str(len(message_short_bytes)) + ' bytes.')
+#the transmit command line for the short message is the same for every test, so it is built once
+command_short = lostik_serial.tx_command(message_short_bytes)
 #255 byte message
 message_long = 'Lorem ipsum dolor sit amet, consectetur adipiscing elit. Ut augue augue, volutpat quis nisi vitae, venenatis vestibulum justo. Phasellus neque nisi, eleifend sed enim eu, imperdiet faucibus orci. Nam ut lectus velit. Aliquam vel orci a massa semper metus.'
 message_long_hex = b'Lorem ipsum dolor sit amet, consectetur adipiscing elit. Ut augue augue, volutpat quis nisi vitae, venenatis vestibulum justo. Phasellus neque nisi, eleifend sed enim eu, imperdiet faucibus orci. Nam ut lectus velit. Aliquam vel orci a massa semper metus.'.hex()
 
 #function for running test transmissions
-def run_test(sf_value, cr_value, bw_value, msg_len):
+def run_test(sf_value, cr_value, bw_value, msg_len, prlen_value=b'8'):
     #settings to be written to LoStik
     #Spreading Factor (default=sf12)
     set_sf = sf_value                       #values: sf7, sf8, sf9, sf10, sf11, sf12
@@ -223,9 +244,11 @@ def run_test(sf_value, cr_value, bw_value, msg_len):
     set_cr = cr_value                        #values: 4/5, 4/6, 4/7, 4/8
     #Radio Bandwidth (default=125)
     set_bw = bw_value                        #values: 125, 250, 500
+    #Preamble Length (default=8)
+    set_prlen = prlen_value                  #value range: 6 to 65535
 
     #write settings to LoStik
-    os.system('clear')
+    lostik_console.clear_screen()
     print('Writing LoStik Settings')
     print('-----------------------')
     #place LEDs in a "config" state
@@ -239,7 +262,10 @@ def run_test(sf_value, cr_value, bw_value, msg_len):
     print('      Set Coding Rate = ' + set_cr.decode('ASCII') + ': ' + lostik.readline().decode('ASCII'), end='')
     #set radio bandwidth (default: 125)
     lostik.write(b''.join([b'radio set bw ', set_bw, end_line]))
-    print('  Set Radio Bandwidth = ' + set_bw.decode('ASCII') + ': ' + lostik.readline().decode('ASCII'))
+    print('  Set Radio Bandwidth = ' + set_bw.decode('ASCII') + ': ' + lostik.readline().decode('ASCII'), end='')
+    #set preamble length (default: 8)
+    lostik.write(b''.join([b'radio set prlen ', set_prlen, end_line]))
+    print('  Set Preamble Length = ' + set_prlen.decode('ASCII') + ': ' + lostik.readline().decode('ASCII'))
     #place LEDs back into a neutral state
     time.sleep(.5)
     led_control('rx', 'off')
@@ -256,10 +282,8 @@ def run_test(sf_value, cr_value, bw_value, msg_len):
     tx_end_time = 0
     if msg_len == 'short':
         print('PLAIN TEXT: ' + message_short)
-        assemble_command = 'radio tx ' + str(message_short_hex) + '\r\n'
-        command = assemble_command.encode('ASCII')
-        print('  RAW DATA: ' + command.decode('ASCII').rstrip() + '\n')
-        lostik.write(command)
+        print('  RAW DATA: ' + command_short.decode('ASCII').rstrip() + '\n')
+        lostik.write(command_short)
         if lostik.readline().decode('ASCII').rstrip() == 'ok':
             tx_start_time = int(round(time.time()*1000)) #get current unix epoch time in milliseconds
             led_control('tx', 'on')
@@ -277,7 +301,8 @@ def run_test(sf_value, cr_value, bw_value, msg_len):
             tx_end_time = int(round(time.time()*1000))
             led_control('tx', 'off')
             time_on_air = tx_end_time - tx_start_time
-            incremental_print('DONE!  Total time on air: ' + str(time_on_air) + 'ms\n\n')
+            predicted_time_on_air = lora_phy.time_on_air(len(message_short_bytes), set_sf, set_bw, set_cr, preamble=int(set_prlen))
+            incremental_print('DONE!  Total time on air: ' + str(time_on_air) + 'ms (predicted: ' + str(int(round(predicted_time_on_air))) + 'ms)\n\n')
         elif response == 'radio_err':
             led_control('tx', 'off')
             incremental_print('FAIL!\n')
@@ -291,6 +316,9 @@ run_test(b'sf12', b'4/5', b'125', 'short')
 run_test(b'sf12', b'4/8', b'125', 'short')
 run_test(b'sf12', b'4/5', b'500', 'short')
 run_test(b'sf12', b'4/8', b'500', 'short')
+#the preamble is the cheapest part of the frame to shorten (both ends of a link should match)
+run_test(b'sf12', b'4/5', b'125', 'short', b'6')
+run_test(b'sf12', b'4/5', b'125', 'short', b'16')
 
 #run_test(b'sf12', b'4/5', b'125', 'long')
 #run_test(b'sf7', b'4/5', b'125', 'long')
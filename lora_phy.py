@@ -0,0 +1,110 @@
+##############################################################################
+#                                                                            #
+#  DEVELOPED BY:  Chris Clement (K7CTC)                                      #
+#       VERSION:  v1.0                                                       #
+#   DESCRIPTION:  LoRa and FSK physical layer reference values shared by     #
+#                 the LoStik utilities.  This file is not meant to be run    #
+#                 directly, it is imported by the utilities that need it.    #
+#                                                                            #
+#   INFORMATION:  Demodulation floors are the typical SNR limits published   #
+#                 in the Semtech SX1276 datasheet (the radio inside the      #
+#                 Microchip RN2903).  Time on air follows the formula in     #
+#                 Semtech application note AN1200.13.  FSK frames are        #
+#                 counted byte by byte: preamble, sync word, length byte,    #
+#                 payload and CRC.  The SX1276 receive and AFC filter        #
+#                 bandwidths are single sideband, so the filter must cover   #
+#                 the frequency deviation plus half the bitrate.             #
+#                                                                            #
+##############################################################################
+
+#lowest SNR (in dB) at which each spreading factor can still be demodulated
+snr_floor = {
+    7: -7.5,
+    8: -10.0,
+    9: -12.5,
+    10: -15.0,
+    11: -17.5,
+    12: -20.0,
+}
+
+#function to convert a spreading factor setting (b'sf12', 'sf12' or 12) to an integer
+def sf_number(sf):
+    if isinstance(sf, bytes):
+        sf = sf.decode('ASCII')
+    if isinstance(sf, str):
+        sf = sf.lower().replace('sf', '')
+    sf = int(sf)
+    if sf not in snr_floor:
+        raise ValueError('spreading factor out of range: ' + str(sf))
+    return sf
+
+#function to convert a bandwidth setting (b'125', '125' or 125) to kHz
+def bw_khz(bw):
+    if isinstance(bw, bytes):
+        bw = bw.decode('ASCII')
+    bw = int(bw)
+    if bw not in (125, 250, 500):
+        raise ValueError('bandwidth out of range: ' + str(bw))
+    return bw
+
+#function to convert a coding rate setting (b'4/5', '4/5' or an AN1200.13 CR value) to the AN1200.13 CR value (1 to 4)
+def cr_number(cr):
+    if isinstance(cr, bytes):
+        cr = cr.decode('ASCII')
+    if isinstance(cr, str):
+        cr = int(cr.split('/')[1]) - 4
+    if cr not in (1, 2, 3, 4):
+        raise ValueError('coding rate out of range: ' + str(cr))
+    return cr
+
+#function to obtain the duration of one LoRa symbol in milliseconds
+def symbol_time(sf, bw):
+    return (2 ** sf_number(sf)) / bw_khz(bw)
+
+#function to obtain the time on air of one LoRa frame in milliseconds
+def time_on_air(payload_length, sf=12, bw=125, cr='4/5', preamble=8, crc=True, explicit_header=True):
+    sf = sf_number(sf)
+    t_sym = symbol_time(sf, bw)
+    #low data rate optimization is mandated when a symbol lasts longer than 16ms (sf11 and sf12 at 125kHz)
+    de = 1 if t_sym > 16 else 0
+    ih = 0 if explicit_header else 1
+    numerator = 8 * payload_length - 4 * sf + 28 + 16 * int(crc) - 20 * ih
+    payload_symbols = 8 + max(-(-numerator // (4 * (sf - 2 * de))) * (cr_number(cr) + 4), 0)
+    return (preamble + 4.25) * t_sym + payload_symbols * t_sym
+
+#function to obtain the SNR margin above the demodulation floor for a given spreading factor
+def snr_margin(snr, sf):
+    return float(snr) - snr_floor[sf_number(sf)]
+
+#largest payload the RN2903 will transmit in each modulation mode (bytes)
+lora_max_payload = 255
+fsk_max_payload = 64
+
+#FSK bitrate range of the RN2903 (bits per second)
+fsk_min_bitrate = 1
+fsk_max_bitrate = 300000
+
+#receive and AFC filter bandwidths the RN2903 accepts in FSK mode (kHz, as written to radio set rxbw/afcbw)
+fsk_filter_bandwidths = ('2.6', '3.1', '3.9', '5.2', '6.3', '7.8', '10.4', '12.5', '15.6', '20.8', '25', '31.3', '41.7', '50', '62.5', '83.3', '100', '125', '166.7', '200', '250')
+
+#Gaussian filter settings the RN2903 accepts in FSK mode (bandwidth-time product)
+fsk_gaussian_shaping = ('none', '1.0', '0.5', '0.3')
+
+#function to obtain the time on air of one FSK frame in milliseconds (preamble and sync word lengths in bytes)
+def fsk_time_on_air(payload_length, bitrate=50000, preamble=5, sync_length=1, crc=True):
+    frame_bytes = preamble + sync_length + 1 + payload_length + 2 * int(crc)
+    return frame_bytes * 8 / float(bitrate) * 1000
+
+#function to choose a frequency deviation (in Hz) for a bitrate: a modulation index of 1 where the widest filter allows it
+def fsk_fdev(bitrate):
+    bitrate = int(bitrate)
+    return int(min(bitrate / 2, 250000 - bitrate / 2))
+
+#function to choose the narrowest receive filter (kHz setting string) that passes a bitrate at a frequency deviation
+#margin_khz widens the filter for frequency error between the two radios (the AFC filter uses it)
+def fsk_rxbw(bitrate, fdev, margin_khz=0):
+    needed = (int(fdev) + int(bitrate) / 2) / 1000 + margin_khz
+    for bandwidth in fsk_filter_bandwidths:
+        if float(bandwidth) >= needed:
+            return bandwidth
+    return fsk_filter_bandwidths[-1]
@@ -0,0 +1,169 @@
+##############################################################################
+#                                                                            #
+#  DEVELOPED BY:  Chris Clement (K7CTC)                                      #
+#       VERSION:  v1.0                                                       #
+#   DESCRIPTION:  Link adaptation shared by the LoStik utilities: adaptive   #
+#                 data rate and transmit power control.  This file is not    #
+#                 meant to be run directly.                                  #
+#                                                                            #
+#                 The rate controller picks the fastest spreading factor     #
+#                 and bandwidth that keeps the link SNR a margin above the   #
+#                 demodulation floor (see lora_phy.py).  When the margin     #
+#                 shrinks it falls back at once to a rate that restores it;  #
+#                 when the margin grows it speeds up one step at a time,     #
+#                 and only once the faster rate would still clear the        #
+#                 margin by the hysteresis.  After too many missed replies   #
+#                 both nodes return to the default rate to meet again.       #
+#                                                                            #
+#                 The power controller lowers the transmit power one dB at   #
+#                 a time while the far end reports more than the margin      #
+#                 (plus the hysteresis), raises it at once by the shortfall  #
+#                 when it reports less, and raises it a few dB for every     #
+#                 missed reply.  It also keeps an estimate of the energy     #
+#                 spent transmitting.                                        #
+#                                                                            #
+#   INFORMATION:  The SNR the radio reports is measured in the channel       #
+#                 bandwidth, so it barely depends on the spreading factor    #
+#                 but drops about 3dB each time the bandwidth doubles.       #
+#                 Transmit current is estimated from the output power with   #
+#                 a fixed power amplifier efficiency, which matches the      #
+#                 SX1276 datasheet figures at the top of the range but is    #
+#                 only a rough guide lower down.                             #
+#                                                                            #
+##############################################################################
+
+#import required modules
+import math
+import lora_phy
+
+#the rate every node starts on and falls back to
+default_rate = (12, 125)
+
+#transmit power range of the RN2903 in dBm
+min_power = 2
+max_power = 20
+
+#transmit supply current estimate: supply voltage (V), current drawn besides the power amplifier (mA) and power amplifier efficiency
+supply_voltage = 3.3
+tx_base_current = 20
+pa_efficiency = 0.3
+
+#function to estimate the supply current (in mA) while transmitting at a given output power (in dBm)
+def tx_current(power):
+    return tx_base_current + 10 ** (power / 10) / (supply_voltage * pa_efficiency)
+
+class RateController:
+    #margin: SNR (in dB) to keep above the demodulation floor
+    #hysteresis: extra margin (in dB) a faster rate must have before switching to it
+    #bandwidths: bandwidths (in kHz) the controller may choose from
+    #max_misses: consecutive missed replies before falling back to the default rate
+    def __init__(self, margin=10, hysteresis=3, bandwidths=(125, 250, 500), max_misses=3, default=default_rate):
+        self.margin = margin
+        self.hysteresis = hysteresis
+        self.max_misses = max_misses
+        self.default = default
+        #every allowed rate, fastest first (airtime of a short frame)
+        self.rates = sorted(((sf, bw) for sf in lora_phy.snr_floor for bw in bandwidths), key=lambda rate: (lora_phy.time_on_air(16, rate[0], rate[1]), rate[0]))
+        if default not in self.rates:
+            self.rates.append(default)
+        self.current = default
+        self.misses = 0
+        self.stats = {'faster': 0, 'slower': 0, 'fallbacks': 0}
+
+    #function to estimate the SNR margin a rate would have, given an SNR measured at the current rate
+    def estimate_margin(self, snr, rate):
+        sf, bw = rate
+        return snr - 10 * math.log10(bw / self.current[1]) - lora_phy.snr_floor[sf]
+
+    #function to choose a rate from the SNR of the latest exchange (returns the new rate, or None to stay put)
+    def observe(self, snr):
+        self.misses = 0
+        if self.estimate_margin(snr, self.current) < self.margin:
+            #the fastest rate that restores the margin (or the slowest there is)
+            slower = [rate for rate in self.rates if self.estimate_margin(snr, rate) >= self.margin]
+            rate = slower[0] if slower else self.rates[-1]
+            if self.airtime(rate) <= self.airtime(self.current):
+                return None
+            return rate
+        #the next faster rate, if it clears the margin with room to spare
+        faster = [rate for rate in self.rates if self.airtime(rate) < self.airtime(self.current)]
+        if faster and self.estimate_margin(snr, faster[-1]) >= self.margin + self.hysteresis:
+            return faster[-1]
+        return None
+
+    #function to record that both nodes are now on a new rate
+    def switch(self, rate):
+        if rate != self.current:
+            self.stats['faster' if self.airtime(rate) < self.airtime(self.current) else 'slower'] += 1
+        self.current = rate
+        self.misses = 0
+
+    #function to record a missed reply (returns the default rate when it is time to fall back, otherwise None)
+    def missed(self):
+        self.misses += 1
+        if self.misses >= self.max_misses and self.current != self.default:
+            self.stats['fallbacks'] += 1
+            return self.default
+        return None
+
+    def airtime(self, rate):
+        return lora_phy.time_on_air(16, rate[0], rate[1])
+
+    #function to obtain a one line summary of the controller statistics
+    def summary(self):
+        return ('ADR rate: sf' + str(self.current[0]) + '/' + str(self.current[1]) + 'kHz  faster: ' + str(self.stats['faster'])
+                + '  slower: ' + str(self.stats['slower']) + '  fallbacks: ' + str(self.stats['fallbacks']))
+
+class PowerController:
+    #margin: SNR (in dB) the far end should see above the demodulation floor
+    #hysteresis: extra margin (in dB) needed before lowering the power
+    #loss_step: dB added for every missed reply
+    def __init__(self, margin=10, hysteresis=3, minimum=min_power, maximum=max_power, loss_step=3):
+        self.margin = margin
+        self.hysteresis = hysteresis
+        self.minimum = minimum
+        self.maximum = maximum
+        self.loss_step = loss_step
+        #start at full power so the first exchange gets through
+        self.power = maximum
+        self.stats = {'lowered': 0, 'raised': 0, 'energy': 0.0, 'frames': 0, 'delivered': 0}
+
+    #function to choose the power from the SNR the far end reported (returns the new power, or None to stay put)
+    def observe(self, snr, sf):
+        margin = lora_phy.snr_margin(snr, sf)
+        if margin < self.margin:
+            power = min(self.maximum, self.power + math.ceil(self.margin - margin))
+        elif margin >= self.margin + self.hysteresis:
+            power = max(self.minimum, self.power - 1)
+        else:
+            return None
+        return self.change(power)
+
+    #function to record a missed reply (returns the new power, or None if already at full power)
+    def missed(self):
+        return self.change(min(self.maximum, self.power + self.loss_step))
+
+    def change(self, power):
+        if power == self.power:
+            return None
+        self.stats['lowered' if power < self.power else 'raised'] += 1
+        self.power = power
+        return power
+
+    #function to record a frame sent at the current power (airtime in milliseconds)
+    def record_tx(self, airtime):
+        #mA * ms * V is microjoules, kept in millijoules
+        self.stats['energy'] += tx_current(self.power) * airtime * supply_voltage / 1000
+        self.stats['frames'] += 1
+
+    #function to record a message the far end confirmed
+    def delivered(self):
+        self.stats['delivered'] += 1
+
+    #function to obtain a one line summary of the controller statistics
+    def summary(self):
+        text = ('TX power: ' + str(self.power) + 'dBm  lowered: ' + str(self.stats['lowered']) + '  raised: ' + str(self.stats['raised'])
+                + '  TX energy: ' + format(self.stats['energy'], '.0f') + 'mJ in ' + str(self.stats['frames']) + ' frames')
+        if self.stats['delivered']:
+            text += ', ' + format(self.stats['energy'] / self.stats['delivered'], '.1f') + 'mJ per delivered message'
+        return text
@@ -0,0 +1,92 @@
+##############################################################################
+#                                                                            #
+#  DEVELOPED BY:  Chris Clement (K7CTC)                                      #
+#       VERSION:  v1.0                                                       #
+#   DESCRIPTION:  Reception capture file helpers shared by the LoStik        #
+#                 utilities.  Receivers append one CSV row per received      #
+#                 packet and link_stats.py loads the rows back into NumPy    #
+#                 arrays for analysis.  This file is not meant to be run     #
+#                 directly.                                                  #
+#                                                                            #
+#   INFORMATION:  Capture columns are: rx_time (unix epoch milliseconds),    #
+#                 rssi (dBm), snr (dB, nan when there is none, such as in    #
+#                 FSK mode), sf (7 to 12, 0 in FSK mode), seq (-1 when the   #
+#                 payload carries no sequence number), freq (Hz, 0 when not  #
+#                 known) and payload (hex).  Older captures have no freq     #
+#                 column, payload is always the last column.                 #
+#                                                                            #
+##############################################################################
+
+#import required modules
+import pathlib
+import lostik_message
+
+#capture file column names (written as the first line of every new capture file)
+capture_header = 'rx_time,rssi,snr,sf,seq,freq,payload'
+
+#function to obtain the sequence number carried in a payload (returns -1 when there is none)
+def payload_sequence(payload):
+    #binary messages (see lostik_message.py) carry a sequence number field
+    message = lostik_message.decode(payload)
+    if message is not None and 'seq' in message:
+        return message['seq']
+    if message is not None and message['type'] == 'text':
+        payload = message['text'].encode('UTF-8')
+    #structured text records look like: ['1','K7CTC','K2SEC','We arrived at camp...']
+    if payload.startswith(b"['"):
+        seq_field = payload[2:].split(b"'", 1)[0]
+        if seq_field.isdigit():
+            return int(seq_field)
+    return -1
+
+#function to obtain the sending station carried in a payload (returns None when there is none)
+def payload_source(payload):
+    message = lostik_message.decode(payload)
+    if message is not None and message['type'] == 'text':
+        payload = message['text'].encode('UTF-8')
+    #the sender is the second field of a structured text record
+    if payload.startswith(b"['"):
+        fields = payload[2:].split(b"','", 2)
+        if len(fields) == 3 and fields[1]:
+            return fields[1].decode('UTF-8', 'replace')
+    return None
+
+#function to open a capture file for appending (the header is written if the file is new)
+def open_capture(path):
+    capture_path = pathlib.Path(path)
+    new_file = not capture_path.exists() or capture_path.stat().st_size == 0
+    capture_file = open(capture_path, 'a')
+    if new_file:
+        capture_file.write(capture_header + '\n')
+    return capture_file
+
+#function to format one capture row (snr and sf are None in FSK mode, rssi and snr are None when the radio gave no reading, freq is None when not known)
+def capture_row(rx_time, rssi, snr, sf, payload, freq=None):
+    return ','.join([str(rx_time), 'nan' if rssi is None else str(rssi), 'nan' if snr is None else str(snr), str(sf or 0), str(payload_sequence(payload)), str(freq or 0), payload.hex()]) + '\n'
+
+#function to load the payload column of a capture file (returns a list of bytes)
+def load_payloads(path):
+    payloads = []
+    with open(path) as capture_file:
+        next(capture_file, None)
+        for row in capture_file:
+            payload_hex = row.rstrip('\n').rsplit(',', 1)[-1]
+            try:
+                payloads.append(bytes.fromhex(payload_hex))
+            except ValueError:
+                continue
+    return payloads
+
+#function to load the numeric capture columns into NumPy arrays (sorted by rx_time)
+def load_capture(path):
+    #numpy is only needed for analysis, so it is not a requirement for the receivers
+    import numpy as np
+    data = np.loadtxt(path, delimiter=',', skiprows=1, usecols=(0, 1, 2, 3, 4), dtype=np.float64, ndmin=2)
+    data = data[np.argsort(data[:, 0], kind='stable')]
+    return {
+        'rx_time': data[:, 0].astype(np.int64),
+        'rssi': data[:, 1],
+        'snr': data[:, 2],
+        'sf': data[:, 3].astype(np.int64),
+        'seq': data[:, 4].astype(np.int64),
+    }
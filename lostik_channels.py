@@ -0,0 +1,87 @@
+##############################################################################
+#                                                                            #
+#  DEVELOPED BY:  Chris Clement (K7CTC)                                      #
+#       VERSION:  v1.0                                                       #
+#   DESCRIPTION:  Channel plan and channel selection shared by the LoStik    #
+#                 utilities.  This file is not meant to be run directly.     #
+#                                                                            #
+#                 A receiving host runs one LoStik per channel (see rx.py),  #
+#                 so every channel in the plan is heard at once and the      #
+#                 network carries as many frames at a time as there are      #
+#                 radios.  Senders spread their messages over the channels   #
+#                 either by hash (a message always maps to the same          #
+#                 channel) or least recently used (each message goes to the  #
+#                 channel that has been idle longest).                       #
+#                                                                            #
+#   INFORMATION:  The default plan is the eight US915 downlink channels      #
+#                 (923.3MHz to 927.5MHz, 600kHz apart), wide enough apart    #
+#                 for any LoRa bandwidth.  The first channel is the one      #
+#                 every utility uses on its own, so a single radio setup is  #
+#                 channel 0 of the plan.                                     #
+#                                                                            #
+##############################################################################
+
+#import required modules
+import zlib
+
+#frequency range the RN2903 accepts (Hz)
+min_frequency = 902000000
+max_frequency = 928000000
+
+#the default channel plan (Hz)
+plan_first = 923300000
+plan_spacing = 600000
+plan_channels = 8
+
+#channel selection policies
+policy_hash = 'hash'
+policy_lru = 'lru'
+
+#function to obtain the first count channels of a plan (in Hz)
+def channel_plan(count=plan_channels, first=plan_first, spacing=plan_spacing):
+    channels = [first + spacing * index for index in range(count)]
+    if count < 1 or channels[0] < min_frequency or channels[-1] > max_frequency:
+        raise ValueError('channel plan out of range: ' + str(count) + ' channels from ' + str(first) + 'Hz')
+    return channels
+
+#function to parse a --channels argument: a number of channels from the default plan (e.g. 4) or comma separated frequencies in Hz
+def parse_channels(text):
+    if ',' not in text and int(text) < min_frequency:
+        return channel_plan(int(text))
+    channels = [int(frequency) for frequency in text.split(',')]
+    for frequency in channels:
+        if frequency < min_frequency or frequency > max_frequency:
+            raise ValueError('frequency out of range: ' + str(frequency))
+    if len(set(channels)) != len(channels):
+        raise ValueError('channel listed twice')
+    return channels
+
+#function to format a frequency in Hz as MHz
+def mhz(frequency):
+    return format(frequency / 1e6, '.1f') + 'MHz'
+
+#picks the channel for each outbound message
+class ChannelSelector:
+    def __init__(self, channels, policy=policy_lru):
+        if policy not in (policy_hash, policy_lru):
+            raise ValueError('unknown channel policy: ' + str(policy))
+        self.channels = list(channels)
+        self.policy = policy
+        #channels in the order they were last used, least recently used first
+        self.idle_order = list(self.channels)
+        self.stats = dict.fromkeys(self.channels, 0)
+
+    #function to choose a channel (key is the message, used by the hash policy)
+    def pick(self, key=b''):
+        if self.policy == policy_hash:
+            channel = self.channels[zlib.crc32(key) % len(self.channels)]
+        else:
+            channel = self.idle_order[0]
+        self.idle_order.remove(channel)
+        self.idle_order.append(channel)
+        self.stats[channel] += 1
+        return channel
+
+    #function to obtain a one line summary of the messages sent on each channel
+    def summary(self):
+        return 'Channels (' + self.policy + '): ' + '  '.join(mhz(channel) + ': ' + str(self.stats[channel]) for channel in self.channels)
@@ -0,0 +1,139 @@
+##############################################################################
+#                                                                            #
+#  DEVELOPED BY:  Chris Clement (K7CTC)                                      #
+#       VERSION:  v1.0                                                       #
+#   DESCRIPTION:  Console output helpers shared by the LoStik utilities.     #
+#                 This file is not meant to be run directly.                 #
+#                                                                            #
+#                 Console buffers everything the radio loop writes and a     #
+#                 background thread flushes it to stdout a few times per     #
+#                 second, so a slow terminal, SSH session or redirected file #
+#                 never holds up the radio.  It also offers a quiet mode     #
+#                 (no per-packet output) and a rate-limited status line      #
+#                 for high packet rates.                                     #
+#                                                                            #
+#                 StartupTimeline records how long a utility takes to get    #
+#                 from process start to listening.                           #
+#                                                                            #
+##############################################################################
+
+#import required modules
+import os
+import sys
+import threading
+import time
+
+#function to clear the terminal window without spawning a 'clear' subprocess
+def clear_screen():
+    if sys.stdout.isatty():
+        sys.stdout.write('\033[2J\033[H')
+        sys.stdout.flush()
+
+#buffered, rate-limited console output
+class Console:
+    #output buffered beyond this many characters is discarded (and counted) rather than growing without bound
+    max_buffered = 1048576
+
+    def __init__(self, quiet=False, status_interval=0.25, flush_interval=0.1, stream=None):
+        self.quiet = quiet
+        self.status_interval = status_interval
+        self.flush_interval = flush_interval
+        self.stream = stream or sys.stdout
+        self.tty = self.stream.isatty()
+        self.buffer = []
+        self.buffered = 0
+        self.discarded = 0
+        self.buffer_lock = threading.Lock()
+        self.status_text = ''
+        self.status_shown = ''
+        self.status_time = 0
+        self.running = True
+        self.flush_thread = threading.Thread(target=self.flush_loop, daemon=True)
+        self.flush_thread.start()
+
+    #function to queue text for output (ignored in quiet mode)
+    def write(self, text):
+        if self.quiet:
+            return
+        with self.buffer_lock:
+            if self.buffered + len(text) > self.max_buffered:
+                self.discarded += len(text)
+                return
+            self.buffer.append(text)
+            self.buffered += len(text)
+
+    #drop-in replacement for print() that goes through the buffer
+    def print(self, *values, sep=' ', end='\n'):
+        self.write(sep.join(str(value) for value in values) + end)
+
+    #function for progress output such as the 'Listening...' dots (terminals only, never redirected files)
+    def progress(self, text):
+        if self.tty:
+            self.write(text)
+
+    #function to set the status line (drawn at most once per status_interval, on terminals only)
+    def status(self, text):
+        self.status_text = text
+
+    #background thread: write buffered text, then redraw the status line if it is due
+    def flush_loop(self):
+        while self.running:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def flush(self):
+        with self.buffer_lock:
+            text = ''.join(self.buffer)
+            self.buffer = []
+            self.buffered = 0
+        now = time.monotonic()
+        redraw_status = self.tty and self.status_text != self.status_shown and now - self.status_time >= self.status_interval
+        if not text and not redraw_status:
+            return
+        if self.tty and self.status_shown and text:
+            #erase the status line so normal output starts on a clean line, then draw it again below
+            text = '\r\033[K' + text
+            redraw_status = True
+        if redraw_status:
+            if self.status_text:
+                text += '\r\033[K' + self.status_text
+            self.status_shown = self.status_text
+            self.status_time = now
+        self.stream.write(text)
+        self.stream.flush()
+
+    #stop the flush thread and write out whatever is left
+    def close(self):
+        self.running = False
+        self.flush_thread.join()
+        self.flush()
+        if self.tty and self.status_shown:
+            self.stream.write('\n')
+        if self.discarded:
+            self.stream.write('NOTE: ' + str(self.discarded) + ' characters of console output were discarded because the console could not keep up.\n')
+        self.stream.flush()
+
+#function to obtain the unix epoch time at which this process was started (linux only, otherwise returns None)
+def process_start_time():
+    try:
+        with open('/proc/self/stat') as stat_file:
+            #the command name (field 2) may contain spaces, so count fields from the closing parenthesis
+            start_ticks = int(stat_file.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/uptime') as uptime_file:
+            uptime = float(uptime_file.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        return None
+    return time.time() - (uptime - start_ticks / os.sysconf('SC_CLK_TCK'))
+
+#startup timeline (milestones are printed in milliseconds since process start)
+class StartupTimeline:
+    def __init__(self):
+        start_time = process_start_time()
+        self.marks = [('process start', start_time if start_time is not None else time.time())]
+
+    def mark(self, label):
+        self.marks.append((label, time.time()))
+
+    def report(self):
+        start_time = self.marks[0][1]
+        return 'Startup timeline: ' + '  '.join(label + ' +' + str(int(round((mark_time - start_time) * 1000))) + 'ms' for label, mark_time in self.marks)
@@ -0,0 +1,127 @@
+##############################################################################
+#                                                                            #
+#  DEVELOPED BY:  Chris Clement (K7CTC)                                      #
+#       VERSION:  v1.0                                                       #
+#   DESCRIPTION:  Forward error correction shared by the LoStik utilities.   #
+#                 This file is not meant to be run directly.                 #
+#                                                                            #
+#                 A block of equal length data fragments is extended with    #
+#                 parity fragments using a systematic Reed-Solomon erasure   #
+#                 code (Cauchy matrix over GF(256)).  The receiver can       #
+#                 rebuild the block from ANY data count of the fragments,    #
+#                 so up to parity count lost frames are recovered without    #
+#                 asking for a retransmission.                               #
+#                                                                            #
+#   INFORMATION:  A lost LoRa frame is never delivered at all (the radio     #
+#                 checks the CRC), so only erasures need correcting and the  #
+#                 receiver always knows which fragments are missing.         #
+#                 Fragment data is multiplied a whole fragment at a time     #
+#                 with bytes.translate() and added (XOR) as one big          #
+#                 integer, which keeps the work in C.                        #
+#                                                                            #
+##############################################################################
+
+#import required modules
+import math
+
+#largest number of data plus parity fragments in one block
+max_fragments = 256
+
+##### BEGIN GF(256) ARITHMETIC #####
+
+#exponent and logarithm tables for GF(256) with the polynomial x^8+x^4+x^3+x^2+1 (0x11d)
+gf_exp = [0] * 512
+gf_log = [0] * 256
+value = 1
+for power in range(255):
+    gf_exp[power] = value
+    gf_log[value] = power
+    value <<= 1
+    if value & 0x100:
+        value ^= 0x11d
+for power in range(255, 512):
+    gf_exp[power] = gf_exp[power - 255]
+
+def gf_mul(a, b):
+    if a == 0 or b == 0:
+        return 0
+    return gf_exp[gf_log[a] + gf_log[b]]
+
+def gf_inv(a):
+    return gf_exp[255 - gf_log[a]]
+
+#translation tables: mul_tables[c] maps every byte to that byte multiplied by c
+mul_tables = [bytes(gf_mul(c, byte) for byte in range(256)) for c in range(256)]
+
+#coefficient of data fragment i in parity fragment j (any square submatrix of a Cauchy matrix is invertible)
+def cauchy(j, i, data_count):
+    return gf_inv((data_count + j) ^ i)
+
+#function to obtain the sum of coefficient * fragment over several fragments (as bytes of the given length)
+def combine(coefficients, fragments, length):
+    total = 0
+    for coefficient, fragment in zip(coefficients, fragments):
+        if coefficient:
+            total ^= int.from_bytes(fragment.translate(mul_tables[coefficient]), 'big')
+    return total.to_bytes(length, 'big')
+
+#function to invert a square matrix over GF(256) (Gauss-Jordan elimination)
+def invert(matrix):
+    size = len(matrix)
+    rows = [list(row) + [1 if column == index else 0 for column in range(size)] for index, row in enumerate(matrix)]
+    for column in range(size):
+        pivot = next(index for index in range(column, size) if rows[index][column])
+        rows[column], rows[pivot] = rows[pivot], rows[column]
+        scale = gf_inv(rows[column][column])
+        rows[column] = [gf_mul(scale, element) for element in rows[column]]
+        for index in range(size):
+            factor = rows[index][column]
+            if index != column and factor:
+                rows[index] = [element ^ gf_mul(factor, pivot_element) for element, pivot_element in zip(rows[index], rows[column])]
+    return [row[size:] for row in rows]
+
+##### END GF(256) ARITHMETIC #####
+
+##### BEGIN ENCODER/DECODER #####
+
+#function to obtain the number of parity fragments needed to survive the loss of a fraction of a block
+def parity_count(data_count, fraction):
+    parity = math.ceil(data_count * fraction - 1e-9) if fraction > 0 else 0
+    return max(0, min(parity, max_fragments - data_count))
+
+#function to obtain the parity fragments for a list of equal length data fragments
+def encode(data_fragments, parity):
+    data_count = len(data_fragments)
+    if data_count + parity > max_fragments:
+        raise ValueError('too many fragments in one block: ' + str(data_count + parity))
+    length = len(data_fragments[0])
+    return [combine([cauchy(j, i, data_count) for i in range(data_count)], data_fragments, length) for j in range(parity)]
+
+#function to rebuild the data fragments of a block from any data_count of its fragments
+#fragments maps fragment index (data fragments first, then parity) to fragment bytes
+#raises ValueError when too few fragments have been received or they are not all the same length
+def decode(fragments, data_count):
+    if len(set(len(fragment) for fragment in fragments.values())) > 1:
+        raise ValueError('fragments of different lengths in one block')
+    missing = [index for index in range(data_count) if index not in fragments]
+    if not missing:
+        return [fragments[index] for index in range(data_count)]
+    parity_indexes = sorted(index for index in fragments if index >= data_count)[:len(missing)]
+    if len(parity_indexes) < len(missing):
+        raise ValueError('not enough fragments to decode: ' + str(len(fragments)) + ' of ' + str(data_count))
+    length = len(fragments[parity_indexes[0]])
+    known = [index for index in range(data_count) if index in fragments]
+    #remove the contribution of the data fragments already received from each parity fragment
+    reduced = []
+    for parity_index in parity_indexes:
+        j = parity_index - data_count
+        contribution = int.from_bytes(combine([cauchy(j, i, data_count) for i in known], [fragments[i] for i in known], length), 'big')
+        reduced.append((int.from_bytes(fragments[parity_index], 'big') ^ contribution).to_bytes(length, 'big'))
+    #what is left is a small square system in the missing fragments only
+    inverse = invert([[cauchy(parity_index - data_count, i, data_count) for i in missing] for parity_index in parity_indexes])
+    rebuilt = dict(fragments)
+    for row, index in zip(inverse, missing):
+        rebuilt[index] = combine(row, reduced, length)
+    return [rebuilt[index] for index in range(data_count)]
+
+##### END ENCODER/DECODER #####
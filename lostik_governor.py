@@ -0,0 +1,108 @@
+##############################################################################
+#                                                                            #
+#  DEVELOPED BY:  Chris Clement (K7CTC)                                      #
+#       VERSION:  v1.0                                                       #
+#   DESCRIPTION:  Transmit airtime governor shared by the LoStik utilities.  #
+#                 This file is not meant to be run directly.                 #
+#                                                                            #
+#                 Every frame's time on air is worked out before it is       #
+#                 sent (see lora_phy.py).  A frame longer than the dwell     #
+#                 limit is rejected outright, and a frame that would take    #
+#                 the transmitter over its duty cycle budget (a fraction of  #
+#                 a sliding window) is deferred until enough earlier         #
+#                 airtime has aged out of the window.  The remaining budget  #
+#                 is exposed so schedulers can plan around it.               #
+#                                                                            #
+#   INFORMATION:  FCC part 15.247 limits frequency hopping systems to 400ms  #
+#                 dwell per channel, which even the shortest sf12/125kHz     #
+#                 frame exceeds, so both limits are off unless configured.   #
+#                 Check the rules that apply to your own station.            #
+#                                                                            #
+##############################################################################
+
+#import required modules
+import collections
+import time
+
+#frame check results
+tx_ok = 'ok'
+tx_defer = 'defer'
+tx_reject = 'reject'
+
+class AirtimeGovernor:
+    #max_dwell: longest single frame in milliseconds (None for no limit)
+    #duty_cycle: fraction of duty_window seconds the transmitter may be on air (None for no limit)
+    def __init__(self, max_dwell=None, duty_cycle=None, duty_window=3600):
+        self.max_dwell = max_dwell
+        self.duty_cycle = duty_cycle
+        self.duty_window = duty_window
+        #(start time, airtime in milliseconds) of every transmission still inside the window
+        self.history = collections.deque()
+        self.used = 0.0
+        self.stats = {'frames': 0, 'airtime': 0.0, 'deferred': 0, 'rejected': 0}
+
+    #total airtime budget per window in milliseconds (None for no limit)
+    @property
+    def budget(self):
+        if self.duty_cycle is None:
+            return None
+        return self.duty_cycle * self.duty_window * 1000
+
+    #function to check whether a frame could ever be sent (no longer than the dwell limit or the whole budget)
+    def permitted(self, airtime):
+        if self.max_dwell is not None and airtime > self.max_dwell:
+            return False
+        return self.budget is None or airtime <= self.budget
+
+    def forget(self, now):
+        while self.history and self.history[0][0] <= now - self.duty_window:
+            self.used -= self.history.popleft()[1]
+
+    #function to obtain the airtime (in milliseconds) that may still be used right now (None for no limit)
+    def remaining(self, now=None):
+        if self.budget is None:
+            return None
+        if now is None:
+            now = time.monotonic()
+        self.forget(now)
+        return max(0.0, self.budget - self.used)
+
+    #function to obtain the seconds until a frame of the given airtime may be sent (0 if it may be sent now)
+    def time_until(self, airtime, now=None):
+        if now is None:
+            now = time.monotonic()
+        remaining = self.remaining(now)
+        if remaining is None or airtime <= remaining:
+            return 0.0
+        #earlier transmissions age out of the window oldest first
+        for start_time, used in self.history:
+            remaining += used
+            if airtime <= remaining:
+                return start_time + self.duty_window - now
+        return float(self.duty_window)
+
+    #function to check a frame before it is sent (returns tx_ok, tx_defer or tx_reject)
+    def check(self, airtime, now=None):
+        if not self.permitted(airtime):
+            self.stats['rejected'] += 1
+            return tx_reject
+        if self.time_until(airtime, now) > 0:
+            self.stats['deferred'] += 1
+            return tx_defer
+        return tx_ok
+
+    #function to record a transmission once it has been sent
+    def record(self, airtime, now=None):
+        if now is None:
+            now = time.monotonic()
+        self.history.append((now, airtime))
+        self.used += airtime
+        self.stats['frames'] += 1
+        self.stats['airtime'] += airtime
+
+    #function to obtain a one line summary of the governor statistics
+    def summary(self):
+        text = 'Airtime used: ' + format(self.stats['airtime'] / 1000, '.1f') + 's in ' + str(self.stats['frames']) + ' frames  deferred: ' + str(self.stats['deferred']) + '  rejected: ' + str(self.stats['rejected'])
+        if self.budget is not None:
+            text += '  budget remaining: ' + format(self.remaining() / 1000, '.1f') + 's of ' + format(self.budget / 1000, '.1f') + 's per ' + format(self.duty_window, 'g') + 's'
+        return text
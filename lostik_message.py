@@ -0,0 +1,345 @@
+##############################################################################
+#                                                                            #
+#  DEVELOPED BY:  Chris Clement (K7CTC)                                      #
+#       VERSION:  v1.0                                                       #
+#   DESCRIPTION:  Compact binary message format shared by the LoStik         #
+#                 utilities (both the sending and receiving side use the     #
+#                 encoders and decoder below).  This file is not meant to    #
+#                 be run directly.                                           #
+#                                                                            #
+#                 Every message starts with a type byte followed by          #
+#                 big-endian struct packed fields:                           #
+#                                                                            #
+#                 ping        type, seq (uint16)                  3 bytes    #
+#                 pong        type, seq, rssi (int8), snr (int8)  5 bytes    #
+#                 pong_timed  type, seq, rx time (uint32 seconds +           #
+#                             uint16 milliseconds), rssi, snr     11 bytes   #
+#                 text        type, UTF-8 text                               #
+#                 fragment    type, message id (uint16), fragment index      #
+#                             (uint8), fragment count (uint8), data          #
+#                 file_offer  type, transfer id (uint16), file size          #
+#                             (uint32), crc32 (uint32), chunk size (uint8),  #
+#                             UTF-8 file name                                #
+#                 file_chunk  type, transfer id, chunk index (uint16),       #
+#                             flags (uint8), data                            #
+#                 file_ack    type, transfer id, status (uint8), base        #
+#                             (uint16), bitmap of the chunks after base      #
+#                 fec_fragment                                               #
+#                             type, message id (uint16), fragment index      #
+#                             (uint8), data count (uint8), parity count      #
+#                             (uint8), message length (uint16), data         #
+#                 aggregate   type, then for each message it carries:        #
+#                             length (uint8), message                        #
+#                 rate        type, seq, spreading factor         6 bytes    #
+#                             (uint8), bandwidth (uint16 kHz)                #
+#                 rate_ack    same as rate                        6 bytes    #
+#                 ping_report type, seq, rssi and snr of the      5 bytes    #
+#                             last pong heard                                #
+#                 relay       type, originator node id (uint16), seq,        #
+#                             hop count (uint8), hop limit (uint8), the      #
+#                             message being relayed (see lostik_relay.py)    #
+#                 beacon      type, seq (frame number), tx time   9 bytes    #
+#                             (uint32 seconds + uint16 milliseconds) of the  #
+#                             coordinator's clock (see lostik_tdma.py)       #
+#                                                                            #
+#                 Any message may be sent compressed: the high bit of the    #
+#                 type byte (0x80) is set and the rest of the message is     #
+#                 raw deflate data primed with a preset dictionary trained   #
+#                 on our traffic (see train_dictionary.py).  Receivers       #
+#                 decompress automatically, up to max_decompressed bytes,    #
+#                 so a small frame can't expand into an unbounded message.   #
+#                                                                            #
+#   INFORMATION:  Type bytes are below 0x20, so a binary message can never   #
+#                 be mistaken for the plain ASCII messages sent by older     #
+#                 versions of these utilities ('Ping!', 'ping', etc.).       #
+#                 Both ends must use the same compression dictionary.        #
+#                                                                            #
+##############################################################################
+
+#import required modules
+import struct
+import zlib
+
+#message type bytes
+msg_ping = 0x01
+msg_pong = 0x02
+msg_pong_timed = 0x03
+msg_text = 0x04
+msg_fragment = 0x05
+msg_file_offer = 0x06
+msg_file_chunk = 0x07
+msg_file_ack = 0x08
+msg_fec_fragment = 0x09
+msg_aggregate = 0x0A
+msg_rate = 0x0B
+msg_rate_ack = 0x0C
+msg_ping_report = 0x0D
+msg_relay = 0x0E
+msg_beacon = 0x0F
+
+#file_chunk flags (poll asks the receiver to answer with a file_ack)
+chunk_poll = 0x01
+
+#file_ack status values
+file_receiving = 0
+file_complete = 1
+file_failed = 2
+
+#message type names
+msg_names = {
+    msg_ping: 'ping',
+    msg_pong: 'pong',
+    msg_pong_timed: 'pong_timed',
+    msg_rate: 'rate',
+    msg_rate_ack: 'rate_ack',
+    msg_ping_report: 'ping_report',
+    msg_beacon: 'beacon',
+}
+
+#type byte flag marking a compressed message
+msg_compressed = 0x80
+#largest decompressed message body (in bytes), well above the largest message lostik_transport can fragment (63750 bytes)
+max_decompressed = 262144
+
+#preset compression dictionary (deflate finds matches best near the end, so the most common strings go last)
+compression_dictionary = (
+    b' the and to in of on for is are be will with from at by we you our this that have has not'
+    b' arrived leaving camp home base trail summit weather great good ok copy roger over out'
+    b' QTH QSL QRZ QSY 73 CQ de position battery temperature wind rain snow clear cloudy'
+    b' Weather is great!'
+    b"','K2SEC','K7CTC','"
+)
+
+#function to load a compression dictionary written by train_dictionary.py (replaces the preset dictionary)
+def load_dictionary(path):
+    global compression_dictionary
+    with open(path, 'rb') as dictionary_file:
+        compression_dictionary = dictionary_file.read()
+
+#struct layouts for the fixed length message types
+msg_formats = {
+    msg_ping: struct.Struct('>BH'),
+    msg_pong: struct.Struct('>BHbb'),
+    msg_pong_timed: struct.Struct('>BHIHbb'),
+    msg_rate: struct.Struct('>BHBH'),
+    msg_rate_ack: struct.Struct('>BHBH'),
+    msg_ping_report: struct.Struct('>BHbb'),
+    msg_beacon: struct.Struct('>BHIH'),
+}
+
+#fragment header layout (the fragment data follows the header, see lostik_transport.py)
+fragment_header = struct.Struct('>BHBB')
+
+#forward error corrected fragment header layout (see lostik_fec.py)
+fec_fragment_header = struct.Struct('>BHBBBH')
+
+#file transfer header layouts (see file_transfer.py)
+file_offer_header = struct.Struct('>BHIIB')
+file_chunk_header = struct.Struct('>BHHB')
+file_ack_header = struct.Struct('>BHBH')
+
+#relay header layout (the relayed message follows the header, see lostik_relay.py)
+relay_header = struct.Struct('>BHHBB')
+
+#function to squeeze a radio reply (such as '-87') into a signed byte
+def int8(value):
+    return max(-128, min(127, int(value)))
+
+##### BEGIN ENCODERS #####
+
+def encode_ping(seq):
+    return msg_formats[msg_ping].pack(msg_ping, seq & 0xFFFF)
+
+#a ping that also reports the rssi and snr the last pong was heard at (for transmit power control at the far end)
+def encode_ping_report(seq, rssi, snr):
+    return msg_formats[msg_ping_report].pack(msg_ping_report, seq & 0xFFFF, int8(rssi), int8(snr))
+
+#a pong echoes the sequence number of the ping it answers along with the rssi and snr the ping was heard at
+def encode_pong(seq, rssi, snr):
+    return msg_formats[msg_pong].pack(msg_pong, seq & 0xFFFF, int8(rssi), int8(snr))
+
+#same as encode_pong but also carries the unix epoch time (in milliseconds) the ping was received
+def encode_pong_timed(seq, rx_time, rssi, snr):
+    rx_seconds, rx_milliseconds = divmod(int(rx_time), 1000)
+    return msg_formats[msg_pong_timed].pack(msg_pong_timed, seq & 0xFFFF, rx_seconds & 0xFFFFFFFF, rx_milliseconds, int8(rssi), int8(snr))
+
+#a rate message asks the other node to switch to a new spreading factor and bandwidth (see lostik_adr.py), which it confirms with a rate_ack
+def encode_rate(seq, sf, bw):
+    return msg_formats[msg_rate].pack(msg_rate, seq & 0xFFFF, sf, bw)
+
+def encode_rate_ack(seq, sf, bw):
+    return msg_formats[msg_rate_ack].pack(msg_rate_ack, seq & 0xFFFF, sf, bw)
+
+def encode_text(text):
+    return bytes([msg_text]) + text.encode('UTF-8')
+
+def encode_fragment(message_id, index, count, data):
+    return fragment_header.pack(msg_fragment, message_id & 0xFFFF, index, count) + data
+
+#fragment indexes below data count carry message data, the rest carry parity
+def encode_fec_fragment(message_id, index, data_count, parity_count, length, data):
+    return fec_fragment_header.pack(msg_fec_fragment, message_id & 0xFFFF, index, data_count, parity_count, length) + data
+
+#several small messages packed into one frame (see lostik_transport.Aggregator)
+def encode_aggregate(messages):
+    return bytes([msg_aggregate]) + b''.join(bytes([len(message)]) + message for message in messages)
+
+def encode_file_offer(transfer_id, size, crc32, chunk_size, name):
+    return file_offer_header.pack(msg_file_offer, transfer_id & 0xFFFF, size, crc32, chunk_size) + name.encode('UTF-8')
+
+def encode_file_chunk(transfer_id, index, data, flags=0):
+    return file_chunk_header.pack(msg_file_chunk, transfer_id & 0xFFFF, index, flags) + data
+
+#the bitmap holds one bit per chunk following base (most significant bit first), set when that chunk has been received
+def encode_file_ack(transfer_id, status, base, bitmap=b''):
+    return file_ack_header.pack(msg_file_ack, transfer_id & 0xFFFF, status, base) + bitmap
+
+#a beacon carries the frame number and the time (unix epoch milliseconds) on the coordinator's clock as it is sent
+def encode_beacon(seq, tx_time):
+    tx_seconds, tx_milliseconds = divmod(int(tx_time), 1000)
+    return msg_formats[msg_beacon].pack(msg_beacon, seq & 0xFFFF, tx_seconds & 0xFFFFFFFF, tx_milliseconds)
+
+#a relayed message carries the node it came from and that node's sequence number, so every copy of it can be recognised
+def encode_relay(origin, seq, hops, hop_limit, message):
+    return relay_header.pack(msg_relay, origin & 0xFFFF, seq & 0xFFFF, hops, hop_limit) + message
+
+#function to compress a message (plain ASCII payloads are sent as compressed text messages)
+#returns the message unchanged if compression would not make it shorter
+def compress(payload):
+    if payload and payload[0] < 0x20:
+        msg_type, body = payload[0], payload[1:]
+    else:
+        msg_type, body = msg_text, payload
+    compressor = zlib.compressobj(9, zlib.DEFLATED, -15, 9, zdict=compression_dictionary)
+    compressed = bytes([msg_compressed | msg_type]) + compressor.compress(body) + compressor.flush()
+    if len(compressed) < len(payload):
+        return compressed
+    return payload
+
+##### END ENCODERS #####
+
+##### BEGIN DECODER #####
+
+#function to undo compress() (payloads without the compressed flag are returned unchanged)
+#raises ValueError if the payload is flagged as compressed but can't be decompressed, is not one complete
+#deflate stream or would expand past max_decompressed bytes
+def decompress(payload):
+    if not payload or not payload[0] & msg_compressed:
+        return payload
+    decompressor = zlib.decompressobj(-15, zdict=compression_dictionary)
+    try:
+        body = decompressor.decompress(payload[1:], max_decompressed)
+    except zlib.error:
+        raise ValueError('unable to decompress payload')
+    #input left over means the output limit was reached (or data follows the end of the stream)
+    if decompressor.unconsumed_tail or decompressor.unused_data or not decompressor.eof:
+        raise ValueError('unable to decompress payload')
+    return bytes([payload[0] & ~msg_compressed]) + body
+
+#function to decode a binary message (returns a dict, or None when the payload is not a binary message)
+def decode(payload):
+    try:
+        payload = decompress(payload)
+    except ValueError:
+        return None
+    if not payload:
+        return None
+    msg_type = payload[0]
+    if msg_type == msg_text:
+        return {'type': 'text', 'text': payload[1:].decode('UTF-8', errors='replace')}
+    if msg_type == msg_fragment:
+        if len(payload) < fragment_header.size:
+            return None
+        message_id, index, count = fragment_header.unpack_from(payload)[1:]
+        if index >= count:
+            return None
+        return {'type': 'fragment', 'id': message_id, 'index': index, 'count': count, 'data': payload[fragment_header.size:]}
+    if msg_type == msg_aggregate:
+        messages = []
+        position = 1
+        while position < len(payload):
+            length = payload[position]
+            if position + 1 + length > len(payload):
+                return None
+            messages.append(payload[position + 1:position + 1 + length])
+            position += 1 + length
+        return {'type': 'aggregate', 'messages': messages}
+    if msg_type == msg_fec_fragment:
+        if len(payload) < fec_fragment_header.size:
+            return None
+        message_id, index, data_count, parity_count, length = fec_fragment_header.unpack_from(payload)[1:]
+        if data_count == 0 or index >= data_count + parity_count:
+            return None
+        return {'type': 'fec_fragment', 'id': message_id, 'index': index, 'data_count': data_count, 'parity_count': parity_count,
+                'length': length, 'data': payload[fec_fragment_header.size:]}
+    if msg_type == msg_relay:
+        if len(payload) < relay_header.size:
+            return None
+        origin, seq, hops, hop_limit = relay_header.unpack_from(payload)[1:]
+        return {'type': 'relay', 'origin': origin, 'seq': seq, 'hops': hops, 'hop_limit': hop_limit, 'data': payload[relay_header.size:]}
+    if msg_type == msg_file_offer:
+        if len(payload) < file_offer_header.size:
+            return None
+        transfer_id, size, crc32, chunk_size = file_offer_header.unpack_from(payload)[1:]
+        return {'type': 'file_offer', 'id': transfer_id, 'size': size, 'crc32': crc32, 'chunk_size': chunk_size,
+                'name': payload[file_offer_header.size:].decode('UTF-8', errors='replace')}
+    if msg_type == msg_file_chunk:
+        if len(payload) < file_chunk_header.size:
+            return None
+        transfer_id, index, flags = file_chunk_header.unpack_from(payload)[1:]
+        return {'type': 'file_chunk', 'id': transfer_id, 'index': index, 'flags': flags, 'data': payload[file_chunk_header.size:]}
+    if msg_type == msg_file_ack:
+        if len(payload) < file_ack_header.size:
+            return None
+        transfer_id, status, base = file_ack_header.unpack_from(payload)[1:]
+        return {'type': 'file_ack', 'id': transfer_id, 'status': status, 'base': base, 'bitmap': payload[file_ack_header.size:]}
+    msg_format = msg_formats.get(msg_type)
+    if msg_format is None or len(payload) != msg_format.size:
+        return None
+    fields = msg_format.unpack(payload)
+    message = {'type': msg_names[msg_type], 'seq': fields[1]}
+    if msg_type in (msg_pong, msg_ping_report):
+        message['rssi'], message['snr'] = fields[2:]
+    elif msg_type == msg_pong_timed:
+        message['rx_time'] = fields[2] * 1000 + fields[3]
+        message['rssi'], message['snr'] = fields[4:]
+    elif msg_type in (msg_rate, msg_rate_ack):
+        message['sf'], message['bw'] = fields[2:]
+    elif msg_type == msg_beacon:
+        message['tx_time'] = fields[2] * 1000 + fields[3]
+    return message
+
+#function to obtain a printable description of any payload (binary message or plain ASCII text)
+def describe(payload):
+    message = decode(payload)
+    if message is None:
+        return payload.decode('ASCII', errors='replace')
+    if message['type'] == 'text':
+        return message['text']
+    if message['type'] == 'fragment':
+        return 'Fragment! #' + str(message['id']) + ' (' + str(message['index'] + 1) + ' of ' + str(message['count']) + ', ' + str(len(message['data'])) + ' bytes)'
+    if message['type'] == 'aggregate':
+        return '  |  '.join(describe(inner) for inner in message['messages'])
+    if message['type'] == 'relay':
+        return 'Relay! #' + str(message['origin']) + '/' + str(message['seq']) + ' (hop ' + str(message['hops']) + ' of ' + str(message['hop_limit']) + ')  ' + describe(message['data'])
+    if message['type'] == 'fec_fragment':
+        return ('FEC fragment! #' + str(message['id']) + ' (' + str(message['index'] + 1) + ' of ' + str(message['data_count'] + message['parity_count'])
+                + ', ' + str(message['parity_count']) + ' parity)')
+    if message['type'] == 'file_offer':
+        return 'File offer! #' + str(message['id']) + ' ' + message['name'] + ' (' + str(message['size']) + ' bytes)'
+    if message['type'] == 'file_chunk':
+        return 'File chunk! #' + str(message['id']) + ' chunk ' + str(message['index']) + ' (' + str(len(message['data'])) + ' bytes)'
+    if message['type'] == 'file_ack':
+        return 'File ack! #' + str(message['id']) + ' base ' + str(message['base'])
+    if message['type'] in ('rate', 'rate_ack'):
+        return message['type'].replace('_ack', ' ack').capitalize() + '! #' + str(message['seq']) + ' sf' + str(message['sf']) + ' ' + str(message['bw']) + 'kHz'
+    description = message['type'].replace('_timed', '').replace('_report', '').capitalize() + '! #' + str(message['seq'])
+    if 'rssi' in message:
+        description += '  RSSI: ' + str(message['rssi']) + 'dBm  SNR: ' + str(message['snr']) + 'dB'
+    if 'rx_time' in message:
+        description += '  RX TIME: ' + str(message['rx_time'])
+    if 'tx_time' in message:
+        description += '  TX TIME: ' + str(message['tx_time'])
+    return description
+
+##### END DECODER #####
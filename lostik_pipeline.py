@@ -0,0 +1,428 @@
+##############################################################################
+#                                                                            #
+#  DEVELOPED BY:  Chris Clement (K7CTC)                                      #
+#       VERSION:  v1.0                                                       #
+#   DESCRIPTION:  Streaming receive pipeline shared by the LoStik receive    #
+#                 utilities.  Received frames flow through the following     #
+#                 stages:                                                    #
+#                                                                            #
+#                 source -> parse -> unwrap -> split -> reassemble ->        #
+#                 enrich -> deduplicate -> filter -> sinks                   #
+#                                                                            #
+#                 The source stage owns a radio (a LoStikCommander, see      #
+#                 lostik_serial.py).  It waits for frames, fetches RSSI/SNR  #
+#                 for each one (RSSI only in FSK mode, which has no SNR)     #
+#                 and immediately re-arms the radio.  Parse, split and       #
+#                 reassemble (see lostik_transport.py), enrich and filter    #
+#                 are chained generators running on a processing             #
+#                 thread.  Every sink (console, file, socket, database) runs #
+#                 on its own thread.  Bounded queues sit between the threads #
+#                 so that downstream stages apply backpressure, but the      #
+#                 source never waits on them: a frame that cannot be queued  #
+#                 is counted as dropped rather than holding the radio out    #
+#                 of receive mode.                                           #
+#                                                                            #
+#                 Several radios, each on its own channel, may feed one      #
+#                 pipeline (one source thread per radio, see                 #
+#                 lostik_channels.py).  Every frame is tagged with the       #
+#                 frequency it was heard on and the streams are merged       #
+#                 before parsing, so a message fragmented across channels    #
+#                 is still reassembled.                                      #
+#                                                                            #
+##############################################################################
+
+#import required modules
+import queue
+import threading
+import time
+import lora_phy
+import lostik_capture
+import lostik_channels
+import lostik_message
+import lostik_transport
+
+#marks the end of the stream on every queue
+end_of_stream = None
+
+##### BEGIN PIPELINE STAGES #####
+
+#source stage: keeps the radio in receive mode and queues every received frame (runs on its own thread)
+#snr is False in FSK mode, where the radio has no SNR to report
+#frequency (in Hz, or None if not known) is the channel the radio listens on, every frame is tagged with it
+def radio_source(lostik, out_queue, stop_event, armed_event, stats, snr=True, frequency=None):
+    armed = False
+    while not stop_event.is_set():
+        if not armed:
+            response = lostik.query(b'radio rx 0')
+            if response == 'ok':
+                armed = True
+                armed_event.set()
+            elif response == 'busy':
+                lostik.query(b'radio rxstop')
+            continue
+        rx_data = lostik.next_event()
+        if rx_data == '':
+            continue
+        armed = False
+        if rx_data == 'radio_err':
+            stats['watchdog_timeouts'] += 1
+            continue
+        rx_data_array = rx_data.split()
+        if rx_data_array[0] != 'radio_rx' or len(rx_data_array) != 2:
+            continue
+        rx_time = int(round(time.time()*1000)) #get current unix epoch time in milliseconds
+        #rssi and snr describe the last received packet, so they are requested ahead of re-arming the radio (all three pipelined)
+        rssi_reply = lostik.command(b'radio get rssi')
+        snr_reply = lostik.command(b'radio get snr') if snr else None
+        armed = lostik.wait_reply(lostik.command(b'radio rx 0')) == 'ok'
+        stats['received'] += 1
+        try:
+            out_queue.put_nowait({'rx_time': rx_time, 'rx_hex': rx_data_array[1], 'rssi': lostik.wait_reply(rssi_reply), 'snr': None if snr_reply is None else lostik.wait_reply(snr_reply), 'freq': frequency})
+        except queue.Full:
+            stats['dropped'] += 1
+    if armed:
+        lostik.query(b'radio rxstop')
+
+#function to turn a queue into a generator (ends at the end of stream marker)
+def queue_reader(in_queue):
+    while True:
+        frame = in_queue.get()
+        if frame is end_of_stream:
+            return
+        yield frame
+
+#function to queue the end of stream marker for a consumer thread (gives up once that thread has ended, as nothing would ever make room)
+def end_stream(out_queue, consumer):
+    while consumer.is_alive():
+        try:
+            out_queue.put(end_of_stream, timeout=1)
+            return
+        except queue.Full:
+            pass
+
+#parse stage: decodes the hex payload and decompresses it if flagged (frames that fail either are discarded)
+def parse(frames, stats):
+    for frame in frames:
+        try:
+            frame['payload'] = lostik_message.decompress(bytes.fromhex(frame['rx_hex']))
+        except ValueError:
+            stats['malformed'] += 1
+            continue
+        yield frame
+
+#unwrap stage: a relayed message (see lostik_relay.py) continues as the message it carries, tagged with its originator, sequence number and hop count
+def unwrap(frames, stats):
+    for frame in frames:
+        if frame['payload'][:1] != bytes([lostik_message.msg_relay]):
+            yield frame
+            continue
+        message = lostik_message.decode(frame['payload'])
+        try:
+            if message is None:
+                raise ValueError('malformed relay message')
+            frame['payload'] = lostik_message.decompress(message['data'])
+        except ValueError:
+            stats['malformed'] += 1
+            continue
+        frame['relay'] = (message['origin'], message['seq'])
+        frame['hops'] = message['hops']
+        yield frame
+
+#split stage: an aggregate frame continues as one frame per message it carries (all sharing its rx_time, rssi and snr)
+def split(frames, stats):
+    for frame in frames:
+        try:
+            messages = lostik_transport.split(frame['payload'])
+        except ValueError:
+            stats['malformed'] += 1
+            continue
+        if len(messages) == 1 and messages[0] is frame['payload']:
+            yield frame
+            continue
+        for message in messages:
+            try:
+                yield dict(frame, payload=lostik_message.decompress(message))
+            except ValueError:
+                stats['malformed'] += 1
+
+#reassemble stage: fragments are held back until their message is complete, which then continues as a single frame
+#(rx_time, rssi and snr are those of the final fragment)
+def reassemble(frames, reassembler, stats):
+    for frame in frames:
+        message = lostik_message.decode(frame['payload'])
+        if message is None or message['type'] not in ('fragment', 'fec_fragment'):
+            yield frame
+            continue
+        message = reassembler.add(message)
+        if message is None:
+            continue
+        try:
+            frame['payload'] = lostik_message.decompress(message['data'])
+        except ValueError:
+            stats['malformed'] += 1
+            continue
+        frame['fragments'] = message['fragments']
+        frame['recovered'] = message['recovered']
+        frame['reassembly_ms'] = int(round(message['elapsed'] * 1000))
+        yield frame
+
+#function to convert a radio reply to an integer (returns None when the reply is not a number)
+def radio_int(reply):
+    try:
+        return int(reply)
+    except (TypeError, ValueError):
+        return None
+
+#enrich stage: converts link metrics to numbers and adds spreading factor, sequence number and snr margin
+#sf is None in FSK mode (the frames then carry no sf, snr or snr margin)
+def enrich(frames, sf):
+    if sf is not None:
+        sf = lora_phy.sf_number(sf)
+    for frame in frames:
+        frame['rssi'] = radio_int(frame['rssi'])
+        frame['snr'] = radio_int(frame['snr'])
+        frame['sf'] = sf
+        frame['seq'] = lostik_capture.payload_sequence(frame['payload'])
+        frame['snr_margin'] = None if frame['snr'] is None or sf is None else lora_phy.snr_margin(frame['snr'], sf)
+        yield frame
+
+#deduplicate stage: passes each message only the first time it is heard within the cache's time window
+#(relays and retransmissions would otherwise reach every sink once per copy heard)
+#relayed copies are told apart by originator and sequence number as well (an aggregate shares them among its messages)
+def deduplicate(frames, cache, stats):
+    for frame in frames:
+        if 'relay' in frame:
+            key = frame['relay'] + (cache.key(frame['payload']),)
+        else:
+            key = cache.key(frame['payload'], lostik_capture.payload_source(frame['payload']), frame['seq'])
+        if cache.seen(key):
+            stats['duplicates'] += 1
+        else:
+            yield frame
+
+#filter stage: passes only the frames for which predicate(frame) is true
+def filter_frames(frames, predicate, stats):
+    for frame in frames:
+        if predicate(frame):
+            yield frame
+        else:
+            stats['filtered'] += 1
+
+#function to obtain the printable text of a payload (binary messages are described, see lostik_message.py)
+def payload_text(payload):
+    return lostik_message.describe(payload)
+
+##### END PIPELINE STAGES #####
+
+##### BEGIN SINKS #####
+
+#console sink: writes each frame and a packet count/last RSSI status line through a lostik_console.Console
+class ConsoleSink:
+    drop_when_full = True
+
+    def __init__(self, console):
+        self.console = console
+        self.packets = 0
+
+    def write(self, frame):
+        self.packets += 1
+        self.console.write('\n    MSG: ' + payload_text(frame['payload']) + '\n'
+                           + ('  RELAY: from node ' + str(frame['relay'][0]) + ' #' + str(frame['relay'][1]) + ', ' + str(frame['hops']) + ' hop(s)\n' if 'relay' in frame else '')
+                           + ('   FREQ: ' + lostik_channels.mhz(frame['freq']) + '\n' if frame.get('freq') is not None else '')
+                           + '   RSSI: ' + str(frame['rssi']) + 'dBm\n'
+                           + ('    SNR: ' + str(frame['snr']) + 'dB\n' if frame['snr'] is not None else '')
+                           + 'RX TIME: ' + str(frame['rx_time']) + '\n'
+                           + ('   FRAG: ' + str(frame['fragments']) + ' fragments in ' + str(frame['reassembly_ms']) + 'ms (' + str(frame['recovered']) + ' recovered by fec)\n' if 'fragments' in frame else ''))
+        self.console.status('Packets: ' + str(self.packets) + '  Last RSSI: ' + str(frame['rssi']) + 'dBm' + ('  Last SNR: ' + str(frame['snr']) + 'dB' if frame['snr'] is not None else ''))
+
+    #the console flushes itself on its own thread
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+#file sink: appends each frame to a capture file (see lostik_capture.py)
+class FileSink:
+    drop_when_full = False
+
+    def __init__(self, path):
+        self.capture_file = lostik_capture.open_capture(path)
+
+    def write(self, frame):
+        self.capture_file.write(lostik_capture.capture_row(frame['rx_time'], frame['rssi'], frame['snr'], frame['sf'], frame['payload'], frame.get('freq')))
+
+    def flush(self):
+        self.capture_file.flush()
+
+    def close(self):
+        self.capture_file.close()
+
+#socket sink: sends each frame as a JSON datagram to host:port
+class SocketSink:
+    drop_when_full = True
+
+    def __init__(self, address):
+        #json and socket are only imported when this sink is used (keeps receiver startup fast)
+        import json
+        import socket
+        host, port = address.rsplit(':', 1)
+        self.address = (host, int(port))
+        self.dumps = json.dumps
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def write(self, frame):
+        record = dict(frame, payload=frame['payload'].hex(), text=payload_text(frame['payload']))
+        try:
+            self.sock.sendto(self.dumps(record).encode('UTF-8'), self.address)
+        except OSError:
+            pass
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.sock.close()
+
+#database sink: inserts each frame into an SQLite database (committed whenever the sink queue runs empty)
+class DatabaseSink:
+    drop_when_full = False
+
+    def __init__(self, path):
+        self.path = path
+        self.db = None
+
+    def write(self, frame):
+        #sqlite connections may only be used by the thread that created them, so connect on first write
+        if self.db is None:
+            import sqlite3
+            self.db = sqlite3.connect(self.path)
+            self.db.execute('CREATE TABLE IF NOT EXISTS receptions (rx_time INTEGER, rssi INTEGER, snr INTEGER, sf INTEGER, seq INTEGER, payload BLOB)')
+        self.db.execute('INSERT INTO receptions VALUES (?, ?, ?, ?, ?, ?)', (frame['rx_time'], frame['rssi'], frame['snr'], frame['sf'], frame['seq'], frame['payload']))
+
+    def flush(self):
+        if self.db is not None:
+            self.db.commit()
+
+    def close(self):
+        if self.db is not None:
+            self.db.commit()
+            self.db.close()
+
+##### END SINKS #####
+
+##### BEGIN PIPELINE #####
+
+#the receive pipeline (a source thread per radio, processing thread and one thread per sink)
+#sf is the spreading factor the radios are set to, or None when they are in FSK mode
+#frequency is the channel (in Hz) lostik listens on, further radios are added with add_source() before start()
+#duplicates is a lostik_transport.DuplicateCache, or None to pass every copy of a message on
+class ReceivePipeline:
+    def __init__(self, lostik, sf, sinks, predicate=None, queue_size=256, reassembler=None, frequency=None, duplicates=None):
+        self.lostik = lostik
+        self.sf = sf
+        self.sinks = sinks
+        self.predicate = predicate
+        self.reassembler = reassembler or lostik_transport.Reassembler()
+        self.duplicates = duplicates
+        self.stats = {'received': 0, 'dropped': 0, 'malformed': 0, 'duplicates': 0, 'filtered': 0, 'watchdog_timeouts': 0, 'errors': 0}
+        self.sink_dropped = [0] * len(sinks)
+        #description of the latest unexpected error in a stage or sink (see process and run_sink)
+        self.last_error = None
+        self.stop_event = threading.Event()
+        #set once the radio has first been placed in receive mode
+        self.armed = threading.Event()
+        self.source_queue = queue.Queue(maxsize=queue_size)
+        self.sink_queues = [queue.Queue(maxsize=queue_size) for sink in sinks]
+        #every source counts its own frames (totalled into stats when the pipeline stops)
+        self.sources = []
+        self.add_source(lostik, frequency)
+        self.process_thread = threading.Thread(target=self.process, daemon=True)
+        self.sink_threads = [threading.Thread(target=self.run_sink, args=(sink, sink_queue), daemon=True) for sink, sink_queue in zip(sinks, self.sink_queues)]
+
+    #function to add a radio listening on another channel (the merged stream tags each frame with its frequency)
+    def add_source(self, lostik, frequency=None):
+        stats = {'frequency': frequency, 'received': 0, 'dropped': 0, 'watchdog_timeouts': 0}
+        thread = threading.Thread(target=radio_source, args=(lostik, self.source_queue, self.stop_event, self.armed, stats, self.sf is not None, frequency), daemon=True)
+        self.sources.append((thread, stats))
+
+    #chain the generator stages together
+    def stages(self):
+        frames = queue_reader(self.source_queue)
+        frames = parse(frames, self.stats)
+        frames = unwrap(frames, self.stats)
+        frames = split(frames, self.stats)
+        frames = reassemble(frames, self.reassembler, self.stats)
+        frames = enrich(frames, self.sf)
+        if self.duplicates is not None:
+            frames = deduplicate(frames, self.duplicates, self.stats)
+        if self.predicate is not None:
+            frames = filter_frames(frames, self.predicate, self.stats)
+        return frames
+
+    #function to record an unexpected error in a stage or sink
+    def record_error(self, error):
+        self.stats['errors'] += 1
+        self.last_error = type(error).__name__ + ': ' + str(error)
+
+    #processing thread: runs the generator stages and fans frames out to the sink queues
+    #an unexpected error ends the generators, so the frame being processed is lost and the stages are chained again
+    #(the reassembler and duplicate cache keep their state)
+    def process(self):
+        while True:
+            try:
+                for frame in self.stages():
+                    for index, (sink, sink_queue) in enumerate(zip(self.sinks, self.sink_queues)):
+                        if sink.drop_when_full:
+                            try:
+                                sink_queue.put_nowait(frame)
+                            except queue.Full:
+                                self.sink_dropped[index] += 1
+                        else:
+                            sink_queue.put(frame)
+                break
+            except Exception as error:
+                self.record_error(error)
+        for sink_queue, thread in zip(self.sink_queues, self.sink_threads):
+            end_stream(sink_queue, thread)
+
+    #sink thread: writes frames to one sink and flushes it whenever its queue runs empty
+    def run_sink(self, sink, sink_queue):
+        for frame in queue_reader(sink_queue):
+            try:
+                sink.write(frame)
+                if sink_queue.empty():
+                    sink.flush()
+            except Exception as error:
+                self.record_error(error)
+        sink.close()
+
+    def start(self):
+        for thread in self.sink_threads:
+            thread.start()
+        self.process_thread.start()
+        for thread, stats in self.sources:
+            thread.start()
+
+    #stop receiving, then let every queued frame drain through to the sinks
+    def stop(self):
+        self.stop_event.set()
+        for thread, stats in self.sources:
+            thread.join()
+            for key in ('received', 'dropped', 'watchdog_timeouts'):
+                self.stats[key] += stats[key]
+        end_stream(self.source_queue, self.process_thread)
+        self.process_thread.join()
+        for thread in self.sink_threads:
+            thread.join()
+
+    #function to obtain a one line summary of the frames heard on each channel
+    def channel_summary(self):
+        return 'Frames per channel: ' + '  '.join(lostik_channels.mhz(stats['frequency']) + ': ' + str(stats['received'])
+                                                  for thread, stats in self.sources if stats['frequency'] is not None)
+
+    #function to obtain a one line summary of the frames each sink dropped because it could not keep up
+    def sink_summary(self):
+        return 'Frames dropped by sinks (queue full): ' + '  '.join(type(sink).__name__ + ': ' + str(dropped) for sink, dropped in zip(self.sinks, self.sink_dropped))
+
+##### END PIPELINE #####
@@ -0,0 +1,136 @@
+##############################################################################
+#                                                                            #
+#  DEVELOPED BY:  Chris Clement (K7CTC)                                      #
+#       VERSION:  v1.0                                                       #
+#   DESCRIPTION:  Store-and-forward relay shared by the LoStik utilities.    #
+#                 This file is not meant to be run directly.                 #
+#                                                                            #
+#                 A message sent into the mesh is wrapped in a relay         #
+#                 message (see lostik_message.py) carrying the node it came  #
+#                 from, that node's sequence number, the hops it has         #
+#                 travelled and how many it may travel.  Every relaying      #
+#                 node that hears it for the first time delivers it and      #
+#                 re-broadcasts it with the hop count raised, until the hop  #
+#                 limit is reached.  Later copies are recognised by their    #
+#                 originator and sequence number (see                        #
+#                 lostik_transport.DuplicateCache) and dropped.              #
+#                                                                            #
+#                 Nodes that hear the same frame at the same moment would    #
+#                 all forward it at once and collide, so each waits a random #
+#                 number of slots (one slot is the frame's time on air)      #
+#                 first.  A node that hears another node forward the         #
+#                 message while it waits drops its own copy.  Forwarding     #
+#                 has its own airtime budget (see lostik_governor.py) so a   #
+#                 busy mesh can't keep a relay transmitting: messages that   #
+#                 would take it over budget are not forwarded.               #
+#                                                                            #
+##############################################################################
+
+#import required modules
+import random
+import time
+import lostik_governor
+import lostik_message
+import lostik_transport
+
+#hops a message may travel unless told otherwise
+default_hop_limit = 3
+
+class Relay:
+    #node_id: this node's id within the mesh (1 to 65535)
+    #airtime: function returning the predicted time on air of a frame in milliseconds (see lora_phy.time_on_air)
+    #forward: False for a node that only sends and receives relayed messages
+    #slots: forwarding waits 0 to slots - 1 frame airtimes, picked at random
+    #budget: fraction of budget_window seconds that may be spent forwarding (None for no limit)
+    #ttl: seconds a message is remembered for duplicate suppression
+    def __init__(self, node_id, airtime, forward=True, hop_limit=default_hop_limit, slots=4, budget=0.1, budget_window=3600, ttl=300, max_entries=1024):
+        self.node_id = node_id & 0xFFFF
+        self.airtime = airtime
+        self.forward = forward
+        self.hop_limit = hop_limit
+        self.slots = max(1, slots)
+        self.governor = lostik_governor.AirtimeGovernor(duty_cycle=budget, duty_window=budget_window)
+        self.seen = lostik_transport.DuplicateCache(ttl=ttl, max_entries=max_entries)
+        #sequence numbers start at a random value so a restarted node isn't mistaken for repeats of its earlier messages
+        self.seq = random.randrange(0x10000)
+        #frames waiting out their backoff by (originator, seq): (release time, frame)
+        self.pending = {}
+        self.stats = {'originated': 0, 'received': 0, 'delivered': 0, 'duplicates': 0, 'own': 0, 'forwarded': 0, 'cancelled': 0, 'hop_limit': 0, 'over_budget': 0}
+
+    #function to wrap a message this node sends into the mesh (returns the relay frame)
+    def wrap(self, message):
+        self.seq = (self.seq + 1) & 0xFFFF
+        #echoes of our own messages coming back from other relays are ignored
+        self.seen.seen((self.node_id, self.seq))
+        self.stats['originated'] += 1
+        return lostik_message.encode_relay(self.node_id, self.seq, 0, self.hop_limit, message)
+
+    #function to handle a received relay message (see lostik_message.decode)
+    #returns the message it carries the first time it is heard, or None for our own messages and repeats
+    def receive(self, relay_message, now=None):
+        if now is None:
+            now = time.monotonic()
+        self.stats['received'] += 1
+        key = (relay_message['origin'], relay_message['seq'])
+        if relay_message['origin'] == self.node_id:
+            self.stats['own'] += 1
+            return None
+        if self.seen.seen(key, now):
+            self.stats['duplicates'] += 1
+            #another node has already forwarded it to everyone this node would reach
+            if key in self.pending:
+                del self.pending[key]
+                self.stats['cancelled'] += 1
+            return None
+        self.stats['delivered'] += 1
+        if self.forward:
+            self.schedule(key, relay_message, now)
+        return relay_message['data']
+
+    #function to hold a message for forwarding after a random backoff
+    def schedule(self, key, relay_message, now):
+        if relay_message['hops'] >= relay_message['hop_limit']:
+            self.stats['hop_limit'] += 1
+            return
+        frame = lostik_message.encode_relay(relay_message['origin'], relay_message['seq'], relay_message['hops'] + 1, relay_message['hop_limit'], relay_message['data'])
+        airtime = self.airtime(frame)
+        if self.governor.check(airtime, now) != lostik_governor.tx_ok:
+            self.stats['over_budget'] += 1
+            return
+        self.pending[key] = (now + random.randrange(self.slots) * airtime / 1000, frame)
+
+    #function to take the frames whose backoff is over (returns a list of (label, frame), usually empty)
+    #the budget is checked again and booked here, as the frames are handed over for transmission
+    def due(self, now=None):
+        if now is None:
+            now = time.monotonic()
+        frames = []
+        for key, (release_time, frame) in list(self.pending.items()):
+            if release_time > now:
+                continue
+            del self.pending[key]
+            airtime = self.airtime(frame)
+            if self.governor.check(airtime, now) != lostik_governor.tx_ok:
+                self.stats['over_budget'] += 1
+                continue
+            self.governor.record(airtime, now)
+            self.stats['forwarded'] += 1
+            frames.append(('relay #' + str(key[0]) + '/' + str(key[1]), frame))
+        return frames
+
+    #function to obtain the seconds until the next frame's backoff is over (None when nothing is waiting)
+    def time_until_due(self, now=None):
+        if not self.pending:
+            return None
+        if now is None:
+            now = time.monotonic()
+        return max(0.0, min(release_time for release_time, frame in self.pending.values()) - now)
+
+    #function to obtain a one line summary of the relay statistics
+    def summary(self):
+        text = ('Relay (node ' + str(self.node_id) + '): originated: ' + str(self.stats['originated']) + '  heard: ' + str(self.stats['received'])
+                + '  delivered: ' + str(self.stats['delivered']) + '  duplicates: ' + str(self.stats['duplicates']) + '  own echoes: ' + str(self.stats['own']))
+        if self.forward:
+            text += ('  forwarded: ' + str(self.stats['forwarded']) + '  cancelled (heard forwarded): ' + str(self.stats['cancelled'])
+                     + '  hop limit: ' + str(self.stats['hop_limit']) + '  over budget: ' + str(self.stats['over_budget']))
+        return text
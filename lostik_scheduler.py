@@ -0,0 +1,188 @@
+##############################################################################
+#                                                                            #
+#  DEVELOPED BY:  Chris Clement (K7CTC)                                      #
+#       VERSION:  v1.0                                                       #
+#   DESCRIPTION:  Transmit queue and airtime scheduler shared by the LoStik  #
+#                 utilities.  This file is not meant to be run directly.     #
+#                                                                            #
+#                 Outbound frames wait in a bounded queue with a priority    #
+#                 and an optional deadline.  When the queue is full the      #
+#                 oldest frame of the lowest priority waiting is dropped.    #
+#                 The scheduler hands out bursts of frames: most urgent      #
+#                 first, earliest deadline first within a priority, and      #
+#                 only as many as fit (by predicted time on air) before the  #
+#                 radio has to be back in receive mode.  Frames that can no  #
+#                 longer make their deadline are dropped rather than sent    #
+#                 late.                                                      #
+#                                                                            #
+#                 An optional governor (see lostik_governor.py) caps the     #
+#                 airtime: frames it would never allow are dropped, and      #
+#                 frames beyond the remaining duty cycle budget stay queued  #
+#                 until the budget allows them.                              #
+#                                                                            #
+#                 Both the readiness check and the burst can be limited to   #
+#                 the more urgent priorities, which lets a time slotted      #
+#                 node (see lostik_tdma.py) answer in another node's slot    #
+#                 while everything else waits for its own.                   #
+#                                                                            #
+##############################################################################
+
+#import required modules
+import itertools
+import time
+
+#priorities (lower numbers are sent first)
+priority_urgent = 0
+priority_normal = 1
+priority_bulk = 2
+priority_names = {priority_urgent: 'urgent', priority_normal: 'normal', priority_bulk: 'bulk'}
+
+#bounded outbound queue
+class TransmitQueue:
+    def __init__(self, max_size=32):
+        self.max_size = max_size
+        self.entries = []
+        self.sequence = itertools.count()
+        self.stats = {'queued': 0, 'requeued': 0, 'dropped': 0, 'expired': 0, 'rejected': 0}
+
+    def __len__(self):
+        return len(self.entries)
+
+    #function to queue a frame (deadline is a time.monotonic() value by which transmission must have finished)
+    #channel is the frequency (in Hz) to send the frame on, None for the channel the radio is already on
+    def put(self, frame, priority=priority_normal, deadline=None, label=None, now=None, channel=None):
+        if now is None:
+            now = time.monotonic()
+        self.stats['queued'] += 1
+        self.entries.append({'frame': frame, 'priority': priority, 'deadline': deadline, 'label': label,
+                             'queued_time': now, 'sequence': next(self.sequence), 'channel': channel})
+        self.limit()
+
+    #function to put back an entry taken for a burst but not sent (it keeps its priority, deadline and place in the queue)
+    def requeue(self, entry):
+        self.stats['requeued'] += 1
+        self.entries.append(entry)
+        self.limit()
+
+    #function to drop a frame while the queue holds more than max_size
+    def limit(self):
+        if len(self.entries) > self.max_size:
+            #drop-oldest: the oldest frame of the lowest priority waiting (possibly the one just queued)
+            lowest = max(entry['priority'] for entry in self.entries)
+            self.entries.remove(min((entry for entry in self.entries if entry['priority'] == lowest), key=lambda entry: entry['sequence']))
+            self.stats['dropped'] += 1
+
+    #function to remove frames that would finish after their deadline even if sent right now
+    def expire(self, airtime, now):
+        keep = []
+        for entry in self.entries:
+            if entry['deadline'] is not None and now + airtime(entry['frame']) / 1000 > entry['deadline']:
+                self.stats['expired'] += 1
+            else:
+                keep.append(entry)
+        self.entries = keep
+
+    #the order frames are sent in: priority, then deadline (frames without one last), then first come first served
+    def ordered(self):
+        return sorted(self.entries, key=lambda entry: (entry['priority'], entry['deadline'] is None, entry['deadline'] or 0, entry['sequence']))
+
+    def remove(self, entry):
+        self.entries.remove(entry)
+
+#hands out bursts of frames from a TransmitQueue
+#airtime is a function returning the predicted time on air of a frame in milliseconds (see lora_phy.time_on_air)
+#governor is an optional lostik_governor.AirtimeGovernor limiting dwell time and duty cycle
+class AirtimeScheduler:
+    def __init__(self, tx_queue, airtime, max_burst=2000, governor=None):
+        self.tx_queue = tx_queue
+        self.airtime = airtime
+        #longest burst of transmissions (in milliseconds of airtime) before the radio goes back to receiving
+        self.max_burst = max_burst
+        self.governor = governor
+        self.latency = {}
+
+    #function to remove frames the governor will never allow
+    def reject(self):
+        if self.governor is None:
+            return
+        for entry in list(self.tx_queue.entries):
+            if not self.governor.permitted(self.airtime(entry['frame'])):
+                self.tx_queue.remove(entry)
+                self.tx_queue.stats['rejected'] += 1
+                self.governor.stats['rejected'] += 1
+
+    #function to obtain the seconds until some queued frame may be sent (None if the queue is empty)
+    #max_priority limits the check to frames of that priority or more urgent (None for all frames)
+    def time_until_ready(self, now=None, max_priority=None):
+        entries = [entry for entry in self.tx_queue.entries if max_priority is None or entry['priority'] <= max_priority]
+        if not entries:
+            return None
+        if self.governor is None:
+            return 0.0
+        if now is None:
+            now = time.monotonic()
+        self.reject()
+        return min((self.governor.time_until(self.airtime(entry['frame']), now) for entry in entries if entry in self.tx_queue.entries), default=None)
+
+    #function to obtain the next burst of queued entries (each a dict holding 'frame', 'priority', 'label', etc.)
+    #until is the time.monotonic() value by which the burst must be over (default: max_burst from now)
+    #max_priority leaves frames less urgent than that priority queued (None sends any priority)
+    def next_burst(self, now=None, until=None, max_priority=None):
+        if now is None:
+            now = time.monotonic()
+        #without a hard limit the first frame is always sent, even if it alone is longer than max_burst
+        hard_limit = until is not None
+        if until is None:
+            until = now + self.max_burst / 1000
+        self.tx_queue.expire(self.airtime, now)
+        self.reject()
+        burst = []
+        finish = now
+        #airtime (in milliseconds) of the frames already in the burst, which the budget has to cover as well
+        planned = 0.0
+        for entry in self.tx_queue.ordered():
+            if max_priority is not None and entry['priority'] > max_priority:
+                break
+            duration = self.airtime(entry['frame']) / 1000
+            if entry['deadline'] is not None and finish + duration > entry['deadline']:
+                #this frame would be late behind the ones already in the burst, try again next burst
+                continue
+            if finish + duration > until and (burst or hard_limit):
+                #a smaller frame further down the order may still fit
+                continue
+            if self.governor is not None:
+                if self.governor.time_until(planned + duration * 1000, now) > 0:
+                    #over the duty cycle budget, a smaller frame further down the order may still fit
+                    if not entry.get('deferred'):
+                        entry['deferred'] = True
+                        self.governor.stats['deferred'] += 1
+                    continue
+            planned += duration * 1000
+            burst.append(entry)
+            finish += duration
+        for entry in burst:
+            self.tx_queue.remove(entry)
+        return burst
+
+    #function to record the entries of a burst that were actually transmitted (frames that failed are requeued instead)
+    #only their airtime counts against the governor's budget
+    def sent(self, entries, now=None):
+        if now is None:
+            now = time.monotonic()
+        for entry in entries:
+            if self.governor is not None:
+                self.governor.record(self.airtime(entry['frame']), now)
+            latency = now - entry['queued_time']
+            count, worst = self.latency.get(entry['priority'], (0, 0.0))
+            self.latency[entry['priority']] = (count + 1, max(worst, latency))
+
+    #function to obtain a one line summary of the queue and scheduler statistics
+    def summary(self):
+        stats = self.tx_queue.stats
+        text = 'TX queued: ' + str(stats['queued']) + '  requeued (send failed): ' + str(stats['requeued']) + '  dropped (queue full): ' + str(stats['dropped']) + '  expired (deadline): ' + str(stats['expired'])
+        if self.governor is not None:
+            text += '  rejected (airtime limits): ' + str(stats['rejected'])
+        for priority in sorted(self.latency):
+            count, worst = self.latency[priority]
+            text += '  ' + priority_names.get(priority, str(priority)) + ': ' + str(count) + ' sent, worst wait ' + str(int(round(worst * 1000))) + 'ms'
+        return text
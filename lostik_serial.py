@@ -0,0 +1,233 @@
+##############################################################################
+#                                                                            #
+#  DEVELOPED BY:  Chris Clement (K7CTC)                                      #
+#       VERSION:  v1.0                                                       #
+#   DESCRIPTION:  Serial port helpers shared by the LoStik utilities.  This  #
+#                 file is not meant to be run directly.                      #
+#                                                                            #
+#                 SerialReader wraps an open serial port with a dedicated    #
+#                 reader thread that continuously drains the port into a     #
+#                 queue.  It offers the same write()/readline() interface    #
+#                 as the port itself, so the utilities keep talking to the   #
+#                 LoStik the same way, but a stalled terminal or disk can    #
+#                 no longer leave bytes sitting in the serial input buffer   #
+#                 long enough to overrun it.                                 #
+#                                                                            #
+#                 LoStikCommander adds a request/response layer on top of    #
+#                 the reader thread.  Every command returns a future that is #
+#                 resolved with its reply, while unsolicited radio events    #
+#                 (radio_rx, radio_err, radio_tx_ok) are routed to a         #
+#                 separate event queue.  Because the RN2903 answers          #
+#                 commands strictly in order, replies are matched to the     #
+#                 oldest outstanding command, which allows several commands  #
+#                 to be pipelined without waiting on each reply in turn.     #
+#                 A reply that never arrives would leave every later reply   #
+#                 matched to the wrong command, so after a timeout all       #
+#                 outstanding commands are given up on and a sentinel        #
+#                 command (sys get ver) is sent.  Replies are discarded      #
+#                 until the sentinel's reply shows the radio has caught up.  #
+#                                                                            #
+#                 tx_command() builds the complete "radio tx <hex>" command  #
+#                 line for a frame.  Encoding takes well under a             #
+#                 microsecond, a thousandth of the time the line takes to    #
+#                 cross the serial port, so command lines are not cached     #
+#                 (see tx_benchmark.py).                                     #
+#                                                                            #
+##############################################################################
+
+#import required modules
+import binascii
+import collections
+import concurrent.futures
+import queue
+import threading
+
+#lines the radio sends on its own rather than in reply to a command
+radio_events = ('radio_rx', 'radio_err', 'radio_tx_ok')
+
+#command sent to bring replies back in step after a missing reply, and the start of its reply (the module name, RN2903 or RN2483)
+sync_command = b'sys get ver'
+sync_reply = 'RN2'
+
+#dedicated reader thread wrapped around an open serial port
+class SerialReader:
+    def __init__(self, port):
+        self.port = port
+        self.timeout = port.timeout
+        #SimpleQueue is implemented in C and never blocks the producer
+        self.lines = queue.SimpleQueue()
+        self.queue_high_water = 0
+        self.in_waiting_high_water = 0
+        self.running = True
+        self.reader_thread = threading.Thread(target=self.read_port, daemon=True)
+        self.reader_thread.start()
+
+    #reader thread: read whatever is waiting and queue each complete line
+    def read_port(self):
+        buffer = b''
+        while self.running:
+            try:
+                waiting = self.port.in_waiting
+                if waiting > self.in_waiting_high_water:
+                    self.in_waiting_high_water = waiting
+                data = self.port.read(waiting or 1)
+            except OSError:
+                break
+            if not data:
+                continue
+            buffer += data
+            while b'\n' in buffer:
+                line, buffer = buffer.split(b'\n', 1)
+                self.dispatch(line + b'\n')
+
+    #function to hand a complete line to its reader (overridden by LoStikCommander)
+    def dispatch(self, line):
+        self.lines.put(line)
+        self.track_queue(self.lines.qsize())
+
+    #function to record the reader queue high-water mark
+    def track_queue(self, queued):
+        if queued > self.queue_high_water:
+            self.queue_high_water = queued
+
+    #function to obtain the next line from the LoStik (returns b'' after the port timeout, like serial.readline)
+    def readline(self):
+        try:
+            return self.lines.get(timeout=self.timeout)
+        except queue.Empty:
+            return b''
+
+    def write(self, data):
+        return self.port.write(data)
+
+    @property
+    def is_open(self):
+        return self.port.is_open
+
+    #function to obtain the reader high-water marks as printable text
+    def high_water_marks(self):
+        return 'serial in_waiting high-water: ' + str(self.in_waiting_high_water) + ' bytes  reader queue high-water: ' + str(self.queue_high_water) + ' lines'
+
+    def close(self):
+        self.running = False
+        self.reader_thread.join(timeout=(self.timeout or 0) + 1)
+        self.port.close()
+
+#request/response correlator built on the dedicated reader thread
+class LoStikCommander(SerialReader):
+    def __init__(self, port):
+        self.events = queue.SimpleQueue()
+        #one entry per outstanding command: a future, or None for a plain write() answered through readline()
+        self.pending = collections.deque()
+        self.pending_lock = threading.Lock()
+        self.unmatched = 0
+        #True from a missing reply until the sentinel's reply arrives (see resync)
+        self.resyncing = False
+        self.resyncs = 0
+        super().__init__(port)
+
+    #reader thread: route events to the event queue and replies to the oldest outstanding command
+    def dispatch(self, line):
+        text = line.decode('ASCII', errors='replace').rstrip()
+        if text.split(' ', 1)[0] in radio_events:
+            self.events.put(text)
+            self.track_queue(self.lines.qsize() + self.events.qsize())
+            return
+        with self.pending_lock:
+            if self.resyncing:
+                #a late reply to a command that was given up on, or the sentinel's reply ending the resync
+                self.resyncing = not text.startswith(sync_reply)
+                waiter = False
+            else:
+                waiter = self.pending.popleft() if self.pending else False
+        if waiter is None:
+            self.lines.put(line)
+        elif waiter is False:
+            self.unmatched += 1
+        else:
+            waiter.set_result(text)
+        self.track_queue(self.lines.qsize() + self.events.qsize())
+
+    #function to send a command (without line ending) and obtain a future for its reply
+    def command(self, cmd):
+        return self.command_line(cmd + b'\r\n')
+
+    #function to send a complete command line (such as one built by tx_command) and obtain a future for its reply
+    def command_line(self, line):
+        future = concurrent.futures.Future()
+        with self.pending_lock:
+            self.pending.append(future)
+            self.port.write(line)
+        return future
+
+    #function to wait for the reply to a command (returns '' when no reply arrives within the port timeout)
+    def wait_reply(self, future):
+        try:
+            return future.result(timeout=self.timeout)
+        except concurrent.futures.TimeoutError:
+            self.resync()
+            return ''
+
+    #function to bring replies back in step after a missing reply
+    #every outstanding command is given up on (its reply becomes '') and the sentinel command is sent
+    def resync(self):
+        with self.pending_lock:
+            waiters = list(self.pending)
+            self.pending.clear()
+            self.resyncing = True
+            self.resyncs += 1
+            self.port.write(sync_command + b'\r\n')
+        for waiter in waiters:
+            if waiter is not None and not waiter.done():
+                waiter.set_result('')
+
+    #function to send a command and wait for its reply
+    def query(self, cmd):
+        return self.wait_reply(self.command(cmd))
+
+    #function to send a batch of commands (without line endings) keeping up to window replies outstanding (returns the replies in order)
+    def batch(self, commands, window=4):
+        replies = []
+        outstanding = collections.deque()
+        for cmd in commands:
+            if len(outstanding) >= window:
+                replies.append(self.wait_reply(outstanding.popleft()))
+            outstanding.append(self.command(cmd))
+        while outstanding:
+            replies.append(self.wait_reply(outstanding.popleft()))
+        return replies
+
+    #plain writes still work for lockstep code: their replies are delivered through readline()
+    def write(self, data):
+        with self.pending_lock:
+            self.pending.append(None)
+            return self.port.write(data)
+
+    #function to obtain the reader high-water marks (and any resyncs) as printable text
+    def high_water_marks(self):
+        text = super().high_water_marks()
+        if self.resyncs:
+            text += '  resyncs (missing replies): ' + str(self.resyncs)
+        return text
+
+    #function to obtain the next unsolicited radio event (returns '' after timeout seconds)
+    def next_event(self, timeout=None):
+        try:
+            return self.events.get(timeout=self.timeout if timeout is None else timeout)
+        except queue.Empty:
+            return ''
+
+#the fixed parts of a transmit command line
+tx_prefix = b'radio tx '
+tx_suffix = b'\r\n'
+
+#function to obtain the complete command line transmitting a frame
+def tx_command(frame):
+    return b''.join((tx_prefix, binascii.hexlify(frame), tx_suffix))
+
+#the serial port runs at 57600 baud with 10 bits per byte on the wire (start bit, 8 data bits, stop bit)
+baud_rate = 57600
+
+#function to obtain the seconds a number of bytes takes to cross the serial port
+def serial_time(byte_count):
+    return byte_count * 10 / baud_rate
@@ -0,0 +1,109 @@
+##############################################################################
+#                                                                            #
+#  DEVELOPED BY:  Chris Clement (K7CTC)                                      #
+#       VERSION:  v1.0                                                       #
+#   DESCRIPTION:  Time slotted (TDMA) transmit schedule shared by the LoStik #
+#                 utilities.  This file is not meant to be run directly.     #
+#                                                                            #
+#                 Time is divided into repeating frames of equal slots and   #
+#                 every node owns the slot its node id maps to (node id      #
+#                 modulo the number of slots).  A node only starts its own   #
+#                 transmissions inside its own slot, so as long as node ids  #
+#                 map to different slots no two nodes ever transmit over     #
+#                 each other.  Replies (such as pongs) are sent at once, in  #
+#                 the slot of the node being answered.                       #
+#                                                                            #
+#                 The slot length is worked out from the predicted time on   #
+#                 air of what a slot has to carry (see lora_phy.py) plus a   #
+#                 guard time at each end for clock error and the serial      #
+#                 port.  Slots are laid out on the host clock.  One node,    #
+#                 the coordinator, sends a beacon carrying its own clock at  #
+#                 the start of its slot and every other node corrects its    #
+#                 clock offset from it, allowing for the beacon's airtime.   #
+#                                                                            #
+#   INFORMATION:  Nodes whose clocks are already synchronized (NTP, GPS) do  #
+#                 not need a coordinator.  With the default sf12/125kHz a    #
+#                 slot lasts seconds, so the guard time easily covers the    #
+#                 few milliseconds a beacon is off by.                       #
+#                                                                            #
+##############################################################################
+
+#import required modules
+import time
+
+#function to obtain the slot length in milliseconds for the airtime (in milliseconds) a slot has to carry
+def slot_length(airtime, guard=100):
+    return airtime + 2 * guard
+
+class SlotSchedule:
+    #node_id: this node's id (its slot is node_id modulo slots)
+    #slot_length: length of each slot in milliseconds (see slot_length())
+    #guard: milliseconds at each end of a slot in which nothing is sent
+    def __init__(self, node_id, slots=8, slot_length=1000, guard=100):
+        self.slots = slots
+        self.slot = node_id % slots
+        self.slot_length = slot_length / 1000
+        self.guard = guard / 1000
+        self.frame_length = self.slots * self.slot_length
+        #seconds added to the host clock to obtain the network (coordinator) clock
+        self.offset = 0.0
+        self.synchronized = False
+        #number (counted in slots since the epoch) of the last of our slots that has been used
+        self.claimed = None
+        self.stats = {'slots': 0, 'beacons': 0, 'largest_correction': 0.0}
+
+    #function to obtain the network time in seconds (now is a time.time() value)
+    def network_time(self, now=None):
+        if now is None:
+            now = time.time()
+        return now + self.offset
+
+    #function to obtain the number of our slot in the current frame, or in the next frame once it is over
+    #(slots are numbered from the epoch, so every node numbers them alike)
+    def own_slot(self, network_time):
+        current = int(network_time // self.slot_length)
+        own = current - current % self.slots + self.slot
+        if own < current or network_time >= (own + 1) * self.slot_length - self.guard:
+            own += self.slots
+        return own
+
+    #function to check whether our slot has opened and not been used yet
+    def due(self, now=None):
+        network_time = self.network_time(now)
+        own = self.own_slot(network_time)
+        return own * self.slot_length + self.guard <= network_time and own != self.claimed
+
+    #function to obtain the seconds until our next unused slot opens (0 if due() now)
+    def time_until_due(self, now=None):
+        network_time = self.network_time(now)
+        own = self.own_slot(network_time)
+        if own == self.claimed:
+            own += self.slots
+        return max(0.0, own * self.slot_length + self.guard - network_time)
+
+    #function to use the slot that is due (returns the seconds left to transmit in it, and the frame number)
+    def claim(self, now=None):
+        network_time = self.network_time(now)
+        self.claimed = self.own_slot(network_time)
+        self.stats['slots'] += 1
+        return max(0.0, (self.claimed + 1) * self.slot_length - self.guard - network_time), self.claimed // self.slots
+
+    #function to correct the clock offset from a coordinator's beacon
+    #tx_time is the beacon's time in unix epoch milliseconds, rx_time the host time.time() it was heard at and airtime its time on air in milliseconds
+    def beacon(self, tx_time, rx_time, airtime):
+        #the coordinator's clock read tx_time as the beacon started, so it read tx_time + airtime as it was heard
+        correction = (tx_time + airtime) / 1000 - (rx_time + self.offset)
+        self.offset += correction
+        self.stats['beacons'] += 1
+        if self.synchronized:
+            self.stats['largest_correction'] = max(self.stats['largest_correction'], abs(correction))
+        self.synchronized = True
+        return correction
+
+    #function to obtain a one line summary of the schedule
+    def summary(self):
+        text = ('TDMA: slot ' + str(self.slot) + ' of ' + str(self.slots) + ', ' + str(int(round(self.slot_length * 1000))) + 'ms slots (' + format(self.frame_length, '.1f') + 's frames)'
+                + '  slots used: ' + str(self.stats['slots']) + '  beacons heard: ' + str(self.stats['beacons']))
+        if self.stats['beacons']:
+            text += '  clock offset: ' + str(int(round(self.offset * 1000))) + 'ms  largest drift correction: ' + str(int(round(self.stats['largest_correction'] * 1000))) + 'ms'
+        return text
@@ -0,0 +1,321 @@
+##############################################################################
+#                                                                            #
+#  DEVELOPED BY:  Chris Clement (K7CTC)                                      #
+#       VERSION:  v1.0                                                       #
+#   DESCRIPTION:  Transport layer shared by the LoStik utilities.  Messages  #
+#                 larger than one LoRa frame (radio tx is limited to 255     #
+#                 bytes) are split into numbered fragments which are sent    #
+#                 back-to-back and put back together by the receiver.  This  #
+#                 file is not meant to be run directly.                      #
+#                                                                            #
+#   INFORMATION:  Each fragment is a fragment message (see                   #
+#                 lostik_message.py) carrying a message id, its index and    #
+#                 the fragment count, so messages of up to 255 fragments     #
+#                 (63750 bytes) can be sent.  The reassembler keeps a        #
+#                 bounded number of partial messages and gives up on any     #
+#                 that stop receiving fragments for longer than its timeout. #
+#                                                                            #
+#                 Optionally, parity fragments are added (forward error      #
+#                 correction, see lostik_fec.py) so the message survives     #
+#                 the loss of some of its frames without a retransmission.   #
+#                                                                            #
+#                 Messages relayed or retransmitted by several nodes are     #
+#                 heard more than once.  The duplicate cache remembers the   #
+#                 messages heard within a time window (bounded in size,      #
+#                 least recently heard evicted first) so each one is only    #
+#                 passed on the first time.                                  #
+#                                                                            #
+#                 Going the other way, the aggregator packs several small    #
+#                 messages into one frame so they share a single preamble    #
+#                 and header (at sf12 these cost more airtime than a short   #
+#                 payload).                                                  #
+#                                                                            #
+##############################################################################
+
+#import required modules
+import collections
+import hashlib
+import random
+import time
+import lostik_fec
+import lostik_message
+
+#largest payload accepted by radio tx (in bytes)
+max_frame = 255
+
+#fragment data bytes per frame and largest message that can be fragmented
+max_fragment_data = max_frame - lostik_message.fragment_header.size
+max_fec_fragment_data = max_frame - lostik_message.fec_fragment_header.size
+max_fragments = 255
+max_message = max_fragments * max_fragment_data
+
+#message ids start at a random value so a restarted sender doesn't collide with its own partial messages
+next_message_id = random.randrange(0x10000)
+
+#function to split a message into fragment frames (raises ValueError if the message is too large)
+#fec is the fraction of the data fragments that may be lost without losing the message (0 sends no parity fragments)
+def fragment(data, message_id=None, fragment_size=max_fragment_data, fec=0):
+    global next_message_id
+    if message_id is None:
+        message_id = next_message_id
+        next_message_id = (next_message_id + 1) & 0xFFFF
+    if fec > 0:
+        return fec_fragment(data, message_id, fragment_size, fec)
+    fragment_size = min(fragment_size, max_fragment_data)
+    count = max(1, -(-len(data) // fragment_size))
+    if count > max_fragments:
+        raise ValueError('message too large to fragment: ' + str(len(data)) + ' bytes')
+    return [lostik_message.encode_fragment(message_id, index, count, data[index * fragment_size:(index + 1) * fragment_size]) for index in range(count)]
+
+#function to split a message into equal length data fragments followed by parity fragments
+def fec_fragment(data, message_id, fragment_size, fec):
+    fragment_size = min(fragment_size, max_fec_fragment_data)
+    data_count = max(1, -(-len(data) // fragment_size))
+    parity = lostik_fec.parity_count(data_count, fec)
+    if len(data) > 0xFFFF or data_count + parity > max_fragments:
+        raise ValueError('message too large to fragment with fec: ' + str(len(data)) + ' bytes')
+    #the last data fragment is zero padded (the receiver trims the message back to its length)
+    fragment_size = -(-len(data) // data_count) if data else 1
+    padded = data.ljust(data_count * fragment_size, b'\x00')
+    data_fragments = [padded[index * fragment_size:(index + 1) * fragment_size] for index in range(data_count)]
+    fragments = data_fragments + lostik_fec.encode(data_fragments, parity)
+    return [lostik_message.encode_fec_fragment(message_id, index, data_count, parity, len(data), fragment_data) for index, fragment_data in enumerate(fragments)]
+
+#function to obtain the messages carried by a frame (an aggregate frame carries several, any other frame just itself)
+#raises ValueError when an aggregate frame is truncated
+def split(payload):
+    if not payload or payload[0] != lostik_message.msg_aggregate:
+        return [payload]
+    message = lostik_message.decode(payload)
+    if message is None:
+        raise ValueError('malformed aggregate frame')
+    return message['messages']
+
+#packs small outbound messages into shared frames
+#the owner of the radio adds messages and sends whatever frames are returned, and checks due() while it waits
+class Aggregator:
+    def __init__(self, max_delay=1.0, max_frame=max_frame):
+        self.max_delay = max_delay
+        self.max_frame = max_frame
+        self.messages = []
+        self.size = 1
+        self.first_time = None
+        self.stats = {'messages': 0, 'frames': 0}
+
+    #function to add a message (returns the frames that are ready to send now, usually none)
+    def add(self, message, now=None):
+        if now is None:
+            now = time.monotonic()
+        self.stats['messages'] += 1
+        if 1 + 1 + len(message) > self.max_frame:
+            #too large to share a frame, it goes out on its own after anything already waiting
+            frames = self.flush()
+            self.stats['frames'] += 1
+            return frames + [message]
+        frames = []
+        if self.size + 1 + len(message) > self.max_frame:
+            frames = self.flush()
+        if not self.messages:
+            self.first_time = now
+        self.messages.append(message)
+        self.size += 1 + len(message)
+        return frames
+
+    #function to check whether the oldest waiting message has waited max_delay
+    def due(self, now=None):
+        if not self.messages:
+            return False
+        if now is None:
+            now = time.monotonic()
+        return now - self.first_time >= self.max_delay
+
+    #function to obtain the seconds left until due() (None when nothing is waiting)
+    def time_until_due(self, now=None):
+        if not self.messages:
+            return None
+        if now is None:
+            now = time.monotonic()
+        return max(0.0, self.first_time + self.max_delay - now)
+
+    #function to take every waiting message as one frame (returns a list holding that frame, or an empty list)
+    def flush(self):
+        if not self.messages:
+            return []
+        #a lone message is sent as it is, without the aggregate header (unless it could be mistaken for one)
+        if len(self.messages) == 1 and self.messages[0][:1] != bytes([lostik_message.msg_aggregate]):
+            frame = self.messages[0]
+        else:
+            frame = lostik_message.encode_aggregate(self.messages)
+        self.messages = []
+        self.size = 1
+        self.first_time = None
+        self.stats['frames'] += 1
+        return [frame]
+
+    #function to obtain a one line summary of the aggregation statistics
+    def summary(self):
+        return 'Messages sent: ' + str(self.stats['messages']) + '  in frames: ' + str(self.stats['frames'])
+
+#reassembles fragmented messages with bounded memory
+class Reassembler:
+    def __init__(self, timeout=30, max_messages=8, max_bytes=65536, history=100):
+        self.timeout = timeout
+        self.max_messages = max_messages
+        self.max_bytes = max_bytes
+        #partial messages by message id, oldest first
+        self.partial = collections.OrderedDict()
+        self.buffered = 0
+        self.stats = {'fragments': 0, 'duplicates': 0, 'surplus': 0, 'completed': 0, 'recovered': 0, 'expired': 0, 'evicted': 0, 'malformed': 0}
+        #completion details of the most recent messages (late repeats of their fragments are counted as duplicates)
+        self.completed = collections.deque(maxlen=history)
+        self.completed_ids = collections.deque(maxlen=history)
+
+    #function to discard partial messages that have not received a fragment within the timeout
+    def expire(self, now=None):
+        if now is None:
+            now = time.monotonic()
+        for message_id in [message_id for message_id, entry in self.partial.items() if now - entry['last_time'] > self.timeout]:
+            self.discard(message_id)
+            self.stats['expired'] += 1
+
+    def discard(self, message_id):
+        entry = self.partial.pop(message_id)
+        self.buffered -= entry['size']
+
+    #function to check that a fragment belongs to the message a partial entry holds (same count, length and fragment length)
+    #every fec fragment of a message has the same length, as does every plain fragment but the last, which may be shorter
+    @staticmethod
+    def fits(entry, fragment_message, count):
+        if entry['count'] != count or entry['length'] != fragment_message.get('length'):
+            return False
+        fragment_length = entry['fragment_length']
+        data_length = len(fragment_message['data'])
+        if fragment_message['type'] == 'fragment':
+            if fragment_message['index'] == count - 1:
+                return fragment_length is None or data_length <= fragment_length
+            last = entry['fragments'].get(count - 1)
+            return (fragment_length is None or data_length == fragment_length) and (last is None or len(last) <= data_length)
+        return fragment_length is None or data_length == fragment_length
+
+    #function to add a decoded fragment or fec_fragment message (see lostik_message.decode)
+    #returns a dict describing the completed message, or None while it is still incomplete
+    def add(self, fragment_message, now=None):
+        if now is None:
+            now = time.monotonic()
+        self.expire(now)
+        self.stats['fragments'] += 1
+        message_id = fragment_message['id']
+        if fragment_message['type'] == 'fec_fragment':
+            count = fragment_message['data_count'] + fragment_message['parity_count']
+            needed = fragment_message['data_count']
+        else:
+            count = needed = fragment_message['count']
+        if (message_id, count) in self.completed_ids:
+            #parity fragments still arriving after the message was rebuilt are expected, anything else is a repeat
+            self.stats['surplus' if fragment_message['type'] == 'fec_fragment' else 'duplicates'] += 1
+            return None
+        entry = self.partial.get(message_id)
+        if entry is not None and not self.fits(entry, fragment_message, count):
+            #same id but a different message (the sender restarted or its ids wrapped around)
+            self.discard(message_id)
+            entry = None
+        if entry is None:
+            entry = {'count': count, 'needed': needed, 'length': fragment_message.get('length'), 'fragment_length': None,
+                     'fragments': {}, 'size': 0, 'duplicates': 0, 'first_time': now, 'last_time': now}
+            self.partial[message_id] = entry
+        if entry['fragment_length'] is None and not (fragment_message['type'] == 'fragment' and fragment_message['index'] == count - 1):
+            entry['fragment_length'] = len(fragment_message['data'])
+        if fragment_message['index'] in entry['fragments']:
+            entry['duplicates'] += 1
+            self.stats['duplicates'] += 1
+            return None
+        entry['fragments'][fragment_message['index']] = fragment_message['data']
+        entry['size'] += len(fragment_message['data'])
+        entry['last_time'] = now
+        self.buffered += len(fragment_message['data'])
+        if len(entry['fragments']) >= entry['needed']:
+            self.discard(message_id)
+            if entry['length'] is None:
+                data = b''.join(entry['fragments'][index] for index in range(entry['count']))
+                recovered = 0
+            else:
+                try:
+                    data = b''.join(lostik_fec.decode(entry['fragments'], entry['needed']))
+                except ValueError:
+                    data = b''
+                if len(data) < entry['length']:
+                    #fragments too short to hold the message length they claim
+                    self.stats['malformed'] += 1
+                    return None
+                data = data[:entry['length']]
+                recovered = sum(1 for index in range(entry['needed']) if index not in entry['fragments'])
+                if recovered:
+                    self.stats['recovered'] += 1
+            self.stats['completed'] += 1
+            message = {'id': message_id, 'data': data, 'fragments': len(entry['fragments']), 'recovered': recovered,
+                       'duplicates': entry['duplicates'], 'elapsed': now - entry['first_time']}
+            self.completed.append({key: value for key, value in message.items() if key != 'data'})
+            self.completed_ids.append((message_id, entry['count']))
+            return message
+        #evict the oldest partial messages while over the memory limits
+        while len(self.partial) > self.max_messages or self.buffered > self.max_bytes:
+            oldest_id = next(iter(self.partial))
+            self.discard(oldest_id)
+            self.stats['evicted'] += 1
+            if oldest_id == message_id:
+                break
+        return None
+
+    #function to obtain a one line summary of the reassembly statistics
+    def summary(self):
+        return ('Fragments received: ' + str(self.stats['fragments']) + '  duplicates: ' + str(self.stats['duplicates']) + '  surplus parity: ' + str(self.stats['surplus'])
+                + '  messages completed: ' + str(self.stats['completed']) + '  recovered by fec: ' + str(self.stats['recovered']) + '  expired: ' + str(self.stats['expired'])
+                + '  evicted: ' + str(self.stats['evicted']) + '  malformed: ' + str(self.stats['malformed']) + '  incomplete: ' + str(len(self.partial)))
+
+#remembers recently heard messages so repeats of them can be suppressed
+#a message is identified by its sender and sequence number where it carries both, otherwise by a hash of its payload
+class DuplicateCache:
+    def __init__(self, ttl=30, max_entries=1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        #time each message was first heard by key, oldest first
+        self.entries = collections.OrderedDict()
+        self.stats = {'unique': 0, 'duplicates': 0, 'expired': 0, 'evicted': 0}
+
+    #function to obtain the cache key of a message
+    @staticmethod
+    def key(payload, source=None, seq=-1):
+        if source is not None and seq >= 0:
+            return (source, seq)
+        return hashlib.blake2b(payload, digest_size=8).digest()
+
+    #function to forget messages first heard more than the ttl ago (the oldest are first, so this stops at the first one still fresh)
+    def expire(self, now):
+        while self.entries:
+            key, heard = next(iter(self.entries.items()))
+            if now - heard <= self.ttl:
+                break
+            del self.entries[key]
+            self.stats['expired'] += 1
+
+    #function to record a message, returns True if it was already heard within the ttl
+    #the ttl runs from the first time a message is heard, repeats don't extend it, so a payload that is sent again
+    #and again (a beacon, a legacy 'Ping!') is passed on once per ttl rather than hidden for good
+    def seen(self, key, now=None):
+        if now is None:
+            now = time.monotonic()
+        self.expire(now)
+        if key in self.entries:
+            self.stats['duplicates'] += 1
+            return True
+        self.entries[key] = now
+        self.stats['unique'] += 1
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.stats['evicted'] += 1
+        return False
+
+    #function to obtain a one line summary of the duplicate suppression statistics
+    def summary(self):
+        return ('Unique messages: ' + str(self.stats['unique']) + '  duplicates suppressed: ' + str(self.stats['duplicates'])
+                + '  expired: ' + str(self.stats['expired']) + '  evicted: ' + str(self.stats['evicted']) + '  cached: ' + str(len(self.entries)))
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+
+##############################################################################
+#                                                                            #
+#  DEVELOPED BY:  Chris Clement (K7CTC)                                      #
+#       VERSION:  v1.0                                                       #
+#   DESCRIPTION:  This utility compares the time on air of the compact       #
+#                 binary messages (see lostik_message.py) with the plain     #
+#                 ASCII messages previously sent by pingpong.py, rx_ping.py  #
+#                 and rx_pong.py, and the airtime saved by aggregating       #
+#                 small messages into one frame.  No LoStik is required.     #
+#                                                                            #
+##############################################################################
+
+#import required modules
+import argparse
+import lora_phy
+import lostik_message
+
+#establish and parse command line arguments
+parser = argparse.ArgumentParser(description='Ronoth LoStik Utility: Message Airtime', epilog='Created by K7CTC.  This utility will report the airtime saved by the binary message format.')
+parser.add_argument('--bw', help='Radio bandwidth in kHz. (values: 125, 250, 500, default: 125)', default='125')
+parser.add_argument('--cr', help='Coding rate. (values: 4/5, 4/6, 4/7, 4/8, default: 4/5)', default='4/5')
+args = parser.parse_args()
+
+#message types with an example of the old ASCII message and its binary replacement
+messages = [
+    ('ping (pingpong.py)', b'Ping!', lostik_message.encode_ping(1)),
+    ('ping (rx_ping.py)', b'ping', lostik_message.encode_ping(1)),
+    ('pong (pingpong.py)', b'Pong!  RSSI: -87dBm  SNR: 9dB', lostik_message.encode_pong(1, -87, 9)),
+    ('pong (rx_pong.py)', b"['1700000000000'],['-87'],['9']", lostik_message.encode_pong_timed(1, 1700000000000, -87, 9)),
+]
+
+print('Airtime Saved by Binary Messages (BW ' + args.bw + 'kHz, CR ' + args.cr + ')')
+print('--------------------------------------------------------------------------')
+print('Message              ASCII  Binary   SF   ASCII ms  Binary ms   Saved ms  Saved')
+for name, ascii_payload, binary_payload in messages:
+    for sf in sorted(lora_phy.snr_floor):
+        ascii_time = lora_phy.time_on_air(len(ascii_payload), sf, args.bw, args.cr)
+        binary_time = lora_phy.time_on_air(len(binary_payload), sf, args.bw, args.cr)
+        print(name.ljust(19) + str(len(ascii_payload)).rjust(7) + str(len(binary_payload)).rjust(8) + str(sf).rjust(5)
+              + format(ascii_time, '11.1f') + format(binary_time, '11.1f') + format(ascii_time - binary_time, '11.1f')
+              + format((ascii_time - binary_time) / ascii_time * 100, '6.0f') + '%')
+        name = ''
+
+#several small messages packed into one frame share a single preamble and header (see lostik_transport.Aggregator)
+pongs = [lostik_message.encode_pong(seq, -87, 9) for seq in range(10)]
+aggregate = lostik_message.encode_aggregate(pongs)
+print('')
+print('Airtime Saved by Aggregating 10 Pongs into One Frame (BW ' + args.bw + 'kHz, CR ' + args.cr + ')')
+print('--------------------------------------------------------------------------')
+print('  SF   Separate ms   Aggregated ms   Saved ms  Saved')
+for sf in sorted(lora_phy.snr_floor):
+    separate_time = sum(lora_phy.time_on_air(len(pong), sf, args.bw, args.cr) for pong in pongs)
+    aggregate_time = lora_phy.time_on_air(len(aggregate), sf, args.bw, args.cr)
+    print(str(sf).rjust(4) + format(separate_time, '14.1f') + format(aggregate_time, '16.1f') + format(separate_time - aggregate_time, '11.1f')
+          + format((separate_time - aggregate_time) / separate_time * 100, '6.0f') + '%')
@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+
+##############################################################################
+#                                                                            #
+#  DEVELOPED BY:  Chris Clement (K7CTC)                                      #
+#       VERSION:  v1.0                                                       #
+#   DESCRIPTION:  This utility was written for use with the Ronoth LoStik    #
+#                 LoRa transceiver.  It finds the fastest modulation         #
+#                 settings a link can carry at a target packet error rate.   #
+#                                                                            #
+#                 The far end runs "pingpong.py --pong --adr".  Starting     #
+#                 from sf12/125kHz this utility works through the spreading  #
+#                 factor, bandwidth, coding rate and preamble length         #
+#                 combinations from slowest to fastest.  At each point both  #
+#                 nodes are moved to the new settings (see lostik_adr.py),   #
+#                 a number of pings are sent and the pongs counted.  A point #
+#                 passes when the upper confidence bound (Wilson score) of   #
+#                 its packet error rate is within the target.  The search    #
+#                 stops after several points in a row have failed and the    #
+#                 fastest point that passed is reported.                     #
+#                                                                            #
+#   INFORMATION:  The packet error rate counts a ping or its pong going      #
+#                 missing, so it covers both directions.  Coding rate is     #
+#                 carried in the LoRa header and only changes here, so the   #
+#                 pongs keep the far end's coding rate.  Preamble length     #
+#                 also only changes here: the far end keeps set_prlen from   #
+#                 pingpong.py, so a shorter preamble that passes should be   #
+#                 set on both nodes before it is relied on.  If the far end  #
+#                 stops answering at some settings this utility returns to   #
+#                 sf12/125kHz and waits for it to fall back there too (see   #
+#                 --adr-timeout in pingpong.py).                             #
+#                                                                            #
+##############################################################################
+
+#import required modules (pyserial is imported once the arguments have been parsed so --help stays instant)
+import time
+import sys
+import argparse
+import math
+import pathlib
+import statistics
+import lora_phy
+import lostik_adr
+import lostik_console
+import lostik_message
+import lostik_serial
+
+#start with a clear terminal window
+lostik_console.clear_screen()
+
+#establish and parse command line arguments
+parser = argparse.ArgumentParser(description='Ronoth LoStik Utility: Modulation Optimizer', epilog='Created by K7CTC.  This utility will find the fastest modulation settings a link can carry.')
+parser.add_argument('-p', '--port', help='LoStik serial port descriptor (default: /dev/ttyUSB0)', default='/dev/ttyUSB0')
+parser.add_argument('--pwr', help='Transmit power in dBm (range: 2 to 20, default: 2)', default='2')
+parser.add_argument('--target-per', help='Highest acceptable packet error rate (default: 0.1)', type=float, default=0.1)
+parser.add_argument('--confidence', help='Confidence that the packet error rate is within the target (default: 0.95)', type=float, default=0.95)
+parser.add_argument('--probes', help='Pings sent at each point (default: 50)', type=int, default=50)
+parser.add_argument('--frame-size', help='Frame size in bytes the airtime and bit rate figures are given for (default: 64)', type=int, default=64)
+parser.add_argument('--sf', help='Spreading factors to try, comma separated (default: sf7,sf8,sf9,sf10,sf11,sf12)', default='sf7,sf8,sf9,sf10,sf11,sf12')
+parser.add_argument('--bw', help='Bandwidths in kHz to try, comma separated (default: 125,250,500)', default='125,250,500')
+parser.add_argument('--cr', help='Coding rates to try, comma separated (default: 4/5,4/6,4/7,4/8)', default='4/5,4/6,4/7,4/8')
+parser.add_argument('--prlen', help='Preamble lengths to try, comma separated (range: 6 to 65535, default: 8)', default='8')
+parser.add_argument('--patience', help='Failed points in a row before the search stops (default: 3)', type=int, default=3)
+parser.add_argument('--reply-timeout', help='Seconds to wait for each pong (default: airtime of the ping and pong plus 2 seconds)', type=float)
+parser.add_argument('--recovery-timeout', help='Seconds to wait for the far end to return to sf12/125kHz (default: 120)', type=float, default=120)
+parser.add_argument('--csv', help='Also write the results of every point to this CSV file')
+args = parser.parse_args()
+
+#the point every search starts from and returns to
+rendezvous = (lostik_adr.default_rate[0], lostik_adr.default_rate[1], '4/5', 8)
+
+##### BEGIN LOSTIK STARTUP #####
+
+#check to see if the port descriptor path exists (determines if device is connected on linux systems)
+lostik_path = pathlib.Path(args.port)
+try:
+    print('Looking for LoStik...\r', end='')
+    lostik_abs_path = lostik_path.resolve(strict=True)
+except FileNotFoundError:
+    print('Looking for LoStik... FAIL!')
+    print('ERROR: LoStik serial port descriptor not found!')
+    print('HELP: Check serial port descriptor and/or device connection.')
+    print('Unable to proceed, now exiting!')
+    sys.exit(1)
+else:
+    print('Looking for LoStik... DONE!')
+
+#connect to lostik
+import serial
+try:
+    print('Connecting to LoStik...\r', end='')
+    lostik = serial.Serial(args.port, baudrate=57600, timeout=1)
+except:
+    print('Connecting to LoStik... FAIL!')
+    print('HELP: Check port permissions. Current user must be in "dialout" group.')
+    print('Unable to proceed, now exiting!')
+    sys.exit(1)
+else:
+    if lostik.is_open == True:
+        print('Connecting to LoStik... DONE!')
+    elif lostik.is_open == False:
+        print('Connecting to LoStik... FAIL!')
+        print('HELP: Check port permissions. Current user must be in "dialout" group.')
+        print('Unable to proceed, now exiting!')
+        sys.exit(1)
+
+#from here on a dedicated reader thread drains the serial port
+lostik = lostik_serial.LoStikCommander(lostik)
+
+#write settings to LoStik (the watchdog timer is disabled, this utility times its own receive windows)
+print('Initializing LoStik...\r', end='')
+init_replies = lostik.batch([
+    b'mac pause',
+    b'radio set mod lora',
+    b'radio set freq 923300000',
+    b'radio set pwr ' + args.pwr.encode('ASCII'),
+    b'radio set sf sf' + str(rendezvous[0]).encode('ASCII'),
+    b'radio set crc on',
+    b'radio set iqi off',
+    b'radio set cr ' + rendezvous[2].encode('ASCII'),
+    b'radio set wdt 0',
+    b'radio set sync 34',
+    b'radio set bw ' + str(rendezvous[1]).encode('ASCII'),
+    b'radio set prlen ' + str(rendezvous[3]).encode('ASCII'),
+])
+if init_replies != ['4294967245'] + ['ok'] * (len(init_replies) - 1):
+    print('Initializing LoStik... FAIL!')
+    print('ERROR: Error communicating with LoStik (check --pwr value).')
+    print('Unable to proceed, now exiting!')
+    sys.exit(1)
+print('Initializing LoStik... DONE!\n')
+
+##### END LOSTIK STARTUP #####
+
+##### BEGIN RADIO FUNCTIONS #####
+
+#the settings the LoStik is on right now (spreading factor, bandwidth, coding rate, preamble length)
+current = rendezvous
+
+#function to transmit one frame (returns True once the LoStik reports radio_tx_ok)
+def transmit(payload):
+    if lostik.wait_reply(lostik.command_line(lostik_serial.tx_command(payload))) != 'ok':
+        return False
+    #allow for the whole frame to go out at the current settings, plus a second for the serial port
+    airtime = lora_phy.time_on_air(len(payload), current[0], current[1], current[2], preamble=current[3])
+    return lostik.next_event(timeout=airtime / 1000 + 1) == 'radio_tx_ok'
+
+#function to receive one frame (returns the decoded message, or None if nothing was heard within timeout seconds)
+def receive(timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if lostik.query(b'radio rx 0') != 'ok':
+            lostik.query(b'radio rxstop')
+            continue
+        event = lostik.next_event(timeout=max(deadline - time.monotonic(), 0.01))
+        if event == '':
+            lostik.query(b'radio rxstop')
+            return None
+        event_array = event.split()
+        if event_array[0] != 'radio_rx' or len(event_array) != 2:
+            continue
+        message = lostik_message.decode(bytes.fromhex(event_array[1]))
+        if message is not None:
+            return message
+    return None
+
+#function to change the settings of this LoStik only
+def lostik_set(settings):
+    global current
+    sf, bw, cr, prlen = settings
+    replies = lostik.batch([b'radio set sf sf' + str(sf).encode('ASCII'), b'radio set bw ' + str(bw).encode('ASCII'), b'radio set cr ' + cr.encode('ASCII'),
+                            b'radio set prlen ' + str(prlen).encode('ASCII')])
+    if replies != ['ok'] * 4:
+        print('ERROR: Unable to change LoStik settings.')
+        sys.exit(1)
+    current = settings
+
+#function to obtain how long to wait for a pong at the current settings
+def reply_timeout():
+    if args.reply_timeout is not None:
+        return args.reply_timeout
+    ping_airtime = lora_phy.time_on_air(3, current[0], current[1], current[2], preamble=current[3])
+    #the pong goes out at the far end's coding rate and preamble length, assume the slowest coding rate
+    pong_airtime = lora_phy.time_on_air(5, current[0], current[1], '4/8', preamble=max(current[3], rendezvous[3]))
+    return (ping_airtime + pong_airtime) / 1000 + 2
+
+#function to send one ping and wait for its pong (returns the pong, or None)
+ping_seq = 0
+def probe():
+    global ping_seq
+    ping_seq = (ping_seq + 1) & 0xFFFF
+    if not transmit(lostik_message.encode_ping(ping_seq)):
+        return None
+    deadline = time.monotonic() + reply_timeout()
+    while time.monotonic() < deadline:
+        message = receive(deadline - time.monotonic())
+        if message is not None and message['type'] == 'pong' and message['seq'] == ping_seq:
+            return message
+    return None
+
+#function to move both nodes to new settings (returns False if the far end did not confirm)
+rate_seq = 0
+def switch(settings, attempts=3):
+    global rate_seq
+    if settings[:2] != current[:2]:
+        for attempt in range(attempts):
+            rate_seq = (rate_seq + 1) & 0xFFFF
+            if not transmit(lostik_message.encode_rate(rate_seq, settings[0], settings[1])):
+                continue
+            deadline = time.monotonic() + reply_timeout()
+            while time.monotonic() < deadline:
+                message = receive(deadline - time.monotonic())
+                if message is not None and message['type'] == 'rate_ack' and message['seq'] == rate_seq:
+                    break
+            else:
+                continue
+            break
+        else:
+            return False
+    lostik_set(settings)
+    return True
+
+#function to meet the far end again on the rendezvous settings (returns False if it never answers)
+def recover():
+    print('Far end not answering, returning to sf' + str(rendezvous[0]) + '/' + str(rendezvous[1]) + 'kHz to meet it there...')
+    lostik_set(rendezvous)
+    deadline = time.monotonic() + args.recovery_timeout
+    while time.monotonic() < deadline:
+        if probe() is not None:
+            return True
+    return False
+
+##### END RADIO FUNCTIONS #####
+
+##### BEGIN SEARCH #####
+
+#z score of the one sided confidence bound
+z = statistics.NormalDist().inv_cdf(args.confidence)
+
+#function to obtain the upper confidence bound of an error rate (Wilson score interval)
+def per_bound(errors, trials):
+    if trials == 0:
+        return 1.0
+    rate = errors / trials
+    centre = rate + z * z / (2 * trials)
+    spread = z * math.sqrt(rate * (1 - rate) / trials + z * z / (4 * trials * trials))
+    return min(1.0, (centre + spread) / (1 + z * z / trials))
+
+#function to obtain the airtime in milliseconds of a --frame-size frame
+def frame_airtime(settings):
+    return lora_phy.time_on_air(args.frame_size, settings[0], settings[1], settings[2], preamble=settings[3])
+
+#function to obtain a short description of a point
+def describe(settings):
+    return 'sf' + str(settings[0]) + '/' + str(settings[1]) + 'kHz/' + settings[2] + '/prlen ' + str(settings[3])
+
+#function to test one point (returns a dict of results)
+def measure(settings):
+    result = {'settings': settings, 'sent': 0, 'delivered': 0, 'snr': [], 'passed': False}
+    for index in range(args.probes):
+        pong = probe()
+        result['sent'] += 1
+        if pong is not None:
+            result['delivered'] += 1
+            result['snr'].append(pong['snr'])
+        errors = result['sent'] - result['delivered']
+        print('  ' + describe(settings) + '  ' + str(result['delivered']) + '/' + str(result['sent']) + ' delivered\r', end='')
+        #stop early once even a perfect run of the remaining probes could no longer pass
+        if per_bound(errors, args.probes) > args.target_per:
+            break
+    print('')
+    errors = result['sent'] - result['delivered']
+    result['per'] = errors / result['sent']
+    result['bound'] = per_bound(errors, result['sent'])
+    result['passed'] = result['sent'] == args.probes and result['bound'] <= args.target_per
+    return result
+
+#every combination no slower than the rendezvous settings, slowest first
+points = []
+for sf in args.sf.split(','):
+    for bw in args.bw.split(','):
+        for cr in args.cr.split(','):
+            for prlen in args.prlen.split(','):
+                points.append((lora_phy.sf_number(sf), lora_phy.bw_khz(bw), cr, int(prlen)))
+rendezvous_airtime = frame_airtime(rendezvous)
+points = sorted((point for point in points if frame_airtime(point) <= rendezvous_airtime), key=frame_airtime, reverse=True)
+if rendezvous in points:
+    points.remove(rendezvous)
+points.insert(0, rendezvous)
+
+if per_bound(0, args.probes) > args.target_per:
+    print('ERROR: ' + str(args.probes) + ' probes can never show a packet error rate of ' + str(args.target_per) + ' at ' + str(args.confidence) + ' confidence.')
+    print('HELP: Use more --probes, a higher --target-per or a lower --confidence.')
+    sys.exit(1)
+
+print('Searching ' + str(len(points)) + ' points for packet error rate <= ' + str(args.target_per) + ' at ' + format(args.confidence * 100, 'g') + '% confidence (' + str(args.probes) + ' probes each)')
+results = []
+best = None
+failures = 0
+try:
+    for point in points:
+        if not switch(point):
+            print('  ' + describe(point) + '  far end did not confirm the switch')
+            result = {'settings': point, 'sent': 0, 'delivered': 0, 'snr': [], 'per': 1.0, 'bound': 1.0, 'passed': False}
+        else:
+            result = measure(point)
+        results.append(result)
+        if result['passed']:
+            best = result
+            failures = 0
+        else:
+            failures += 1
+            if result['delivered'] == 0 and not recover():
+                print('ERROR: The far end never came back to sf' + str(rendezvous[0]) + '/' + str(rendezvous[1]) + 'kHz, stopping.')
+                break
+            if failures >= args.patience:
+                break
+except KeyboardInterrupt:
+    print('\nSearch interrupted.')
+
+#leave both nodes on the rendezvous settings
+if current != rendezvous and not switch(rendezvous):
+    lostik_set(rendezvous)
+
+##### END SEARCH #####
+
+print('')
+print('Results')
+print('--------------------------------------------------------------------------')
+print('   SF    BW   CR  Pre   Delivered    PER   Bound   SNR   Airtime   Bit rate')
+for result in results:
+    sf, bw, cr, prlen = result['settings']
+    airtime = frame_airtime(result['settings'])
+    snr = format(statistics.mean(result['snr']), '5.1f') if result['snr'] else '    -'
+    print(str(sf).rjust(5) + str(bw).rjust(6) + cr.rjust(5) + str(prlen).rjust(5) + (str(result['delivered']) + '/' + str(result['sent'])).rjust(12)
+          + format(result['per'], '7.3f') + format(result['bound'], '8.3f') + ' ' + snr + format(airtime, '8.0f') + 'ms'
+          + format(args.frame_size * 8 / airtime, '8.2f') + 'kbps' + ('  PASS' if result['passed'] else ''))
+print('(airtime and bit rate for a ' + str(args.frame_size) + ' byte frame)')
+print('')
+if best is None:
+    print('No point met the target, not even sf' + str(rendezvous[0]) + '/' + str(rendezvous[1]) + 'kHz.')
+else:
+    sf, bw, cr, prlen = best['settings']
+    print('Fastest point meeting the target: sf' + str(sf) + ', ' + str(bw) + 'kHz, coding rate ' + cr + ', preamble length ' + str(prlen))
+    print(format(rendezvous_airtime / frame_airtime(best['settings']), '.1f') + 'x faster than sf' + str(rendezvous[0]) + '/' + str(rendezvous[1]) + 'kHz (packet error rate ' + format(best['per'], '.3f') + ', at most ' + format(best['bound'], '.3f') + ' at ' + format(args.confidence * 100, 'g') + '% confidence)')
+
+#write the results to a CSV file (if requested)
+if args.csv:
+    try:
+        with open(args.csv, 'w') as csv_file:
+            csv_file.write('sf,bw,cr,prlen,sent,delivered,per,per_bound,mean_snr,airtime_ms,passed\n')
+            for result in results:
+                sf, bw, cr, prlen = result['settings']
+                snr = format(statistics.mean(result['snr']), '.1f') if result['snr'] else ''
+                csv_file.write(','.join([str(sf), str(bw), cr, str(prlen), str(result['sent']), str(result['delivered']), format(result['per'], '.4f'),
+                                         format(result['bound'], '.4f'), snr, format(frame_airtime(result['settings']), '.1f'), str(result['passed'])]) + '\n')
+    except OSError:
+        print('ERROR: Unable to write ' + args.csv)
+
+#disconnect from lostik
+print('Disconnecting from LoStik...\r', end='')
+lostik.close()
+if lostik.is_open == True:
+    print('Disconnecting from LoStik... FAIL!')
+elif lostik.is_open == False:
+    print('Disconnecting from LoStik... DONE!')
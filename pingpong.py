@@ -20,70 +20,174 @@
 #                 and SNR of the received ping.  After successful            #
 #                 transmission, the LoStik resumes a receive state.          #
 #                                                                            #
+#                 When executed with the "send" or "send-file" argument,     #
+#                 the given text or file is sent once at startup (messages   #
+#                 larger than one LoRa frame are fragmented and sent         #
+#                 back-to-back, see lostik_transport.py) before listening    #
+#                 as usual.  Fragmented messages are reassembled when        #
+#                 received.                                                  #
+#                                                                            #
+#                 When executed with the "aggregate-delay" argument, pongs   #
+#                 and sent messages are held for up to that many seconds     #
+#                 and packed together into shared frames (several pingers    #
+#                 can then be answered with one frame).                      #
+#                                                                            #
+#                 Nothing is transmitted from inside the receive loop        #
+#                 itself.  Pings, pongs and messages wait in a prioritized   #
+#                 transmit queue (see lostik_scheduler.py) and go out in     #
+#                 bursts between receive windows, pongs first.               #
+#                                                                            #
+#                 When executed with the "max-dwell" or "duty-cycle"         #
+#                 arguments, every frame's airtime is checked before it is   #
+#                 sent (see lostik_governor.py).  Frames longer than the     #
+#                 dwell limit are dropped and frames over the duty cycle     #
+#                 budget wait in the queue until the budget allows them.     #
+#                                                                            #
+#                 When executed with the "adr" argument (on both nodes),     #
+#                 the pinger uses the SNR measured at both ends of each      #
+#                 ping and pong to move both nodes to the fastest spreading  #
+#                 factor and bandwidth that keeps a margin above the         #
+#                 demodulation floor (see lostik_adr.py).  When replies      #
+#                 stop both nodes fall back to sf12/125kHz to meet again.    #
+#                                                                            #
+#                 When executed with the "tpc" argument (on both nodes),     #
+#                 each node lowers its transmit power until the far end      #
+#                 hears it at a target SNR margin, and raises it again       #
+#                 when replies go missing.  Pongs report how the ping was    #
+#                 heard and pings report how the last pong was heard.  The   #
+#                 energy spent per delivered message is logged on exit.      #
+#                                                                            #
+#                 When executed with the "channels" argument, each sent      #
+#                 message goes out on one of several channels, picked by     #
+#                 hash or least recently used (see lostik_channels.py), for  #
+#                 a multi-channel receiver (rx.py with one LoStik per        #
+#                 channel) to pick up.  Everything else stays on the first   #
+#                 channel, where this node listens.                          #
+#                                                                            #
+#                 When executed with the "relay" argument, this node joins   #
+#                 a store-and-forward mesh (see lostik_relay.py): sent       #
+#                 messages carry its node id, a sequence number and a hop    #
+#                 count, and every relayed message heard for the first time  #
+#                 is re-broadcast after a random backoff until its hop limit #
+#                 is reached, within a separate forwarding airtime budget.   #
+#                 Pings and pongs are never relayed, they test the direct    #
+#                 link.  Without this argument relayed messages are still    #
+#                 received (once each) but not forwarded.                    #
+#                                                                            #
+#                 When executed with the "tdma" argument, transmissions are  #
+#                 time slotted (see lostik_tdma.py): this node only starts   #
+#                 sending in the slot its node id maps to, and pings once    #
+#                 per frame in that slot rather than on every watchdog       #
+#                 timeout.  Pongs still go out at once, in the pinger's      #
+#                 slot.  The slot length follows from the airtime of a ping  #
+#                 and its pong.  The node given "tdma-coordinator" sends     #
+#                 beacons that keep every other node's clock in step.        #
+#                                                                            #
 ##############################################################################
 
-#import required modules
-import argparse
-import serial
+#import required modules (pyserial is imported once the arguments have been parsed so --help stays instant)
 import time
 import sys
+import lostik_console
+
+#record the startup timeline
+startup = lostik_console.StartupTimeline()
+
+import argparse
+import itertools
 import pathlib
-import os
+import random
+import lostik_serial
+import lostik_message
+import lostik_pipeline
+import lostik_transport
+import lostik_scheduler
+import lostik_governor
+import lostik_adr
+import lostik_channels
+import lostik_relay
+import lostik_tdma
+import lora_phy
 
 #start with a clear terminal window
-os.system('clear')
+lostik_console.clear_screen()
 
 #establish and parse command line arguments
 parser = argparse.ArgumentParser(description='Ronoth LoStik Utility: Ping Pong (connectivity tester)', epilog='Created by K7CTC.  This utility tests communication between two LoRa nodes.')
 parser.add_argument('--port', help='LoStik serial port descriptor. (default: /dev/ttyUSB0)', default='/dev/ttyUSB0')
 parser.add_argument('--wdt', help='LoStik Watchdog Timer time-out in milliseconds. (range: 0 to 4294967295, default: 15000)', default='15000')
+parser.add_argument('-q', '--quiet', help='Do not print per-packet details, only a rate-limited status line.', action='store_true')
 group = parser.add_mutually_exclusive_group()
 group.add_argument('--ping', help='Operate in "ping" mode.  TX cycle controlled by WDT timeout value.', action='store_true')
 group.add_argument('--pong', help='Operate in "pong" mode.  LoStik will "pong" immediately upon receipt of "ping".', action='store_true')
+group.add_argument('--send', help='Send this text once at startup (fragmented if larger than one frame), then listen.  Several messages may be given.', nargs='+')
+group.add_argument('--send-file', help='Send the contents of this file once at startup (fragmented if larger than one frame), then listen.')
+parser.add_argument('--fec', help='Fraction of the fragments of a sent message that may be lost without losing the message (range: 0 to 1, default: 0, no parity fragments)', type=float, default=0)
+parser.add_argument('--tx-queue', help='Frames the transmit queue holds before dropping the oldest, lowest priority frame. (default: 32)', type=int, default=32)
+parser.add_argument('--tx-burst', help='Milliseconds of airtime sent in one burst before returning to receive. (default: 2000)', type=float, default=2000)
+parser.add_argument('--rx-window', help='Seconds spent receiving between bursts while frames are queued. (default: 1)', type=float, default=1)
+parser.add_argument('--pong-deadline', help='Seconds after a ping by which its pong must be sent, or it is dropped. (default: 5)', type=float, default=5)
+parser.add_argument('--max-dwell', help='Longest frame in milliseconds of airtime, longer frames are dropped. (e.g. 400 for FCC part 15.247 hopping, default: no limit)', type=float)
+parser.add_argument('--duty-cycle', help='Fraction of --duty-window the LoStik may spend transmitting, frames over budget wait. (range: 0 to 1, e.g. 0.01, default: no limit)', type=float)
+parser.add_argument('--duty-window', help='Seconds over which --duty-cycle is measured. (default: 3600)', type=float, default=3600)
+parser.add_argument('--adr', help='Adaptive data rate: move both nodes to the fastest spreading factor and bandwidth that keeps --adr-margin.  Both nodes need this argument.', action='store_true')
+parser.add_argument('--adr-margin', help='SNR margin in dB kept above the demodulation floor. (default: 10)', type=float, default=10)
+parser.add_argument('--adr-hysteresis', help='Extra SNR margin in dB needed before speeding up. (default: 3)', type=float, default=3)
+parser.add_argument('--adr-bw', help='Bandwidths in kHz the adaptive data rate may choose from, comma separated. (default: 125,250,500)', default='125,250,500')
+parser.add_argument('--adr-misses', help='Unanswered pings before the pinger falls back to sf12/125kHz. (default: 3)', type=int, default=3)
+parser.add_argument('--adr-timeout', help='Seconds without a ping before the ponger falls back to sf12/125kHz. (default: 60)', type=float, default=60)
+parser.add_argument('--tpc', help='Transmit power control: use the lowest power the far end hears at --tpc-margin.  Both nodes need this argument.', action='store_true')
+parser.add_argument('--tpc-margin', help='SNR margin in dB the far end should hear above the demodulation floor. (default: 10)', type=float, default=10)
+parser.add_argument('--tpc-min', help='Lowest transmit power in dBm. (range: 2 to 20, default: 2)', type=int, default=2)
+parser.add_argument('--tpc-max', help='Highest (and starting) transmit power in dBm. (range: 2 to 20, default: 20)', type=int, default=20)
+parser.add_argument('--channels', help='Spread sent messages over these channels: a number of channels from the default plan or comma separated frequencies in Hz.  Pings and pongs stay on 923300000. (default: 923300000 only)')
+parser.add_argument('--channel-policy', help='How each sent message picks its channel. (values: hash, lru, default: lru)', choices=[lostik_channels.policy_hash, lostik_channels.policy_lru], default=lostik_channels.policy_lru)
+parser.add_argument('--relay', help='Mesh relay: send messages into the mesh and forward the relayed messages of other nodes.', action='store_true')
+parser.add_argument('--node-id', help='This node\'s id within the mesh, which also picks its --tdma slot. (range: 1 to 65535, default: random, required with --tdma)', type=int)
+parser.add_argument('--hop-limit', help='Hops a message sent into the mesh may travel. (default: 3)', type=int, default=lostik_relay.default_hop_limit)
+parser.add_argument('--relay-slots', help='Forwarding waits a random 0 to this many minus one frame airtimes so relays don\'t collide. (default: 4)', type=int, default=4)
+parser.add_argument('--relay-budget', help='Fraction of --duty-window that may be spent forwarding, messages over budget are not forwarded. (range: 0 to 1, default: 0.1)', type=float, default=0.1)
+parser.add_argument('--tdma', help='Time slotted transmission: only send in this node\'s slot, pinging once per frame.  Every node needs this argument and the same slot settings.', action='store_true')
+parser.add_argument('--tdma-slots', help='Slots per TDMA frame. (default: 8)', type=int, default=8)
+parser.add_argument('--tdma-guard', help='Milliseconds kept clear at each end of a slot for clock error and serial port delays. (default: 100)', type=float, default=100)
+parser.add_argument('--tdma-slot', help='Slot length in milliseconds. (default: from the airtime of a ping and its pong at the starting rate)', type=float)
+parser.add_argument('--tdma-coordinator', help='Send a beacon every --tdma-beacon frames that the other nodes set their clocks by.', action='store_true')
+parser.add_argument('--tdma-beacon', help='Frames between beacons, the coordinator does not ping in a beacon frame. (default: 4)', type=int, default=4)
+parser.add_argument('--aggregate-delay', help='Hold small outbound messages for up to this many seconds and pack them into shared frames. (default: 0, send each message at once)', type=float, default=0)
 args = parser.parse_args()
 
 #function for controlling lostik LEDS
 def lostik_led_control(led, state): #led values are 'rx' or 'tx' and state values are 'on' or 'off'
     if led == 'rx':
         if state == 'off':
-            lostik.write(b'sys set pindig GPIO10 0\r\n') #GPIO10 is the blue rx led
-            if lostik.readline().decode('ASCII').rstrip() == 'ok':
+            if lostik.query(b'sys set pindig GPIO10 0') == 'ok': #GPIO10 is the blue rx led
                 return True
             else:
                 return False
         elif state == 'on':
-            lostik.write(b'sys set pindig GPIO10 1\r\n') #GPIO10 is the blue rx led
-            if lostik.readline().decode('ASCII').rstrip() == 'ok':
+            if lostik.query(b'sys set pindig GPIO10 1') == 'ok': #GPIO10 is the blue rx led
                 return True
             else:
                 return False
     elif led == 'tx':
         if state == 'off':
-            lostik.write(b'sys set pindig GPIO11 0\r\n') #GPIO11 is the red tx led
-            if lostik.readline().decode('ASCII').rstrip() == 'ok':
+            if lostik.query(b'sys set pindig GPIO11 0') == 'ok': #GPIO11 is the red tx led
                 return True
             else:
                 return False
         elif state == 'on':
-            lostik.write(b'sys set pindig GPIO11 1\r\n') #GPIO11 is the red tx led
-            if lostik.readline().decode('ASCII').rstrip() == 'ok':
+            if lostik.query(b'sys set pindig GPIO11 1') == 'ok': #GPIO11 is the red tx led
                 return True
             else:
                 return False
     else:
         return False
 
-#function that can bypass the print() buffer so the console can be updated in real-time
-def incremental_print(text):
-    sys.stdout.write(str(text))
-    sys.stdout.flush()
-
 #function for controlling lostik receive state
 def lostik_rx_control(state): #state values are 'on' or 'off'
     if state == 'on':
         #place LoStik in continuous receive mode
-        lostik.write(b'radio rx 0\r\n')
-        response = lostik.readline().decode('ASCII').rstrip()
+        response = lostik.query(b'radio rx 0')
         if response == 'ok':
             lostik_led_control('rx', 'on')
             return True
@@ -91,90 +195,276 @@ def lostik_rx_control(state): #state values are 'on' or 'off'
             return False
     elif state == 'off':
         #halt LoStik continuous receive mode
-        lostik.write(b'radio rxstop\r\n')
-        if lostik.readline().decode('ASCII').rstrip() == 'ok':
+        if lostik.query(b'radio rxstop') == 'ok':
             lostik_led_control('rx', 'off')
             return True
         else:
+            console.close()
             print('ERROR: Unable to halt continuous receive mode.')
             sys.exit(1)
             
-#ping function
-def ping():
-    if lostik_rx_control('off'):
-        tx_start_time = 0
-        tx_end_time = 0
-        print('--ping argument detected, now sending ping!')
-        print('PLAIN TEXT: Ping!')
-        print('  RAW DATA: radio tx 50696E6721\n')
-        lostik.write(b'radio tx 50696E6721\r\n')
-        if lostik.readline().decode('ASCII').rstrip() == 'ok':
-            tx_start_time = int(round(time.time()*1000))
-            lostik_led_control('tx', 'on')
-            incremental_print('Transmitting')
-        else:
-            print('ERROR: Unable to transmit "Ping!" message.')
-            sys.exit(1)
-        response = ''
-        while response == '':
-            response = lostik.readline().decode('ASCII').rstrip()
-            incremental_print('.')
-        else:
-            if response == 'radio_tx_ok':
-                tx_end_time = int(round(time.time()*1000))
-                lostik_led_control('tx', 'off')
-                tx_time = tx_end_time - tx_start_time
-                incremental_print('DONE!  Transmit time: ' + str(tx_time) + 'ms\n\n')
-            elif response == 'radio_err':
-                lostik_led_control('tx', 'off')
-                incremental_print(' FAILURE!\n')
-
-#pong function
-def pong(send_rssi, send_snr):
-    if lostik_rx_control('off'):
-        tx_start_time = 0
-        tx_end_time = 0
+#ping function (pings are compact binary messages carrying a sequence number, see lostik_message.py)
+#deadline (a time.monotonic() value) is the end of the slot a time slotted ping has to go out in
+ping_seq = 0
+def ping(deadline=None):
+    global ping_seq, pong_outstanding, rate_pending, pong_report
+    if pong_outstanding:
+        #the previous ping was never answered, after too many of those both nodes meet again on the default rate
+        if adr is not None:
+            fallback = adr.missed()
+            if fallback is not None:
+                console.print('ADR: no pongs heard, falling back to the default rate.')
+                lostik_set_rate(fallback)
+                rate_pending = None
+        if tpc is not None and tpc.missed() is not None:
+            lostik_set_power(tpc.power)
+    pong_outstanding = True
+    ping_seq = (ping_seq + 1) & 0xFFFF
+    if tpc is not None and pong_report is not None:
+        #tell the ponger how its last pong was heard (a plain ping tells it the pong went missing)
+        send_msg_bytes = lostik_message.encode_ping_report(ping_seq, pong_report[0], pong_report[1])
+        pong_report = None
+    else:
+        send_msg_bytes = lostik_message.encode_ping(ping_seq)
+    console.print('--ping argument detected, now queueing ping!')
+    console.print('PLAIN TEXT: ' + lostik_message.describe(send_msg_bytes))
+    console.print('  RAW DATA: radio tx ' + send_msg_bytes.hex() + '\n')
+    tx_queue.put(send_msg_bytes, lostik_scheduler.priority_normal, deadline=deadline, label='ping #' + str(ping_seq))
+
+#pong function (ping_seq is None when answering an ASCII "Ping!" from an older node, which gets an ASCII pong back)
+#pongs jump the transmit queue, and are dropped rather than sent after --pong-deadline (the pinger has stopped listening by then)
+def pong(ping_seq, send_rssi, send_snr):
+    if ping_seq is None:
         send_rssi_bytes = send_rssi.encode('ASCII')
         send_snr_bytes = send_snr.encode('ASCII')
         send_msg_bytes = b''.join([b'Pong!  RSSI: ', send_rssi_bytes, b'dBm  SNR: ', send_snr_bytes, b'dB'])
-        send_msg_hex = send_msg_bytes.hex()
-        assemble_command = 'radio tx ' + send_msg_hex + '\r\n'
-        command = assemble_command.encode('ASCII')
-        print('PLAIN TEXT: radio tx ' + send_msg_bytes.decode('ASCII'))
-        print('  RAW DATA: ' + command.decode('ASCII').rstrip() + '\n')
-        lostik.write(command)
-        if lostik.readline().decode('ASCII').rstrip() == 'ok':
-            tx_start_time = int(round(time.time()*1000))
-            lostik_led_control('tx', 'on')
-            incremental_print('Transmitting')
-        else:
-            print('ERROR: Unable to transmit "Pong!" message.')
-            sys.exit(1)
+    elif lostik_pipeline.radio_int(send_rssi) is None or lostik_pipeline.radio_int(send_snr) is None:
+        #a pong without a reading can't be encoded, the pinger treats it like any other missed pong
+        console.print('No RSSI/SNR reading for ping #' + str(ping_seq) + ', no pong sent\n')
+        return
+    else:
+        send_msg_bytes = lostik_message.encode_pong(ping_seq, send_rssi, send_snr)
+    console.print('PLAIN TEXT: radio tx ' + lostik_message.describe(send_msg_bytes))
+    console.print('  RAW DATA: radio tx ' + send_msg_bytes.hex() + '\n')
+    if aggregator is not None:
+        #the pong waits (up to --aggregate-delay) to share a frame with other outbound messages
+        queue_frames(aggregator.add(send_msg_bytes), lostik_scheduler.priority_urgent, 'aggregate')
+        return
+    tx_queue.put(send_msg_bytes, lostik_scheduler.priority_urgent, deadline=time.monotonic() + args.pong_deadline, label='pong')
+
+#function to queue frames for transmission (on the given channel, or the listening channel if None)
+def queue_frames(frames, priority, label, channel=None):
+    for frame in frames:
+        tx_queue.put(frame, priority, label=label, channel=channel)
+
+#function to send the next burst of queued frames (returns True if anything was sent)
+def service_tx():
+    global rate_pending
+    if aggregator is not None and aggregator.due():
+        queue_frames(aggregator.flush(), lostik_scheduler.priority_urgent, 'aggregate')
+    for label, frame in relay.due():
+        tx_queue.put(frame, lostik_scheduler.priority_normal, label=label)
+    rejected = tx_queue.stats['rejected']
+    if tdma is None:
+        burst = scheduler.next_burst()
+    elif tdma.due():
+        #our slot: whatever fits before the closing guard time goes out, beacon or ping first
+        #(neither may spill into another node's slot, they are dropped if they can't make the end of this one)
+        remaining, frame_number = tdma.claim()
+        slot_end = time.monotonic() + remaining
+        if args.tdma_coordinator and frame_number % args.tdma_beacon == 0:
+            #the time is filled in as the beacon is transmitted (see stamp_beacon)
+            beacon_bytes = lostik_message.encode_beacon(frame_number, 0)
+            tx_queue.put(beacon_bytes, lostik_scheduler.priority_urgent, deadline=slot_end, label='beacon #' + str(frame_number & 0xFFFF))
+        elif args.ping:
+            ping(deadline=slot_end)
+        burst = scheduler.next_burst(until=slot_end)
+    else:
+        #someone else's slot: only replies to the node that owns it go out
+        burst = scheduler.next_burst(max_priority=lostik_scheduler.priority_urgent)
+    if tx_queue.stats['rejected'] > rejected:
+        console.print('WARNING: ' + str(tx_queue.stats['rejected'] - rejected) + ' frame(s) dropped, longer than the airtime limits allow at ' + set_sf.decode('ASCII') + '/' + set_bw.decode('ASCII') + 'kHz.')
+    if not burst:
+        return False
+    lostik_rx_control('off')
+    console.print('Transmitting: ' + ', '.join(entry['label'] for entry in burst))
+    #frames for other channels go out in runs, one retune per run, and the radio returns to the listening channel afterwards
+    #once a frame fails, it and every frame after it go back on the queue for the next burst
+    sent = []
+    unsent = []
+    for channel, entries in itertools.groupby(burst, key=lambda entry: entry['channel'] or home_channel):
+        entries = list(entries)
+        sent_count = 0
+        if not unsent and lostik_set_channel(channel):
+            sent_count = transmit_frames([entry['frame'] for entry in entries])
+        sent += entries[:sent_count]
+        unsent += entries[sent_count:]
+    lostik_set_channel(home_channel)
+    scheduler.sent(sent)
+    for entry in unsent:
+        tx_queue.requeue(entry)
+    if unsent:
+        console.print('WARNING: ' + str(len(unsent)) + ' frame(s) not sent, queued again.')
+    #the ponger switches rate once its rate ack is out (the pinger switches when it hears the ack)
+    if args.pong and rate_pending is not None and any(entry['label'] == 'rate ack' for entry in sent):
+        lostik_set_rate(rate_pending)
+        rate_pending = None
+    return True
+
+#function to set a beacon's time to the moment it goes on air (the network time once its radio tx command has crossed the serial port)
+def stamp_beacon(frame):
+    tx_time = tdma.network_time() + lostik_serial.serial_time(len(lostik_serial.tx_command(frame)))
+    return lostik_message.encode_beacon(lostik_message.decode(frame)['seq'], tx_time * 1000)
+
+#function to transmit frames back-to-back with no gap between them (receive mode must already be halted)
+#returns the number of frames sent, sending stops at the first frame that fails
+def transmit_frames(frames):
+    if not frames:
+        return 0
+    console.print('Sending ' + str(len(frames)) + ' frame(s)')
+    lostik_led_control('tx', 'on')
+    tx_start_time = int(round(time.time()*1000))
+    for index, frame in enumerate(frames):
+        if tdma is not None and frame[:1] == bytes([lostik_message.msg_beacon]):
+            frame = stamp_beacon(frame)
+        if lostik.wait_reply(lostik.command_line(lostik_serial.tx_command(frame))) != 'ok':
+            lostik_led_control('tx', 'off')
+            console.print('ERROR: Unable to transmit frame ' + str(index + 1) + ' of ' + str(len(frames)) + '.')
+            return index
         response = ''
         while response == '':
-            response = lostik.readline().decode('ASCII').rstrip()
-            incremental_print('.')
-        else:
-            if response == 'radio_tx_ok':
-                tx_end_time = int(round(time.time()*1000))
-                lostik_led_control('tx', 'off')
-                tx_time = tx_end_time - tx_start_time
-                incremental_print(' DONE!  Transmit time: ' + str(tx_time) + 'ms\n\n')
-            elif response == 'radio_err':
-                lostik_led_control('tx', 'off')
-                incremental_print(' FAILURE!\n')
-
-#function to obtain rssi of last received packet
-def lostik_get_rssi():
-    lostik.write(b'radio get rssi\r\n')
-    rssi = lostik.readline().decode('ASCII').rstrip()
-    return rssi
-                
-#function to obtain snr of last received packet
-def lostik_get_snr():
-    lostik.write(b'radio get snr\r\n')
-    snr = lostik.readline().decode('ASCII').rstrip()
-    return snr
+            response = lostik.next_event()
+            console.progress('.')
+        if response != 'radio_tx_ok':
+            lostik_led_control('tx', 'off')
+            console.print(' FAILURE!  (frame ' + str(index + 1) + ' of ' + str(len(frames)) + ')')
+            return index
+        if tpc is not None:
+            tpc.record_tx(lora_phy.time_on_air(len(frame), set_sf, set_bw, set_cr, preamble=int(set_prlen)))
+    lostik_led_control('tx', 'off')
+    tx_time = int(round(time.time()*1000)) - tx_start_time
+    console.print(' DONE!  Transmit time: ' + str(tx_time) + 'ms\n')
+    return len(frames)
+
+#function to send a message of any size (messages larger than one frame are fragmented, small ones may be aggregated)
+#typed is True when data is already a message (see lostik_message.py) that can go out as it is if it fits one frame
+def send_message(data, typed=False):
+    fragment_size = lostik_transport.max_fec_fragment_data if args.fec > 0 else lostik_transport.max_fragment_data
+    max_frame = lostik_transport.max_frame
+    if args.relay:
+        #every frame sent into the mesh has to leave room for the relay header
+        fragment_size -= lostik_message.relay_header.size
+        max_frame -= lostik_message.relay_header.size
+    try:
+        frames = lostik_transport.fragment(data, fragment_size=fragment_size, fec=args.fec)
+    except ValueError:
+        console.print('ERROR: Message is too large to send (limit: ' + str(lostik_transport.max_message) + ' bytes).')
+        return False
+    if typed and len(frames) == 1 and args.fec == 0 and len(data) <= max_frame:
+        #a message that fits one frame is sent as it is rather than as a fragment
+        frames = [data]
+    if args.relay:
+        frames = [relay.wrap(frame) for frame in frames]
+    if channels is not None:
+        #every frame of a message goes out on the same channel (so it is not aggregated with messages bound for others)
+        channel = channels.pick(data)
+        queue_frames(frames, lostik_scheduler.priority_bulk, 'message ' + lostik_channels.mhz(channel), channel)
+        return True
+    if aggregator is not None:
+        frames = [frame for message in frames for frame in aggregator.add(message)]
+    queue_frames(frames, lostik_scheduler.priority_bulk, 'message')
+    return True
+
+#function to retune the LoStik to a channel in Hz (receive mode must already be halted, returns False on failure)
+def lostik_set_channel(channel):
+    global current_channel
+    if channel == current_channel:
+        return True
+    if lostik.query(b'radio set freq ' + str(channel).encode('ASCII')) != 'ok':
+        console.print('ERROR: Unable to switch to ' + lostik_channels.mhz(channel) + '.')
+        return False
+    current_channel = channel
+    return True
+
+#function to switch the LoStik to a new (spreading factor, bandwidth) rate (receive mode must already be halted)
+def lostik_set_rate(rate):
+    global set_sf, set_bw
+    sf, bw = rate
+    new_sf = b'sf' + str(sf).encode('ASCII')
+    new_bw = str(bw).encode('ASCII')
+    if lostik.batch([b'radio set sf ' + new_sf, b'radio set bw ' + new_bw]) != ['ok', 'ok']:
+        console.print('ERROR: Unable to switch to ' + new_sf.decode('ASCII') + '/' + new_bw.decode('ASCII') + 'kHz.')
+        return False
+    set_sf, set_bw = new_sf, new_bw
+    adr.switch(rate)
+    console.print('ADR: now on ' + new_sf.decode('ASCII') + '/' + new_bw.decode('ASCII') + 'kHz')
+    return True
+
+#function to switch the LoStik to a new transmit power in dBm (receive mode must already be halted)
+def lostik_set_power(power):
+    global set_pwr
+    new_pwr = str(power).encode('ASCII')
+    if lostik.query(b'radio set pwr ' + new_pwr) != 'ok':
+        console.print('ERROR: Unable to set transmit power to ' + str(power) + 'dBm.')
+        return False
+    set_pwr = new_pwr
+    console.print('TPC: now transmitting at ' + str(power) + 'dBm')
+    return True
+
+#function to act on the link adaptation messages (pongs and rate acks for the pinger, pings and rate requests for the ponger)
+def link_message(message, rssi, snr):
+    global pong_outstanding, pong_report, rate_pending, rate_seq, last_ping_time
+    if args.pong:
+        if message['type'] in ('ping', 'ping_report'):
+            last_ping_time = time.monotonic()
+            if tpc is not None and message['type'] == 'ping_report':
+                #the pinger heard the last pong, and reports how well
+                tpc.delivered()
+                if tpc.observe(message['snr'], set_sf) is not None:
+                    lostik_set_power(tpc.power)
+            elif tpc is not None and tpc.stats['frames'] and tpc.missed() is not None:
+                lostik_set_power(tpc.power)
+        elif adr is not None and message['type'] == 'rate' and (message['sf'], message['bw']) in adr.rates:
+            #confirm at the current rate, the switch happens once the ack has been sent
+            last_ping_time = time.monotonic()
+            rate_pending = (message['sf'], message['bw'])
+            tx_queue.put(lostik_message.encode_rate_ack(message['seq'], message['sf'], message['bw']), lostik_scheduler.priority_urgent, label='rate ack')
+        return
+    if message['type'] == 'pong' and message['seq'] == ping_seq:
+        pong_outstanding = False
+        if tpc is not None:
+            tpc.delivered()
+        rssi, snr = lostik_pipeline.radio_int(rssi), lostik_pipeline.radio_int(snr)
+        if rssi is None or snr is None:
+            #the radio gave no reading for this pong (its reply timed out), so the link is left as it is
+            #and the next ping goes out without a report
+            console.print('Link: no RSSI/SNR reading for pong #' + str(message['seq']) + ', rate and power left unchanged')
+            return
+        pong_report = (rssi, snr)
+        if tpc is not None:
+            #speed up before turning the power down, and turn the power up before slowing down
+            short = lora_phy.snr_margin(message['snr'], set_sf) < tpc.margin
+            if adr is None or adr.current == adr.rates[0] or (short and tpc.power < tpc.maximum):
+                if tpc.observe(message['snr'], set_sf) is not None:
+                    lostik_set_power(tpc.power)
+                return
+        if adr is not None:
+            #the weaker direction of the link decides
+            rate = adr.observe(min(message['snr'], snr))
+            if rate is not None:
+                rate_seq = (rate_seq + 1) & 0xFFFF
+                rate_pending = rate
+                console.print('ADR: asking for sf' + str(rate[0]) + '/' + str(rate[1]) + 'kHz')
+                tx_queue.put(lostik_message.encode_rate(rate_seq, rate[0], rate[1]), lostik_scheduler.priority_urgent, label='rate')
+    elif adr is not None and message['type'] == 'rate_ack' and message['seq'] == rate_seq and (message['sf'], message['bw']) == rate_pending:
+        lostik_set_rate(rate_pending)
+        rate_pending = None
+
+#function to obtain rssi and snr of last received packet (both requests are sent before waiting on either reply)
+def lostik_get_rssi_snr():
+    rssi_reply = lostik.command(b'radio get rssi')
+    snr_reply = lostik.command(b'radio get snr')
+    return lostik.wait_reply(rssi_reply), lostik.wait_reply(snr_reply)
 
 ##### BEGIN LOSTIK INITIALIZATION #####
 
@@ -193,10 +483,15 @@ set_sync = b'34'                       #value: one hexadecimal byte
 set_sf = b'sf12'                       #values: sf7, sf8, sf9, sf10, sf11, sf12
 #Radio Bandwidth (default=125)
 set_bw = b'125'                        #values: 125, 250, 500
+#Preamble Length (default=8)
+set_prlen = b'8'                       #value range: 6 to 65535 (shorter preambles save airtime, all nodes should match)
 
 #node settings to be written to LoStik (these settings are adjustable per node)
 #Transmit Power (default=2)
 set_pwr = b'2'                         #value range: 2 to 20
+if args.tpc:
+    #transmit power control starts at full power and works down from there
+    set_pwr = str(args.tpc_max).encode('ASCII')
 #Coding Rate (default=4/5)
 set_cr = b'4/5'                        #values: 4/5, 4/6, 4/7, 4/8
 #Watchdog Timer Timeout (default=15000)
@@ -216,6 +511,7 @@ else:
     print('Looking for LoStik... FOUND!')
 
 #connect to lostik
+import serial
 try:
     print('Connecting to LoStik...\r', end='')
     lostik = serial.Serial(args.port, baudrate=57600, timeout=1)
@@ -242,6 +538,12 @@ else:
 
 
 
+startup.mark('port open')
+
+#from here on a dedicated reader thread drains the serial port so that slow console or disk output can't overrun it
+#replies are matched to their commands and unsolicited radio events (radio_rx, radio_err, radio_tx_ok) are queued separately
+lostik = lostik_serial.LoStikCommander(lostik)
+
 #make sure both LEDs are off before continuing
 rx_led_initialized = False
 tx_led_initialized = False
@@ -273,47 +575,19 @@ else:
 lostik_led_control('rx', 'on')
 lostik_led_control('tx', 'on')
 
-#write "network" settings to LoStik
+#write "network" settings to LoStik (commands are pipelined rather than waiting on each reply in turn)
 print('Initializing LoRa mesh network settings...\r', end='')
-#set frequency (default: 923300000)
-lostik.write(b''.join([b'radio set freq ', set_freq, b'\r\n']))
-if lostik.readline().decode('ASCII').rstrip() != 'ok':
-    print('Initializing LoRa mesh network settings... FAILURE!')
-    print('ERROR: Unexpected response from LoStik.')
-    sys.exit(1)
-#set mode (default: lora)
-lostik.write(b''.join([b'radio set mod ', set_mod, b'\r\n']))
-if lostik.readline().decode('ASCII').rstrip() != 'ok':
-    print('Initializing LoRa mesh network settings... FAILURE!')
-    print('ERROR: Unexpected response from LoStik.')
-    sys.exit(1)
-#set CRC header usage (default: on)
-lostik.write(b''.join([b'radio set crc ', set_crc, b'\r\n']))
-if lostik.readline().decode('ASCII').rstrip() != 'ok':
-    print('Initializing LoRa mesh network settings... FAILURE!')
-    print('ERROR: Unexpected response from LoStik.')
-    sys.exit(1)
-#set IQ inversion (default: off)
-lostik.write(b''.join([b'radio set iqi ', set_iqi, b'\r\n']))
-if lostik.readline().decode('ASCII').rstrip() != 'ok':
-    print('Initializing LoRa mesh network settings... FAILURE!')
-    print('ERROR: Unexpected response from LoStik.')
-    sys.exit(1)
-#set sync word (default: 34)
-lostik.write(b''.join([b'radio set sync ', set_sync, b'\r\n']))
-if lostik.readline().decode('ASCII').rstrip() != 'ok':
-    print('Initializing LoRa mesh network settings... FAILURE!')
-    print('ERROR: Unexpected response from LoStik.')
-    sys.exit(1)
-#set spreading factor (default: sf12)
-lostik.write(b''.join([b'radio set sf ', set_sf, b'\r\n']))
-if lostik.readline().decode('ASCII').rstrip() != 'ok':
-    print('Initializing LoRa mesh network settings... FAILURE!')
-    print('ERROR: Unexpected response from LoStik.')
-    sys.exit(1)
-#set radio bandwidth (default: 125)
-lostik.write(b''.join([b'radio set bw ', set_bw, b'\r\n']))
-if lostik.readline().decode('ASCII').rstrip() != 'ok':
+network_replies = lostik.batch([
+    b'radio set freq ' + set_freq,                 #set frequency (default: 923300000)
+    b'radio set mod ' + set_mod,                   #set mode (default: lora)
+    b'radio set crc ' + set_crc,                   #set CRC header usage (default: on)
+    b'radio set iqi ' + set_iqi,                   #set IQ inversion (default: off)
+    b'radio set sync ' + set_sync,                 #set sync word (default: 34)
+    b'radio set sf ' + set_sf,                     #set spreading factor (default: sf12)
+    b'radio set bw ' + set_bw,                     #set radio bandwidth (default: 125)
+    b'radio set prlen ' + set_prlen,               #set preamble length (default: 8)
+])
+if network_replies != ['ok'] * len(network_replies):
     print('Initializing LoRa mesh network settings... FAILURE!')
     print('ERROR: Unexpected response from LoStik.')
     sys.exit(1)
@@ -322,21 +596,12 @@ print('Initializing LoRa mesh network settings... DONE!')
 
 #write "node" settings to LoStik
 print('Initializing LoRa node settings...\r', end='')
-#set power (default: 2)
-lostik.write(b''.join([b'radio set pwr ', set_pwr, b'\r\n']))
-if lostik.readline().decode('ASCII').rstrip() != 'ok':
-    print('Initializing LoRa node settings... FAILURE!')
-    print('ERROR: Unexpected response from LoStik.')
-    sys.exit(1)
-#set coding rate (default: 4/5)
-lostik.write(b''.join([b'radio set cr ', set_cr, b'\r\n']))
-if lostik.readline().decode('ASCII').rstrip() != 'ok':
-    print('Initializing LoRa node settings... FAILURE!')
-    print('ERROR: Unexpected response from LoStik.')
-    sys.exit(1)
-#set watchdog timer timeout (default: 15000)
-lostik.write(b''.join([b'radio set wdt ', set_wdt, b'\r\n']))
-if lostik.readline().decode('ASCII').rstrip() != 'ok':
+node_replies = lostik.batch([
+    b'radio set pwr ' + set_pwr,                   #set power (default: 2)
+    b'radio set cr ' + set_cr,                     #set coding rate (default: 4/5)
+    b'radio set wdt ' + set_wdt,                   #set watchdog timer timeout (default: 15000)
+])
+if node_replies != ['ok'] * len(node_replies):
     print('Initializing LoRa node settings... FAILURE!')
     print('ERROR: Unexpected response from LoStik.')
     sys.exit(1)
@@ -349,36 +614,229 @@ lostik_led_control('tx', 'off')
 
 ##### END LOSTIK INITIALIZATION #####
 
-#the listen loop
-while True:
-    if lostik_rx_control('on'):
-        incremental_print('Listening')
-        rx_data = ''
-        while rx_data == '':
-            rx_data = lostik.readline().decode('ASCII').rstrip()
-            incremental_print('.')
-        else:
-            if rx_data == 'radio_err':
-                print('\n' + 'Radio Watchdog Timer Timeout' + '\n')
-                if args.ping:
-                    ping()
-            else:
-                rx_data_array = rx_data.split()
-                if rx_data_array[0] == 'radio_rx':
-                    rssi = lostik_get_rssi()
-                    snr = lostik_get_snr()
-                    if args.pong:
-                        if bytes.fromhex(rx_data_array[1]).decode('ASCII') == 'Ping!':
-                            print('\n')
-                            print('Ping! Pong! (Heard a ping, now sending a pong!)')
-                            pong(rssi, snr)
-                    else:
-                        print('\n')
-                        print('    MSG: ' + bytes.fromhex(rx_data_array[1]).decode('ASCII'))
-                        print('   RSSI: ' + rssi + 'dBm')
-                        print('    SNR: ' + snr + 'dB\n')
+startup.mark('init done')
+
+#console output is buffered and written on its own thread so a slow terminal can't hold up the radio
+console = lostik_console.Console(quiet=args.quiet)
+packets_received = 0
+first_rx_armed = False
+reassembler = lostik_transport.Reassembler()
+#sent messages are spread over the --channels (if given), this node always listens on set_freq
+home_channel = int(set_freq)
+current_channel = home_channel
+channels = None
+if args.channels is not None:
+    try:
+        channels = lostik_channels.ChannelSelector(lostik_channels.parse_channels(args.channels), policy=args.channel_policy)
+    except ValueError:
+        console.close()
+        print('ERROR: Invalid --channels value!')
+        sys.exit(1)
+aggregator = lostik_transport.Aggregator(max_delay=args.aggregate_delay) if args.aggregate_delay > 0 else None
+
+#outbound frames wait in a prioritized queue and go out in bursts between receive windows
+#the governor (if any) keeps every transmission within the dwell time and duty cycle limits
+tx_queue = lostik_scheduler.TransmitQueue(max_size=args.tx_queue)
+governor = None
+if args.max_dwell is not None or args.duty_cycle is not None:
+    governor = lostik_governor.AirtimeGovernor(max_dwell=args.max_dwell, duty_cycle=args.duty_cycle, duty_window=args.duty_window)
+scheduler = lostik_scheduler.AirtimeScheduler(tx_queue, lambda frame: lora_phy.time_on_air(len(frame), set_sf, set_bw, set_cr, preamble=int(set_prlen)), max_burst=args.tx_burst, governor=governor)
+
+#relayed messages are always received once each, and also forwarded with --relay
+if args.node_id is not None and not 1 <= args.node_id <= 0xFFFF:
+    console.close()
+    print('ERROR: Invalid --node-id value!')
+    sys.exit(1)
+relay = lostik_relay.Relay(args.node_id or random.randrange(1, 0x10000), scheduler.airtime, forward=args.relay, hop_limit=args.hop_limit, slots=args.relay_slots,
+                           budget=args.relay_budget, budget_window=args.duty_window)
+
+#time slotted transmission, the slot is sized for a ping and its pong (every node works it out the same way)
+tdma = None
+if args.tdma:
+    if args.node_id is None:
+        console.close()
+        print('ERROR: --tdma needs a --node-id (it picks the slot)!')
+        sys.exit(1)
+    exchange_airtime = scheduler.airtime(bytes(lostik_message.msg_formats[lostik_message.msg_ping_report].size)) + scheduler.airtime(bytes(lostik_message.msg_formats[lostik_message.msg_pong].size))
+    #a beacon has to fit a slot too, and the ponger needs a guard time to turn around
+    slot_airtime = max(exchange_airtime + args.tdma_guard, scheduler.airtime(bytes(lostik_message.msg_formats[lostik_message.msg_beacon].size)))
+    tdma_slot = args.tdma_slot if args.tdma_slot is not None else lostik_tdma.slot_length(slot_airtime, args.tdma_guard)
+    tdma = lostik_tdma.SlotSchedule(args.node_id, slots=args.tdma_slots, slot_length=tdma_slot, guard=args.tdma_guard)
+    console.print('TDMA: slot ' + str(tdma.slot) + ' of ' + str(tdma.slots) + ', ' + str(int(round(tdma_slot))) + 'ms slots')
+if args.relay:
+    console.print('Relaying as node ' + str(relay.node_id) + ' (hop limit ' + str(args.hop_limit) + ')')
+
+#link adaptation: adaptive data rate (both nodes start on the default rate) and transmit power control
+adr = None
+tpc = None
+pong_outstanding = False
+pong_report = None
+rate_pending = None
+rate_seq = 0
+last_ping_time = time.monotonic()
+if args.adr:
+    adr = lostik_adr.RateController(margin=args.adr_margin, hysteresis=args.adr_hysteresis, bandwidths=[int(bw) for bw in args.adr_bw.split(',')], max_misses=args.adr_misses)
+    if adr.current != (lora_phy.sf_number(set_sf), lora_phy.bw_khz(set_bw)):
+        lostik_set_rate(adr.current)
+if args.tpc:
+    tpc = lostik_adr.PowerController(margin=args.tpc_margin, minimum=args.tpc_min, maximum=args.tpc_max)
+
+#send the requested text or file once before listening (if requested)
+if args.send is not None or args.send_file is not None:
+    if args.send_file is not None:
+        try:
+            send_messages = [(pathlib.Path(args.send_file).read_bytes(), False)]
+        except OSError:
+            console.close()
+            print('ERROR: Unable to read file to send!')
+            sys.exit(1)
     else:
-        lostik_rx_control('off')
+        send_messages = [(lostik_message.encode_text(text), True) for text in args.send]
+    for send_data, typed in send_messages:
+        send_message(send_data, typed)
+    #nothing else will join these messages, so there is no point holding them
+    if aggregator is not None:
+        queue_frames(aggregator.flush(), lostik_scheduler.priority_bulk, 'message')
+
+#function to obtain how long to wait for a radio event (cut short when aggregated messages fall due or queued frames may go out)
+def event_wait():
+    wait = lostik.timeout
+    if aggregator is not None and aggregator.time_until_due() is not None:
+        wait = min(wait, aggregator.time_until_due())
+    if relay.time_until_due() is not None:
+        wait = min(wait, relay.time_until_due())
+    if tdma is not None:
+        wait = min(wait, tdma.time_until_due())
+    ready = scheduler.time_until_ready(max_priority=None if tdma is None else lostik_scheduler.priority_urgent)
+    if ready is not None:
+        wait = min(wait, max(0.0, rx_armed_time + args.rx_window - time.monotonic(), ready))
+    return wait
+
+#function to check whether the receive window should end so queued frames can go out (frames over the duty cycle budget keep waiting)
+def tx_due():
+    if aggregator is not None and aggregator.due():
+        return True
+    if relay.time_until_due() == 0:
+        return True
+    if tdma is not None and tdma.due():
+        return True
+    return scheduler.time_until_ready(max_priority=None if tdma is None else lostik_scheduler.priority_urgent) == 0 and time.monotonic() - rx_armed_time >= args.rx_window
+
+#the listen loop (until ctrl+c)
+try:
+    while True:
+        service_tx()
+        if lostik_rx_control('on'):
+            rx_armed_time = time.monotonic()
+            if not first_rx_armed:
+                first_rx_armed = True
+                startup.mark('first rx armed')
+                console.print(startup.report())
+            console.progress('Listening')
+            rx_data = ''
+            while rx_data == '':
+                rx_data = lostik.next_event(timeout=event_wait())
+                console.progress('.')
+                if rx_data == '' and tx_due():
+                    rx_data = 'tx_due'
+            else:
+                if rx_data == 'tx_due':
+                    #the queued frames go out at the top of the loop
+                    lostik_rx_control('off')
+                elif rx_data == 'radio_err':
+                    console.print('\n' + 'Radio Watchdog Timer Timeout' + '\n')
+                    if args.ping and tdma is None:
+                        ping()
+                    elif args.pong and adr is not None and adr.current != adr.default and time.monotonic() - last_ping_time > args.adr_timeout:
+                        #the pinger has gone quiet, meet it again on the default rate
+                        console.print('ADR: no pings heard, falling back to the default rate.')
+                        adr.stats['fallbacks'] += 1
+                        lostik_set_rate(adr.default)
+                        rate_pending = None
+                else:
+                    rx_data_array = rx_data.split()
+                    if rx_data_array[0] == 'radio_rx':
+                        rx_time = time.time()
+                        rssi, snr = lostik_get_rssi_snr()
+                        packets_received += 1
+                        console.status('Packets received: ' + str(packets_received) + '  Last RSSI: ' + rssi + 'dBm  Last SNR: ' + snr + 'dB')
+                        #an aggregate frame carries several messages, any other frame just one
+                        try:
+                            rx_payloads = [lostik_message.decompress(payload) for payload in lostik_transport.split(bytes.fromhex(rx_data_array[1]))]
+                        except ValueError:
+                            console.print('\nMalformed frame discarded.\n')
+                            rx_payloads = []
+                        #the messages carried by relayed messages are appended to rx_payloads and handled in turn
+                        for rx_payload in rx_payloads:
+                            rx_message = lostik_message.decode(rx_payload)
+                            if rx_message is not None and rx_message['type'] == 'relay':
+                                relayed = relay.receive(rx_message)
+                                if relayed is not None:
+                                    console.print('\n')
+                                    console.print('  RELAY: from node ' + str(rx_message['origin']) + ' #' + str(rx_message['seq']) + ', ' + str(rx_message['hops']) + ' hop(s)')
+                                    try:
+                                        rx_payloads.extend(lostik_message.decompress(payload) for payload in lostik_transport.split(lostik_message.decompress(relayed)))
+                                    except ValueError:
+                                        console.print('\nMalformed relayed message discarded.\n')
+                                continue
+                            if rx_message is not None and rx_message['type'] == 'beacon':
+                                if tdma is not None and not args.tdma_coordinator:
+                                    #the beacon ended as the radio_rx line started crossing the serial port
+                                    beacon_end = rx_time - lostik_serial.serial_time(len(rx_data) + 2)
+                                    correction = tdma.beacon(rx_message['tx_time'], beacon_end, scheduler.airtime(bytes.fromhex(rx_data_array[1])))
+                                    console.print('\nTDMA: beacon #' + str(rx_message['seq']) + ', clock corrected by ' + str(int(round(correction * 1000))) + 'ms\n')
+                                continue
+                            if (adr is not None or tpc is not None) and rx_message is not None:
+                                link_message(rx_message, rssi, snr)
+                            if args.pong:
+                                if rx_message is not None and rx_message['type'] in ('ping', 'ping_report'):
+                                    console.print('\n')
+                                    console.print('Ping! Pong! (Heard ping #' + str(rx_message['seq']) + ', now sending a pong!)')
+                                    pong(rx_message['seq'], rssi, snr)
+                                elif rx_payload == b'Ping!':
+                                    console.print('\n')
+                                    console.print('Ping! Pong! (Heard a ping, now sending a pong!)')
+                                    pong(None, rssi, snr)
+                            elif rx_message is not None and rx_message['type'] in ('fragment', 'fec_fragment'):
+                                #fragments are only printed once their message is complete
+                                message = reassembler.add(rx_message)
+                                if message is not None:
+                                    console.print('\n')
+                                    try:
+                                        console.print('    MSG: ' + lostik_message.describe(lostik_message.decompress(message['data'])))
+                                    except ValueError:
+                                        console.print('    MSG: (unable to decompress)')
+                                    console.print('   FRAG: ' + str(message['fragments']) + ' fragments in ' + str(int(round(message['elapsed'] * 1000))) + 'ms (' + str(message['recovered']) + ' recovered by fec)')
+                                    console.print('   RSSI: ' + rssi + 'dBm')
+                                    console.print('    SNR: ' + snr + 'dB\n')
+                            else:
+                                console.print('\n')
+                                console.print('    MSG: ' + lostik_message.describe(rx_payload))
+                                console.print('   RSSI: ' + rssi + 'dBm')
+                                console.print('    SNR: ' + snr + 'dB\n')
+        else:
+            lostik_rx_control('off')
+except KeyboardInterrupt:
+    pass
+console.close()
+print('\n')
+print(reassembler.summary())
+if aggregator is not None:
+    print(aggregator.summary())
+print(scheduler.summary())
+if adr is not None:
+    print(adr.summary())
+if tpc is not None:
+    print(tpc.summary())
+if governor is not None:
+    print(governor.summary())
+if channels is not None:
+    print(channels.summary())
+if relay.stats['received'] or args.relay:
+    print(relay.summary())
+if tdma is not None:
+    print(tdma.summary())
+print(lostik.high_water_marks())
 
 #disconnect from lostik
 print('Disconnecting from LoStik...\r', end='')
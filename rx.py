@@ -9,89 +9,118 @@
 #                 can be adapted for Windows with some modification.  The    #
 #                 utility connects to the LoStik via its serial interface    #
 #                 and listens for incoming packets.  When a packet is        #
-#                 received, it is displayed on the console.                  #
+#                 received, it is displayed on the console.  With --mod fsk  #
+#                 it listens in FSK mode instead (see set_config.py).        #
+#                                                                            #
+#                 Given several ports (-p once per LoStik) each LoStik       #
+#                 listens on its own channel (see lostik_channels.py) and    #
+#                 the packets of all of them are merged into one stream,     #
+#                 tagged with the frequency they were heard on.              #
 #                                                                            #
 ##############################################################################
 
-#import required modules
-import argparse
-import serial
+#import required modules (pyserial is imported once the arguments have been parsed so --help stays instant)
 import time
 import sys
+import lostik_console
+
+#record the startup timeline (this tool is often restarted by systemd and every second of startup is dead air)
+startup = lostik_console.StartupTimeline()
+
+import argparse
 import pathlib
-import os
+import lora_phy
+import lostik_channels
+import lostik_serial
+import lostik_pipeline
+import lostik_message
+import lostik_transport
 
 #start with a clear terminal window
-os.system('clear')
+lostik_console.clear_screen()
 
 #establish and parse command line arguments
 parser = argparse.ArgumentParser(description='Ronoth LoStik Utility: Receiver', epilog='Created by K7CTC.  This utility will receive incoming packets and write them to the console.')
-parser.add_argument('-p', '--port', help='LoStik serial port descriptor (default: /dev/ttyUSB0)', default='/dev/ttyUSB0')
+parser.add_argument('-p', '--port', help='LoStik serial port descriptor, give it once per LoStik to listen on several channels (default: /dev/ttyUSB0)', action='append')
+parser.add_argument('--channels', help='Channels for the LoStiks, one each: a number of channels from the default plan or comma separated frequencies in Hz (default: as many as there are ports, from 923300000 up)')
+parser.add_argument('-c', '--capture', help='Append received packets to this capture file for later analysis with link_stats.py')
+parser.add_argument('--sqlite', help='Also store received packets in this SQLite database')
+parser.add_argument('--udp', help='Also send received packets as JSON datagrams to this host:port')
+parser.add_argument('-q', '--quiet', help='Do not print each received packet, only a rate-limited status line', action='store_true')
+parser.add_argument('--contains', help='Only output received packets whose payload contains this text')
+parser.add_argument('--reassembly-timeout', help='Seconds to wait for the next fragment of a fragmented message before giving up on it (default: 30)', type=float, default=30)
+parser.add_argument('--dedup-window', help='Seconds after a message is first heard during which repeats of it (relays, retransmissions) are suppressed, 0 passes every copy on (default: 30)', type=float, default=30)
+parser.add_argument('--dedup-size', help='Most messages remembered for duplicate suppression (default: 1024)', type=int, default=1024)
+parser.add_argument('--dictionary', help='Compression dictionary written by train_dictionary.py (default: built-in dictionary)')
+parser.add_argument('--mod', help='Modulation mode (values: lora, fsk, default: lora)', choices=['lora', 'fsk'], default='lora')
+parser.add_argument('--bitrate', help='FSK bitrate in bits per second (range: 1 to 300000, default: 50000)', type=int, default=50000)
+parser.add_argument('--fdev', help='FSK frequency deviation in Hz (default: half the bitrate, as far as the 250kHz filter allows)', type=int)
+parser.add_argument('--rxbw', help='FSK receive filter bandwidth in kHz (default: the narrowest that passes --bitrate and --fdev)')
 args = parser.parse_args()
+ports = args.port or ['/dev/ttyUSB0']
+try:
+    channels = lostik_channels.parse_channels(args.channels) if args.channels else lostik_channels.channel_plan(len(ports))
+except ValueError:
+    print('ERROR: Invalid --channels value!')
+    sys.exit(1)
+if len(channels) != len(ports):
+    print('ERROR: ' + str(len(channels)) + ' channels given for ' + str(len(ports)) + ' LoStik(s), give one channel per port.')
+    sys.exit(1)
+
+#load compression dictionary (if requested)
+if args.dictionary:
+    try:
+        lostik_message.load_dictionary(args.dictionary)
+    except OSError:
+        print('ERROR: Unable to read compression dictionary!')
+        print('Unable to proceed, now exiting!')
+        sys.exit(1)
 
 ##### BEGIN LOSTIK STARTUP #####
 
-#check to see if the port descriptor path exists (determines if device is connected on linux systems)
-lostik_path = pathlib.Path(args.port)
-try:
-    print('Looking for LoStik...\r', end='')
-    lostik_abs_path = lostik_path.resolve(strict=True)
-except FileNotFoundError:
-    print('Looking for LoStik... FAIL!')
-    print('ERROR: LoStik serial port descriptor not found!')
-    print('HELP: Check serial port descriptor and/or device connection.')
-    print('Unable to proceed, now exiting!')
-    sys.exit(1)
-else:
-    print('Looking for LoStik... DONE!')
+import serial
+lostiks = []
+for port in ports:
+    #check to see if the port descriptor path exists (determines if device is connected on linux systems)
+    lostik_path = pathlib.Path(port)
+    try:
+        print('Looking for LoStik...\r', end='')
+        lostik_abs_path = lostik_path.resolve(strict=True)
+    except FileNotFoundError:
+        print('Looking for LoStik... FAIL!')
+        print('ERROR: LoStik serial port descriptor not found!')
+        print('HELP: Check serial port descriptor and/or device connection.')
+        print('Unable to proceed, now exiting!')
+        sys.exit(1)
+    else:
+        print('Looking for LoStik... DONE!')
 
-#connect to lostik
-try:
-    print('Connecting to LoStik...\r', end='')
-    lostik = serial.Serial(args.port, baudrate=57600, timeout=1)
-except:
-    print('Connecting to LoStik... FAIL!')
-    print('HELP: Check port permissions. Current user must be in "dialout" group.')
-    print('Unable to proceed, now exiting!')
-    sys.exit(1)
-#at this point we're already connected, but we can call the is_open method just to be sure
-else:
-    if lostik.is_open == True:
-        print('Connecting to LoStik... DONE!')
-    elif lostik.is_open == False:
+    #connect to lostik
+    try:
+        print('Connecting to LoStik...\r', end='')
+        lostik = serial.Serial(port, baudrate=57600, timeout=1)
+    except:
         print('Connecting to LoStik... FAIL!')
         print('HELP: Check port permissions. Current user must be in "dialout" group.')
         print('Unable to proceed, now exiting!')
         sys.exit(1)
+    #at this point we're already connected, but we can call the is_open method just to be sure
+    else:
+        if lostik.is_open == True:
+            print('Connecting to LoStik... DONE!')
+        elif lostik.is_open == False:
+            print('Connecting to LoStik... FAIL!')
+            print('HELP: Check port permissions. Current user must be in "dialout" group.')
+            print('Unable to proceed, now exiting!')
+            sys.exit(1)
 
-#make sure both LEDs are off before continuing
-rx_led_off = False
-tx_led_off = False
-print('Checking status LEDs...\r', end='')
-lostik.write(b'sys set pindig GPIO10 0\r\n') #GPIO10 is the blue rx led
-if lostik.readline().decode('ASCII').rstrip() == 'ok':
-    rx_led_off = True
-lostik.write(b'sys set pindig GPIO11 0\r\n') #GPIO11 is the red tx led
-if lostik.readline().decode('ASCII').rstrip() == 'ok':
-    tx_led_off = True
-if rx_led_off == True and tx_led_off == True:
-    print('Checking status LEDs... DONE!')
-else:
-    print('Checking status LEDs...FAIL!')
-    print('ERROR: Error communicating with LoStik.')
-    print('Unable to proceed, now exiting!')
-    sys.exit(1)
+    #from here on a dedicated reader thread drains the serial port so that slow console or disk output can't overrun it
+    lostiks.append(lostik_serial.LoStikCommander(lostik))
 
-#pause mac (LoRaWAN) as this is required to access the radio directly
-print('Pausing LoRaWAN protocol stack...\r', end='')
-lostik.write(b'mac pause\r\n')
-if lostik.readline().decode('ASCII').rstrip() == '4294967245':
-    print('Pausing LoRaWAN protocol stack... DONE!\n')
-else:
-    print('Pausing LoRaWAN protocol stack...FAIL!')
-    print('ERROR: Error communicating with LoStik.')
-    print('Unable to proceed, now exiting!')
-    sys.exit(1)
+startup.mark('port open')
+
+#the first LoStik (the only one unless several ports were given)
+lostik = lostiks[0]
 
 ##### END LOSTIK STARTUP #####
 
@@ -132,9 +161,9 @@ def led_control(led, state):
 
 #settings to be written to LoStik
 #Modulation Mode (default=lora)
-set_mod = b'lora'                      #this exists just in case the radio was mistakenly set to FSK somehow
+set_mod = args.mod.encode('ASCII')     #values: lora, fsk
 #Frequency (default=923300000)
-set_freq = b'923300000'                #value range: 902000000 to 928000000
+set_freq = b'923300000'                #value range: 902000000 to 928000000 (replaced by each LoStik's channel below)
 #Transmit Power (default=2)
 set_pwr = b'2'                         #value range: 2 to 20
 #Spreading Factor (default=sf12)
@@ -151,103 +180,124 @@ set_wdt = b'15000'                     #value range: 0 to 4294967295 (0 disables
 set_sync = b'34'                       #value: one hexadecimal byte
 #Radio Bandwidth (default=125)
 set_bw = b'125'                        #values: 125, 250, 500
-#end of line bytes
-end_line = b'\r\n'
-
-#write settings to LoStik
-print('Restoring dafault settings...\r', end='')
-#set mode (default: lora)
-lostik.write(b''.join([b'radio set mod ', set_mod, end_line]))
-if lostik.readline().decode('ASCII').rstrip() != 'ok':
-    print('Restoring default settings...FAIL!')
-    sys.exit(1)
-#set frequency (default: 923300000)
-lostik.write(b''.join([b'radio set freq ', set_freq, end_line]))
-if lostik.readline().decode('ASCII').rstrip() != 'ok':
-    print('Restoring default settings...FAIL!')
-    sys.exit(1)
-#set power (default: 2)
-lostik.write(b''.join([b'radio set pwr ', set_pwr, end_line]))
-if lostik.readline().decode('ASCII').rstrip() != 'ok':
-    print('Restoring default settings...FAIL!')
-    sys.exit(1)
-#set spreading factor (default: sf12)
-lostik.write(b''.join([b'radio set sf ', set_sf, end_line]))
-if lostik.readline().decode('ASCII').rstrip() != 'ok':
-    print('Restoring default settings...FAIL!')
-    sys.exit(1)
-#set CRC header usage (default: on)
-lostik.write(b''.join([b'radio set crc ', set_crc, end_line]))
-if lostik.readline().decode('ASCII').rstrip() != 'ok':
-    print('Restoring default settings...FAIL!')
-    sys.exit(1)
-#set IQ inversion (default: off)
-lostik.write(b''.join([b'radio set iqi ', set_iqi, end_line]))
-if lostik.readline().decode('ASCII').rstrip() != 'ok':
-    print('Restoring default settings...FAIL!')
-    sys.exit(1)
-#set coding rate (default: 4/5)
-lostik.write(b''.join([b'radio set cr ', set_cr, end_line]))
-if lostik.readline().decode('ASCII').rstrip() != 'ok':
-    print('Restoring default settings...FAIL!')
-    sys.exit(1)
-#set watchdog timer timeout (default: 15000)
-lostik.write(b''.join([b'radio set wdt ', set_wdt, end_line]))
-if lostik.readline().decode('ASCII').rstrip() != 'ok':
-    print('Restoring default settings...FAIL!')
-    sys.exit(1)
-#set sync word (default: 34)
-lostik.write(b''.join([b'radio set sync ', set_sync, end_line]))
-if lostik.readline().decode('ASCII').rstrip() != 'ok':
-    print('Restoring default settings...FAIL!')
-    sys.exit(1)
-#set radio bandwidth (default: 125)
-lostik.write(b''.join([b'radio set bw ', set_bw, end_line]))
-if lostik.readline().decode('ASCII').rstrip() != 'ok':
-    print('Restoring default settings...FAIL!')
+#FSK settings (only used with --mod fsk, see set_config.py)
+fsk_fdev = args.fdev if args.fdev is not None else lora_phy.fsk_fdev(args.bitrate)
+set_bitrate = str(args.bitrate).encode('ASCII')
+set_fdev = str(fsk_fdev).encode('ASCII')
+set_rxbw = (args.rxbw or lora_phy.fsk_rxbw(args.bitrate, fsk_fdev)).encode('ASCII')
+set_afcbw = lora_phy.fsk_rxbw(args.bitrate, fsk_fdev, margin_khz=20).encode('ASCII')
+set_bt = b'0.5'                        #values: none, 1.0, 0.5, 0.3
+
+#write settings to each LoStik (each on its own channel)
+#the LED, LoRaWAN pause and radio settings commands are pipelined rather than waiting on each reply in turn
+for radio, channel in zip(lostiks, channels):
+    set_freq = str(channel).encode('ASCII')
+    print('Initializing LoStik...\r', end='')
+    init_commands = [
+        b'sys set pindig GPIO10 0',                    #make sure the blue rx led is off
+        b'sys set pindig GPIO11 0',                    #make sure the red tx led is off
+        b'mac pause',                                  #pause mac (LoRaWAN) as this is required to access the radio directly
+        b'radio set mod ' + set_mod,                   #set mode (default: lora)
+        b'radio set freq ' + set_freq,                 #set frequency (default: 923300000)
+        b'radio set pwr ' + set_pwr,                   #set power (default: 2)
+        b'radio set sf ' + set_sf,                     #set spreading factor (default: sf12)
+        b'radio set crc ' + set_crc,                   #set CRC header usage (default: on)
+        b'radio set iqi ' + set_iqi,                   #set IQ inversion (default: off)
+        b'radio set cr ' + set_cr,                     #set coding rate (default: 4/5)
+        b'radio set wdt ' + set_wdt,                   #set watchdog timer timeout (default: 15000)
+        b'radio set sync ' + set_sync,                 #set sync word (default: 34)
+        b'radio set bw ' + set_bw,                     #set radio bandwidth (default: 125)
+    ]
+    #the FSK settings are left alone unless FSK is in use
+    if args.mod == 'fsk':
+        init_commands += [
+            b'radio set bitrate ' + set_bitrate,       #set FSK bitrate (default: 50000)
+            b'radio set fdev ' + set_fdev,             #set FSK frequency deviation (default: 25000)
+            b'radio set rxbw ' + set_rxbw,             #set FSK receive filter bandwidth (default: 25)
+            b'radio set afcbw ' + set_afcbw,           #set FSK AFC filter bandwidth (default: 41.7)
+            b'radio set bt ' + set_bt,                 #set FSK Gaussian shaping (default: 0.5)
+        ]
+    init_replies = radio.batch(init_commands)
+    if init_replies[0:2] != ['ok', 'ok']:
+        print('Initializing LoStik... FAIL!')
+        print('ERROR: Error communicating with LoStik (status LEDs).')
+        print('Unable to proceed, now exiting!')
+        sys.exit(1)
+    if init_replies[2] != '4294967245':
+        print('Initializing LoStik... FAIL!')
+        print('ERROR: Error communicating with LoStik (pausing LoRaWAN protocol stack).')
+        print('Unable to proceed, now exiting!')
+        sys.exit(1)
+    if init_replies[3:] != ['ok'] * (len(init_replies) - 3):
+        print('Initializing LoStik... FAIL!')
+        print('ERROR: Error communicating with LoStik (restoring default settings' + (', check --bitrate, --fdev and --rxbw values' if args.mod == 'fsk' else '') + ').')
+        print('Unable to proceed, now exiting!')
+        sys.exit(1)
+    #if we made it this far, things are peachy
+    print('Initializing LoStik... DONE!\n')
+startup.mark('init done')
+
+#build the list of sinks that received packets are written to
+console = lostik_console.Console(quiet=args.quiet)
+sinks = [lostik_pipeline.ConsoleSink(console)]
+try:
+    if args.capture:
+        sinks.append(lostik_pipeline.FileSink(args.capture))
+    if args.sqlite:
+        sinks.append(lostik_pipeline.DatabaseSink(args.sqlite))
+    if args.udp:
+        sinks.append(lostik_pipeline.SocketSink(args.udp))
+except (OSError, ValueError):
+    print('ERROR: Unable to open output sink!')
+    print('Unable to proceed, now exiting!')
     sys.exit(1)
-#if we made it this far, things are peachy
-print('Restoring default settings...DONE!\n')
-
-#we need a function that can bypass the print() buffer so the console can be updated in real-time
-def incremental_print(text):
-    sys.stdout.write(str(text))
-    sys.stdout.flush()
-
-#listen for incoming packets
-while True:
-    lostik.write(b'radio rx 0\r\n')
-    response = lostik.readline().decode('ASCII').rstrip()
-    if response == 'ok':
-        #led_control('rx', 'on')
-        incremental_print('Listening')
-        rx_data = ''
-        while rx_data == '':
-            rx_data = lostik.readline().decode('ASCII').rstrip()
-            incremental_print('.')
-        else:
-            if rx_data == 'radio_err':
-                print('\n' + 'Radio Watchdog Timer Timeout' + '\n')
-            rx_data_array = rx_data.split()
-            if rx_data_array[0] == 'radio_rx':
-                rx_time = int(round(time.time()*1000)) #get current unix epoch time in milliseconds
-                print('\n' + '    MSG: ' + bytes.fromhex(rx_data_array[1]).decode('ASCII'))
-                lostik.write(b'radio get rssi\r\n')
-                print('   RSSI: ' + lostik.readline().decode('ASCII').rstrip() + 'dBm')
-                lostik.write(b'radio get snr\r\n')
-                print('    SNR: ' + lostik.readline().decode('ASCII').rstrip() + 'dB')
-                print('RX TIME: ' + str(rx_time) + '\n')
-    elif response == 'busy':
-        lostik.write(b'radio rxstop\r\n')
-        if lostik.readline().decode('ASCII').rstrip() != 'ok':
-            print('ERROR: Error communicating with LoStik.')
-            print('Unable to proceed, now exiting!')
-            sys.exit(1)
+
+#only pass packets containing the requested text (if requested)
+predicate = None
+if args.contains:
+    contains_bytes = args.contains.encode('ASCII')
+    predicate = lambda frame: contains_bytes in frame['payload']
+
+#listen for incoming packets until ctrl+c
+reassembler = lostik_transport.Reassembler(timeout=args.reassembly_timeout)
+#each message is passed to the sinks only once, however many copies of it are heard
+duplicates = lostik_transport.DuplicateCache(ttl=args.dedup_window, max_entries=args.dedup_size) if args.dedup_window > 0 else None
+#FSK frames have no spreading factor (or SNR)
+pipeline = lostik_pipeline.ReceivePipeline(lostik, set_sf if args.mod == 'lora' else None, sinks, predicate, reassembler=reassembler, frequency=channels[0], duplicates=duplicates)
+#every further LoStik feeds the same stream from its own channel
+for radio, channel in zip(lostiks[1:], channels[1:]):
+    pipeline.add_source(radio, channel)
+pipeline.start()
+try:
+    if pipeline.armed.wait(timeout=5):
+        startup.mark('first rx armed')
+    print(startup.report())
+    print('Listening on ' + ', '.join(lostik_channels.mhz(channel) for channel in channels) + '... (press ctrl+c to stop)')
+    while True:
+        time.sleep(1)
+except KeyboardInterrupt:
+    pass
+print('\nStopping receiver...\r', end='')
+pipeline.stop()
+console.close()
+print('Stopping receiver... DONE!')
+print('Packets received: ' + str(pipeline.stats['received']) + '  dropped: ' + str(pipeline.stats['dropped']) + '  malformed: ' + str(pipeline.stats['malformed']) + '  duplicates: ' + str(pipeline.stats['duplicates']) + '  filtered: ' + str(pipeline.stats['filtered']) + '  watchdog timeouts: ' + str(pipeline.stats['watchdog_timeouts']))
+print(pipeline.sink_summary())
+if pipeline.stats['errors']:
+    print('Processing errors: ' + str(pipeline.stats['errors']) + ' (frames discarded, latest: ' + pipeline.last_error + ')')
+if len(lostiks) > 1:
+    print(pipeline.channel_summary())
+print(reassembler.summary())
+if duplicates is not None:
+    print(duplicates.summary())
+for radio in lostiks:
+    print(radio.high_water_marks())
 
 #disconnect from lostik
-print('Disconnecting from LoStik...\r', end='')
-lostik.close()
-if lostik.is_open == True:
-    print('Disconnecting from LoStik... FAIL!')
-elif lostik.is_open == False:
-    print('Disconnecting from LoStik... DONE!')
+for radio in lostiks:
+    print('Disconnecting from LoStik...\r', end='')
+    radio.close()
+    if radio.is_open == True:
+        print('Disconnecting from LoStik... FAIL!')
+    elif radio.is_open == False:
+        print('Disconnecting from LoStik... DONE!')
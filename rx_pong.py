@@ -23,10 +23,12 @@ import serial
 import time
 import sys
 import pathlib
-import os
+import lostik_console
+import lostik_message
+import lostik_pipeline
 
 #start with a clear terminal window
-os.system('clear')
+lostik_console.clear_screen()
 
 #establish and parse command line arguments
 parser = argparse.ArgumentParser(description='Ronoth LoStik Utility: TX Demonstration',epilog='Created by K7CTC.  This utility will transmit a static message with various modulation settings.')
@@ -226,7 +228,11 @@ print('Restoring default settings...DONE!\n')
 
 ##### EXPERIMENTAL TX CODE #####
 #we're going to break from the RX loop and try to send a packet
-def send_pong(send_rx_time, send_rssi, send_snr):
+def send_pong(ping_seq, send_rx_time, send_rssi, send_snr):
+    #a binary pong can't be encoded without the readings (their replies timed out), the pinger counts it as missed
+    if ping_seq is not None and (lostik_pipeline.radio_int(send_rssi) is None or lostik_pipeline.radio_int(send_snr) is None):
+        print('No RSSI/SNR reading for ping #' + str(ping_seq) + ', no reply sent\n')
+        return
     tx_start_time = 0
     tx_end_time = 0
     lostik.write(b'radio rxstop\r\n')
@@ -236,15 +242,16 @@ def send_pong(send_rx_time, send_rssi, send_snr):
         sys.exit(1)
     else:
         led_control('rx', 'off')
-        #build message and convert to hex
-        send_rx_time_bytes = send_rx_time.encode('ASCII')
-        send_rssi_bytes = send_rssi.encode('ASCII')
-        send_snr_bytes = send_snr.encode('ASCII')
-        send_msg_bytes = b''.join([b"['",send_rx_time_bytes,b"'],['",send_rssi_bytes,b"'],['",send_snr_bytes,b"']"])
+        #build message (compact binary pong, see lostik_message.py) and convert to hex
+        #ping_seq is None when answering an ASCII "ping" from an older node, which gets the old ASCII reply back
+        if ping_seq is None:
+            send_msg_bytes = b''.join([b"['", str(send_rx_time).encode('ASCII'), b"'],['", send_rssi.encode('ASCII'), b"'],['", send_snr.encode('ASCII'), b"']"])
+        else:
+            send_msg_bytes = lostik_message.encode_pong_timed(ping_seq, send_rx_time, send_rssi, send_snr)
         send_msg_hex = send_msg_bytes.hex()
         assemble_command = 'radio tx ' + send_msg_hex + '\r\n'
         command = assemble_command.encode('ASCII')
-        #print('PLAIN TEXT: ' + send_msg_bytes)
+        print('PLAIN TEXT: ' + lostik_message.describe(send_msg_bytes))
         print('  RAW DATA: ' + command.decode('ASCII').rstrip() + '\n')
         lostik.write(command)
         if lostik.readline().decode('ASCII').rstrip() == 'ok':
@@ -288,21 +295,23 @@ while True:
                 rx_data_array = rx_data.split()
                 if rx_data_array[0] == 'radio_rx':
                     rx_time = int(round(time.time()*1000)) #get current unix epoch time in milliseconds
-                    rx_time_str = str(rx_time)
                     lostik.write(b'radio get rssi\r\n')
                     rssi = lostik.readline().decode('ASCII').rstrip()
                     print(rssi)
                     lostik.write(b'radio get snr\r\n')
                     snr = lostik.readline().decode('ASCII').rstrip()
                     print(snr)
-                    if bytes.fromhex(rx_data_array[1]).decode('ASCII') == 'ping':
+                    rx_payload = bytes.fromhex(rx_data_array[1])
+                    rx_message = lostik_message.decode(rx_payload)
+                    if rx_message is not None and rx_message['type'] in ('ping', 'ping_report'):
+                        print('Received ping #' + str(rx_message['seq']) + '!!!  Now sending reply!!!')
+                        send_pong(rx_message['seq'], rx_time, rssi, snr)
+                    elif rx_payload == b'ping':
                         print('Received a ping!!!  Now sending reply!!!')
-                        send_pong(rx_time_str, rssi, snr)
+                        send_pong(None, rx_time, rssi, snr)
                     else:
-                        print('\n' + '    MSG: ' + bytes.fromhex(rx_data_array[1]).decode('ASCII'))
-                        lostik.write(b'radio get rssi\r\n')
+                        print('\n' + '    MSG: ' + lostik_message.describe(rx_payload))
                         print('   RSSI: ' + rssi + 'dBm')
-                        lostik.write(b'radio get snr\r\n')
                         print('    SNR: ' + snr + 'dB')
                         print('RX TIME: ' + str(rx_time) + '\n')
     elif response == 'busy':
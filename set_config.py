@@ -24,14 +24,18 @@ import serial
 import time
 import sys
 import pathlib
-import os
+import lostik_console
+import lora_phy
 
 #start with a clear terminal window
-os.system('clear')
+lostik_console.clear_screen()
 
 #establish and parse command line arguments
 parser = argparse.ArgumentParser(description='Ronoth LoStik Utility: Set Configuration', epilog='Created by K7CTC.  This utility will write specified LoRa settings to the LoStik device.')
 parser.add_argument('-p', '--port', help='LoStik serial port descriptor (default: /dev/ttyUSB0)', default='/dev/ttyUSB0')
+parser.add_argument('--mod', help='Modulation mode (values: lora, fsk, default: lora)', choices=['lora', 'fsk'], default='lora')
+parser.add_argument('--bitrate', help='FSK bitrate in bits per second, only written with --mod fsk (range: 1 to 300000, default: 50000)', type=int, default=50000)
+parser.add_argument('--fdev', help='FSK frequency deviation in Hz, only written with --mod fsk (default: half the bitrate, as far as the 250kHz filter allows)', type=int)
 args = parser.parse_args()
 
 ##### BEGIN LOSTIK STARTUP #####
@@ -137,7 +141,7 @@ def led_control(led, state):
 
 #settings to be written to LoStik
 #Modulation Mode (default=lora)
-set_mod = b'lora'                      #this exists just in case the radio was mistakenly set to FSK somehow
+set_mod = args.mod.encode('ASCII')     #values: lora, fsk (fsk trades range for a far higher bitrate, see the FSK settings below)
 #Frequency (default=923300000)
 set_freq = b'923300000'                #value range: 902000000 to 928000000
 #Transmit Power (default=2)
@@ -156,6 +160,20 @@ set_wdt = b'15000'                     #value range: 0 to 4294967295 (0 disables
 set_sync = b'34'                       #value: one hexadecimal byte
 #Radio Bandwidth (default=125)
 set_bw = b'125'                        #values: 125, 250, 500
+#Preamble Length (default=8)
+set_prlen = b'8'                       #value range: 6 to 65535 (shorter preambles save airtime, all nodes should match)
+#FSK settings (only written with --mod fsk, all nodes should match except the filter bandwidths)
+#FSK Bitrate (default=50000)
+set_bitrate = str(args.bitrate).encode('ASCII')           #value range: 1 to 300000 (bits per second)
+#FSK Frequency Deviation (default=25000), about half the bitrate (deviation plus half the bitrate must fit in 250kHz)
+fsk_fdev = args.fdev if args.fdev is not None else lora_phy.fsk_fdev(args.bitrate)
+set_fdev = str(fsk_fdev).encode('ASCII')                  #value range: 0 to 200000 (Hz)
+#FSK Receive Filter Bandwidth (default=25), the narrowest filter that passes the deviation plus half the bitrate
+set_rxbw = lora_phy.fsk_rxbw(args.bitrate, fsk_fdev).encode('ASCII')
+#FSK AFC Filter Bandwidth (default=41.7), a step or two wider than rxbw to allow for frequency error
+set_afcbw = lora_phy.fsk_rxbw(args.bitrate, fsk_fdev, margin_khz=20).encode('ASCII')
+#FSK Gaussian Shaping (default=0.5)
+set_bt = b'0.5'                        #values: none, 1.0, 0.5, 0.3 (lower values narrow the spectrum but smear the bits)
 #end of line bytes
 end_line = b'\r\n'
 
@@ -195,7 +213,28 @@ lostik.write(b''.join([b'radio set sync ', set_sync, end_line]))
 print('                Set Sync Word (default=34): ' + set_sync.decode('ASCII') + ' ... ' + lostik.readline().decode('ASCII'), end='')
 #set radio bandwidth (default: 125)
 lostik.write(b''.join([b'radio set bw ', set_bw, end_line]))
-print('         Set Radio Bandwidth (default=125): ' + set_bw.decode('ASCII') + ' ... ' + lostik.readline().decode('ASCII'))
+print('         Set Radio Bandwidth (default=125): ' + set_bw.decode('ASCII') + ' ... ' + lostik.readline().decode('ASCII'), end='')
+#set preamble length (default: 8)
+lostik.write(b''.join([b'radio set prlen ', set_prlen, end_line]))
+print('           Set Preamble Length (default=8): ' + set_prlen.decode('ASCII') + ' ... ' + lostik.readline().decode('ASCII'), end='')
+#the FSK settings are left alone unless FSK is in use
+if args.mod == 'fsk':
+    #set FSK bitrate (default: 50000)
+    lostik.write(b''.join([b'radio set bitrate ', set_bitrate, end_line]))
+    print('           Set FSK Bitrate (default=50000): ' + set_bitrate.decode('ASCII') + ' ... ' + lostik.readline().decode('ASCII'), end='')
+    #set FSK frequency deviation (default: 25000)
+    lostik.write(b''.join([b'radio set fdev ', set_fdev, end_line]))
+    print('         Set FSK Deviation (default=25000): ' + set_fdev.decode('ASCII') + ' ... ' + lostik.readline().decode('ASCII'), end='')
+    #set FSK receive filter bandwidth (default: 25)
+    lostik.write(b''.join([b'radio set rxbw ', set_rxbw, end_line]))
+    print('         Set FSK RX Bandwidth (default=25): ' + set_rxbw.decode('ASCII') + ' ... ' + lostik.readline().decode('ASCII'), end='')
+    #set FSK AFC filter bandwidth (default: 41.7)
+    lostik.write(b''.join([b'radio set afcbw ', set_afcbw, end_line]))
+    print('      Set FSK AFC Bandwidth (default=41.7): ' + set_afcbw.decode('ASCII') + ' ... ' + lostik.readline().decode('ASCII'), end='')
+    #set FSK Gaussian shaping (default: 0.5)
+    lostik.write(b''.join([b'radio set bt ', set_bt, end_line]))
+    print('    Set FSK Gaussian Shaping (default=0.5): ' + set_bt.decode('ASCII') + ' ... ' + lostik.readline().decode('ASCII'), end='')
+print()
 
 #sleep for half second
 time.sleep(.5)
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+
+##############################################################################
+#                                                                            #
+#  DEVELOPED BY:  Chris Clement (K7CTC)                                      #
+#       VERSION:  v1.0                                                       #
+#   DESCRIPTION:  This utility trains a compression dictionary from one or   #
+#                 more capture files (see rx.py --capture).  The strings     #
+#                 that save the most bytes across the captured payloads are  #
+#                 written to a dictionary file which can then be handed to   #
+#                 rx.py and lora_demo.py with --dictionary.  No LoStik is    #
+#                 required.                                                  #
+#                                                                            #
+#   INFORMATION:  Both ends of a link must use the same dictionary, or       #
+#                 compressed messages will be discarded as malformed.        #
+#                                                                            #
+##############################################################################
+
+#import required modules
+import argparse
+import collections
+import sys
+import lostik_capture
+import lostik_message
+
+#establish and parse command line arguments
+parser = argparse.ArgumentParser(description='Ronoth LoStik Utility: Train Compression Dictionary', epilog='Created by K7CTC.  This utility will build a compression dictionary from captured traffic.')
+parser.add_argument('capture', help='Capture file(s) written by rx.py --capture', nargs='+')
+parser.add_argument('-o', '--output', help='Dictionary file to write (default: lostik.dict)', default='lostik.dict')
+parser.add_argument('--size', help='Maximum dictionary size in bytes (default: 1024)', type=int, default=1024)
+parser.add_argument('--min-length', help='Shortest string considered (default: 3)', type=int, default=3)
+parser.add_argument('--max-length', help='Longest string considered (default: 32)', type=int, default=32)
+args = parser.parse_args()
+
+#load the message bodies (type byte removed from binary messages, compressed payloads expanded)
+bodies = []
+for path in args.capture:
+    try:
+        payloads = lostik_capture.load_payloads(path)
+    except OSError:
+        print('ERROR: Unable to read capture file: ' + path)
+        print('Unable to proceed, now exiting!')
+        sys.exit(1)
+    for payload in payloads:
+        try:
+            payload = lostik_message.decompress(payload)
+        except ValueError:
+            continue
+        if payload and payload[0] < 0x20:
+            payload = payload[1:]
+        if payload:
+            bodies.append(payload)
+if not bodies:
+    print('ERROR: No payloads found in the capture file(s)!')
+    sys.exit(1)
+
+#count the number of payloads each string appears in (a string repeated within one payload is already handled by deflate)
+counts = collections.Counter()
+for body in bodies:
+    seen = set()
+    for length in range(args.min_length, min(args.max_length, len(body)) + 1):
+        for start in range(len(body) - length + 1):
+            seen.add(body[start:start + length])
+    counts.update(seen)
+
+#greedy selection: take the strings that save the most bytes, skipping any already contained in a chosen string
+chosen = []
+chosen_size = 0
+for string, count in sorted(counts.items(), key=lambda item: item[1] * (len(item[0]) - 2), reverse=True):
+    if count < 2:
+        break
+    if chosen_size + len(string) > args.size:
+        continue
+    if any(string in other for other, other_count in chosen):
+        continue
+    chosen.append((string, count))
+    chosen_size += len(string)
+
+#deflate finds matches best near the end of the dictionary, so the most common strings go last
+dictionary = b''.join(string for string, count in sorted(chosen, key=lambda item: item[1]))
+with open(args.output, 'wb') as dictionary_file:
+    dictionary_file.write(dictionary)
+
+#function to obtain the total compressed size of the payloads with the current dictionary
+def compressed_size():
+    return sum(len(lostik_message.compress(bytes([lostik_message.msg_text]) + body)) for body in bodies)
+
+original_size = sum(len(body) + 1 for body in bodies)
+preset_size = compressed_size()
+lostik_message.compression_dictionary = dictionary
+trained_size = compressed_size()
+print('Dictionary written to ' + args.output + ' (' + str(len(dictionary)) + ' bytes, ' + str(len(chosen)) + ' strings)')
+print('Payloads:            ' + str(len(bodies)))
+print('Uncompressed:        ' + str(original_size) + ' bytes')
+print('Preset dictionary:   ' + str(preset_size) + ' bytes (' + format(preset_size / original_size * 100, '.0f') + '%)')
+print('Trained dictionary:  ' + str(trained_size) + ' bytes (' + format(trained_size / original_size * 100, '.0f') + '%)')
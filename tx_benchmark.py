@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+
+##############################################################################
+#                                                                            #
+#  DEVELOPED BY:  Chris Clement (K7CTC)                                      #
+#       VERSION:  v1.0                                                       #
+#   DESCRIPTION:  This utility benchmarks building "radio tx" command lines  #
+#                 (see lostik_serial.py).  For messages of several sizes it  #
+#                 reports the time taken per message by the old string       #
+#                 round trip (hex string, concatenate, ASCII encode) and by  #
+#                 lostik_serial.tx_command(), along with how long the        #
+#                 command takes to cross the serial port at 57600 baud.  No  #
+#                 LoStik is required.                                        #
+#                                                                            #
+##############################################################################
+
+#import required modules
+import argparse
+import timeit
+import lostik_message
+import lostik_serial
+
+#establish and parse command line arguments
+parser = argparse.ArgumentParser(description='Ronoth LoStik Utility: TX Command Benchmark', epilog='Created by K7CTC.  This utility will report the cost of building transmit commands.')
+parser.add_argument('--count', help='Messages encoded per timing run (default: 100000)', type=int, default=100000)
+args = parser.parse_args()
+
+#function to time a callable (returns the best of several runs in microseconds per call)
+def per_call(function, runs=5):
+    return min(timeit.repeat(function, number=args.count, repeat=runs)) / args.count * 1e6
+
+#the way command lines used to be built
+def string_round_trip(frame):
+    command = 'radio tx ' + frame.hex() + '\r\n'
+    return command.encode('ASCII')
+
+frames = [
+    ('pong', lostik_message.encode_pong(1234, '-87', '-5')),
+    ('text', lostik_message.encode_text('We arrived at camp... Weather is great!')),
+    ('fragment', lostik_message.encode_fragment(1234, 0, 2, bytes(range(250)))),
+]
+
+print('TX Command Encoding (microseconds per message, best of 5 x ' + str(args.count) + ')')
+print('--------------------------------------------------------------------------')
+print('Message     Bytes   String trip   tx_command   Serial port')
+for name, frame in frames:
+    #the encoder must produce exactly the command line the old code did
+    assert lostik_serial.tx_command(frame) == string_round_trip(frame)
+    row = name.ljust(10) + str(len(frame)).rjust(7)
+    row += format(per_call(lambda: string_round_trip(frame)), '14.3f')
+    row += format(per_call(lambda: lostik_serial.tx_command(frame)), '13.3f')
+    #10 bits per byte on the wire (start bit, 8 data bits, stop bit)
+    row += format(len(lostik_serial.tx_command(frame)) * 10 / 57600 * 1e6, '14.0f')
+    print(row)